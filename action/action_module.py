@@ -9,7 +9,6 @@
 # *   Scripting: Python for dynamic script generation.
 
 import platform
-import time
 
 
 class ActionModule:
@@ -72,8 +71,9 @@ class ActionModule:
                 print(f"Unknown action type: {action_type}")
                 result_details["error"] = f"Unknown action type: {action_type}"
 
-            # Simulate some processing time
-            time.sleep(0.1)
+            # Wait for the UI to settle rather than a fixed delay
+            if success:
+                result_details["settle"] = self.wait_until_settled(action_type)
 
         except Exception as e:
             print(f"Error performing action {action_type}: {e}")
@@ -86,6 +86,15 @@ class ActionModule:
         result_details["parameters"] = parameters
         return {"success": success, "details": result_details}
 
+    def wait_until_settled(self, action_type):
+        """Waits until the UI is ready after an action."""
+        # A settle detector (e.g. horusagentos.ui_settle.SettleDetector) can be supplied via
+        # config["settle_detector"]; it polls screen/accessibility stability with a timeout.
+        detector = (self.config or {}).get("settle_detector")
+        if detector is None:
+            return {"settled": True, "reason": "no_detector", "waited_ms": 0.0}
+        return detector.wait(action_type)
+
     def _open_application(self, app_name):
         # Platform-specific application opening logic
         # Example for macOS: subprocess.call(["open", "-a", app_name])
@@ -1,14 +1,21 @@
 # HorusAgentOS Main Package (Flattened Structure)
+import importlib
 
-# Import core components to be available at the package level
-from .agent import HorusAgentOS
-from .perception_module import PerceptionModule
-from .decision_module import DecisionModule
-from .action_module import ActionModule
-from .memory_module import MemoryModule
-from .communication_module import CommunicationModule
+# Core components are available at the package level, but each module is only
+# imported on first attribute access so that `import horusagentos` stays cheap
+_LAZY_EXPORTS = {
+    "HorusAgentOS": ".agent",
+    "PerceptionModule": ".perception_module",
+    "DecisionModule": ".decision_module",
+    "ActionModule": ".action_module",
+    "MemoryModule": ".memory_module",
+    "CommunicationModule": ".communication_module",
+    "TaskRunner": ".task_runner",
+    "EventBus": ".event_bus",
+    "AgentCoordinator": ".agent_coordinator",
+}
 # Placeholder for a utility module if needed later
-# from .utils_module import some_utility_function # Assuming utils_module.py
+# "some_utility_function": ".utils_module",
 
 __all__ = [
     "HorusAgentOS",
@@ -17,7 +24,21 @@ __all__ = [
     "ActionModule",
     "MemoryModule",
     "CommunicationModule",
+    "TaskRunner",
+    "EventBus",
+    "AgentCoordinator",
     # "some_utility_function"
 ]
 
-print("HorusAgentOS package initialized.")
+
+def __getattr__(name):
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
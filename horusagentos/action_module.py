@@ -1,19 +1,52 @@
 # tech.md: 4.3. Action Layer
+import asyncio
 import platform
 import time
 import subprocess
 import os
+
+from .action_replay import CompiledSequence, ReplayCache, ReplayEngine, compile_plan
+from .input_backends import LOW_LEVEL_ACTIONS, coalesce_actions, create_input_backend
+from .lazy import lazy_property, warm_up
+from .ui_settle import SettleDetector, element_appears, element_disappears
 # Potential future imports: pyautogui, pywinauto, AppKit (for macOS via pyobjc)
 
 
 class ActionModule:
-    def __init__(self, config: dict = None):
+    def __init__(self, config: dict = None, perception_module=None):
         self.config = config if config else {}
         self.os_type = self.config.get(
             'os_override', platform.system().lower())
-        self.gui_controller = self._initialize_gui_controller()
+        self.typing_interval_ms = self.config.get('typing_interval_ms', 0)
+        self.perception_module = perception_module
         print(f"ActionModule initialized for {self.os_type}")
 
+    @lazy_property
+    def gui_controller(self):
+        return self._initialize_gui_controller()
+
+    @lazy_property
+    def input_backend(self):
+        # Native input goes through a batching backend: 'fake' (records), 'xdotool', 'uinput'
+        return create_input_backend(self.config.get('input_backend', 'fake'),
+                                    self.config.get('input_backend_options'))
+
+    @lazy_property
+    def replay_cache(self):
+        # Compiled replays of known-good plans, keyed by plan fingerprint
+        return ReplayCache(self.config.get('replay_cache_size', 256),
+                           self.config.get('replay_cache_dir'))
+
+    @lazy_property
+    def settle_detector(self):
+        # With perception available, actions wait for the UI to settle instead of a fixed delay
+        return SettleDetector(
+            self.perception_module, self.config) if self.perception_module is not None else None
+
+    def warm_up(self) -> dict:
+        """Builds the GUI controller, input backend and caches now instead of on first use."""
+        return warm_up(self)
+
     def _initialize_gui_controller(self):
         print(f"Mock: GUI controller initialized for {self.os_type}.")
         # Placeholder for pyautogui, pywinauto, AppleScript/JXA, xdotool
@@ -32,70 +65,155 @@ class ActionModule:
         """Performs a specified action on the GUI."""
         print(
             f"Action: Performing action '{action_type}' with params: {parameters} using {self.gui_controller}")
-        success = False
         result_details = {"action_type": action_type, "parameters": parameters}
-        default_delay = self.config.get(
-            'default_delay_ms', 100) / 1000.0  # convert ms to s
-
         try:
-            if action_type == "click":
-                x = parameters.get('x')
-                y = parameters.get('y')
-                element_id = parameters.get('element_id')
-                # In a real scenario, if element_id is provided, use accessibility to find its coordinates
-                # then use self.gui_controller.click(coords)
-                print(
-                    f"Action: Simulating click at ({x}, {y}) or element {element_id}")
-                # import pyautogui; pyautogui.click(x,y) # Example with actual library
-                success = True
-            elif action_type == "type_text":
-                text_to_type = parameters.get('text', '')
-                # Could be used to focus element first
-                element_id = parameters.get('element_id')
-                print(
-                    f"Action: Simulating typing text '{text_to_type}' into element {element_id}")
-                # import pyautogui; pyautogui.typewrite(text_to_type, interval=0.05) # Example
-                success = True
-            elif action_type == "press_key":
-                key_name = parameters.get('key_name')
-                print(f"Action: Simulating pressing key: {key_name}")
-                # import pyautogui; pyautogui.press(key_name) # Example
-                success = True
-            elif action_type == "open_app":
-                app_name = parameters.get('app_name')
-                success = self._open_application(app_name)
-                result_details["message"] = f"Application '{app_name}' opened: {success}"
-            elif action_type == "scroll":
-                direction = parameters.get('direction', 'down')
-                # Arbitrary unit (pixels or lines)
-                amount = parameters.get('amount', 100)
-                print(f"Action: Simulating scroll {direction} by {amount}")
-                # import pyautogui; pyautogui.scroll(-amount if direction == 'down' else amount) # Example
-                success = True
-            elif action_type == "wait":
+            if action_type == "wait":
                 duration_s = parameters.get('duration_s', 1.0)
                 print(f"Action: Waiting for {duration_s} seconds.")
                 time.sleep(duration_s)
                 success = True
             else:
-                result_details["error"] = f"Unknown action type: {action_type}"
-                print(f"Action: Unknown action type '{action_type}'")
-                success = False
-
-            if success:
-                # Small delay after action for UI to update
-                time.sleep(default_delay)
-
+                success = self._run_action(action_type, parameters, current_state, result_details)
+                if success:
+                    result_details["settle"] = self.wait_until_settled(
+                        action_type, parameters)
         except Exception as e:
-            error_msg = f"Error performing action {action_type}: {e}"
-            print(f"Action: {error_msg}")
-            result_details["error"] = error_msg
-            success = False
-            self.handle_error(action_type, parameters, e)
+            success = self._action_failed(action_type, parameters, e, result_details)
+        result_details["success"] = success
+        return result_details
 
+    async def perform_action_async(self, action_type: str, parameters: dict, current_state=None) -> dict:
+        """Like perform_action(); waits and settle polling do not block the event loop."""
+        print(
+            f"Action: Performing action '{action_type}' with params: {parameters} using {self.gui_controller}")
+        result_details = {"action_type": action_type, "parameters": parameters}
+        try:
+            if action_type == "wait":
+                duration_s = parameters.get('duration_s', 1.0)
+                print(f"Action: Waiting for {duration_s} seconds.")
+                await asyncio.sleep(duration_s)
+                success = True
+            else:
+                success = await asyncio.to_thread(
+                    self._run_action, action_type, parameters, current_state, result_details)
+                if success:
+                    result_details["settle"] = await self.wait_until_settled_async(
+                        action_type, parameters)
+        except Exception as e:
+            success = self._action_failed(action_type, parameters, e, result_details)
         result_details["success"] = success
         return result_details
 
+    def _run_action(self, action_type: str, parameters: dict, current_state, result_details: dict) -> bool:
+        if action_type in LOW_LEVEL_ACTIONS:
+            # Clicks, typing, keys and scrolling go to the input backend as one batch
+            self.dispatch_input(
+                [{"action": action_type, "params": parameters}], current_state)
+            return True
+        if action_type == "open_app":
+            app_name = parameters.get('app_name')
+            success = self._open_application(app_name)
+            result_details["message"] = f"Application '{app_name}' opened: {success}"
+            return success
+        result_details["error"] = f"Unknown action type: {action_type}"
+        print(f"Action: Unknown action type '{action_type}'")
+        return False
+
+    def _action_failed(self, action_type: str, parameters: dict, error: Exception, result_details: dict) -> bool:
+        error_msg = f"Error performing action {action_type}: {error}"
+        print(f"Action: {error_msg}")
+        result_details["error"] = error_msg
+        self.handle_error(action_type, parameters, error)
+        return False
+
+    def dispatch_input(self, actions: list, current_state=None) -> list:
+        """Coalesces low-level actions into native input events and sends them in one backend call."""
+        events = coalesce_actions(actions, current_state)
+        print(
+            f"Action: Dispatching {len(actions)} action(s) as {len(events)} input event(s) via {type(self.input_backend).__name__}")
+        self.input_backend.send(events, self.typing_interval_ms)
+        return events
+
+    def perform_actions(self, actions: list, current_state=None) -> list:
+        """
+        Performs a sequence of {"action", "params"} dicts. Each run of consecutive
+        low-level actions (click, type_text, press_key, scroll) is coalesced and sent as
+        one input batch, followed by a single settle wait; other actions go through
+        perform_action. Returns one result dict per action.
+        """
+        results = []
+        index = 0
+        while index < len(actions):
+            run_end = index
+            while run_end < len(actions) and actions[run_end]["action"] in LOW_LEVEL_ACTIONS:
+                run_end += 1
+            if run_end == index:
+                action = actions[index]
+                results.append(self.perform_action(
+                    action["action"], action.get("params", {}), current_state))
+                if not results[-1]["success"]:
+                    break
+                index += 1
+                continue
+            run = actions[index:run_end]
+            try:
+                self.dispatch_input(run, current_state)
+                settle = self.wait_until_settled(run[-1]["action"], run[-1].get("params"))
+                results.extend({"action_type": a["action"], "parameters": a.get("params", {}),
+                                "success": True, "settle": settle} for a in run)
+            except Exception as e:
+                error_msg = f"Error performing input batch: {e}"
+                print(f"Action: {error_msg}")
+                results.extend({"action_type": a["action"], "parameters": a.get("params", {}),
+                                "success": False, "error": error_msg} for a in run)
+                self.handle_error(run[0]["action"], run[0].get("params", {}), e)
+                break
+            index = run_end
+        return results
+
+    def wait_until_settled(self, action_type: str, parameters: dict = None) -> dict:
+        """
+        Waits until the UI is ready after an action. `parameters` may name a target
+        condition ("wait_for" / "wait_until_gone": element properties) and a
+        "settle_timeout_ms"; otherwise screen and accessibility stability is used.
+        Without a perception module this falls back to the fixed `default_delay_ms`.
+        """
+        parameters = parameters if parameters else {}
+        if self.settle_detector is None:
+            default_delay = self.config.get(
+                'default_delay_ms', 100) / 1000.0  # convert ms to s
+            time.sleep(default_delay)
+            return {"settled": True, "reason": "fixed_delay", "waited_ms": default_delay * 1000, "polls": 0}
+        settle = self.settle_detector.wait(
+            action_type, self._settle_condition(parameters), parameters.get("settle_timeout_ms"))
+        return self._report_settle(action_type, settle)
+
+    async def wait_until_settled_async(self, action_type: str, parameters: dict = None) -> dict:
+        """Like wait_until_settled(), without blocking the event loop."""
+        parameters = parameters if parameters else {}
+        if self.settle_detector is None:
+            default_delay = self.config.get('default_delay_ms', 100) / 1000.0
+            await asyncio.sleep(default_delay)
+            return {"settled": True, "reason": "fixed_delay", "waited_ms": default_delay * 1000, "polls": 0}
+        settle = await self.settle_detector.wait_async(
+            action_type, self._settle_condition(parameters), parameters.get("settle_timeout_ms"))
+        return self._report_settle(action_type, settle)
+
+    @staticmethod
+    def _settle_condition(parameters: dict):
+        if parameters.get("wait_for"):
+            return element_appears(parameters["wait_for"])
+        if parameters.get("wait_until_gone"):
+            return element_disappears(parameters["wait_until_gone"])
+        return None
+
+    @staticmethod
+    def _report_settle(action_type: str, settle: dict) -> dict:
+        if not settle["settled"]:
+            print(
+                f"Action: UI did not settle after '{action_type}' within {settle['waited_ms']:.0f} ms")
+        return settle
+
     def _open_application(self, app_name_or_path: str) -> bool:
         print(f"Action: Attempting to open application: {app_name_or_path}")
         try:
@@ -119,30 +237,20 @@ class ActionModule:
                 f"Action: Unexpected error opening '{app_name_or_path}': {e}")
         return False
 
-    def generate_automation_script(self, action_sequence: list) -> str:
-        """Dynamically generates a Python script (e.g., using pyautogui) for an action sequence."""
+    def compile_action_sequence(self, action_sequence: list, step_results: list = None) -> CompiledSequence:
+        """
+        Compiles a plan or action sequence into a validated, serializable replay
+        (see action_replay). Results of a successful run resolve element references.
+        """
+        print(
+            f"Action: Compiling replay for {len(action_sequence)} actions.")
+        return compile_plan(action_sequence, step_results)
+
+    def replay(self, compiled: CompiledSequence) -> dict:
+        """Replays a compiled sequence straight through the input backend."""
         print(
-            f"Action: Generating automation script for {len(action_sequence)} actions.")
-        script_lines = ["import pyautogui", "import time"]
-        for action in action_sequence:
-            action_type = action.get("action")
-            params = action.get("params", {})
-            if action_type == "click":
-                script_lines.append(
-                    f"pyautogui.click(x={params.get('x')}, y={params.get('y')})")
-            elif action_type == "type_text":
-                script_lines.append(
-                    f"pyautogui.typewrite('{params.get('text', '')}', interval=0.05)")
-            elif action_type == "press_key":
-                script_lines.append(
-                    f"pyautogui.press('{params.get('key_name')}')")
-            elif action_type == "wait":
-                script_lines.append(
-                    f"time.sleep({params.get('duration_s', 1.0)})")
-            # Add more mappings as needed
-            # Small delay between actions
-            script_lines.append("time.sleep(0.1)")
-        return "\n".join(script_lines)
+            f"Action: Replaying compiled sequence ({len(compiled)} ops).")
+        return ReplayEngine(self, self.perception_module).replay(compiled)
 
     def handle_error(self, failed_action_type: str, failed_parameters: dict, error: Exception):
         """Handles errors during action execution, potentially attempting recovery."""
@@ -154,8 +262,10 @@ class ActionModule:
 
 if __name__ == '__main__':
     print("Testing ActionModule...")
+    from .perception_module import PerceptionModule
     config = {'os_override': None, 'default_delay_ms': 50}
-    action_module = ActionModule(config=config)
+    action_module = ActionModule(
+        config=config, perception_module=PerceptionModule({'parallel_perception': False}))
     print(f"Initialized for OS: {action_module.os_type}")
 
     # Test click
@@ -175,14 +285,25 @@ if __name__ == '__main__':
     # res_open = action_module.perform_action("open_app", {"app_name": app_to_test})
     # print(f"Open app ('{app_to_test}') result: {res_open}")
 
+    # Test a batch: one click, three typed chunks and two keys become three input events
+    res_batch = action_module.perform_actions([
+        {"action": "click", "params": {"x": 200, "y": 120}},
+        {"action": "type_text", "params": {"text": "Hello, "}},
+        {"action": "type_text", "params": {"text": "world"}},
+        {"action": "press_key", "params": {"key_name": "tab"}},
+        {"action": "press_key", "params": {"key_name": "enter"}},
+    ])
+    print(f"Batch results: {[r['success'] for r in res_batch]}, backend batches: {action_module.input_backend.batches[-1]}")
+
     # Test unknown action
     res_unknown = action_module.perform_action(
         "fly_to_moon", {"speed": "warp9"})
     print(f"Unknown action result: {res_unknown}")
 
-    # Test script generation
-    script = action_module.generate_automation_script([
+    # Test replay compilation
+    compiled = action_module.compile_action_sequence([
         {"action": "click", "params": {"x": 10, "y": 20}},
-        {"action": "type_text", "params": {"text": "Generated script"}}
+        {"action": "type_text", "params": {"text": "Replayed text"}}
     ])
-    print(f"Generated script:\n{script}")
+    print(f"Compiled replay: {compiled.to_json()}")
+    print(f"Replay result: {action_module.replay(compiled)}")
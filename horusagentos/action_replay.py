@@ -0,0 +1,258 @@
+# tech.md: 4.3. Action Layer - Automation Script Generation
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .input_backends import LOW_LEVEL_ACTIONS, coalesce_actions
+
+REPLAY_FORMAT_VERSION = 1
+
+# Opcode -> required argument names and types
+OPCODES = {
+    "input": {"events": list},           # coalesced native input events, one backend call
+    "settle": {"action_type": str},      # wait for the UI to settle after the previous op
+    "open_app": {"app_name": str},
+    "wait": {"duration_s": (int, float)},
+    "checkpoint": {"element": dict},     # assert an element matching these properties exists
+}
+# Optional arguments: a checkpoint's "bounds" are where the element was when the replay
+# was compiled; later input ops use coordinates resolved from them
+OPTIONAL_ARGS = {"checkpoint": {"bounds": list}}
+_EVENT_TYPES = {"text": "text", "keys": "keys", "click": "button", "scroll": "amount"}
+
+
+class ReplayCompileError(ValueError):
+    """Raised when an action sequence cannot be compiled or a compiled sequence is invalid."""
+
+
+def plan_fingerprint(plan: list) -> str:
+    """Stable key for a plan: a hash of its actions and parameters (descriptions ignored)."""
+    canonical = json.dumps([[step.get("action"), step.get("params", {})] for step in plan],
+                           sort_keys=True, default=str)
+    return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+
+def validate_ops(ops: list):
+    """Checks every op against OPCODES; raises ReplayCompileError on the first problem."""
+    for pc, op in enumerate(ops):
+        if not isinstance(op, dict) or op.get("op") not in OPCODES:
+            raise ReplayCompileError(f"op {pc}: unknown opcode {op!r}")
+        for name, expected in OPCODES[op["op"]].items():
+            if not isinstance(op.get(name), expected):
+                raise ReplayCompileError(f"op {pc} ({op['op']}): '{name}' missing or not {expected}")
+        for name, expected in OPTIONAL_ARGS.get(op["op"], {}).items():
+            if name in op and not isinstance(op[name], expected):
+                raise ReplayCompileError(f"op {pc} ({op['op']}): '{name}' is not {expected}")
+        if not all(isinstance(step, int) for step in op.get("steps", [])):
+            raise ReplayCompileError(f"op {pc}: 'steps' must be plan step indices")
+        if op["op"] == "input":
+            for event in op["events"]:
+                if _EVENT_TYPES.get(event.get("type")) not in event:
+                    raise ReplayCompileError(f"op {pc}: malformed input event {event!r}")
+
+
+class CompiledSequence:
+    """
+    Validated, serializable list of resolved actions ("ops"). Element references are
+    already resolved to coordinates and consecutive input is coalesced, so replaying
+    needs neither planning nor perception except at "checkpoint" ops.
+    """
+
+    def __init__(self, ops: list, step_count: int, source_key: str = None):
+        validate_ops(ops)
+        self.ops = ops
+        self.step_count = step_count
+        self.source_key = source_key
+
+    def __len__(self):
+        return len(self.ops)
+
+    def to_json(self) -> str:
+        return json.dumps({"version": REPLAY_FORMAT_VERSION, "source_key": self.source_key,
+                           "step_count": self.step_count, "ops": self.ops})
+
+    @classmethod
+    def from_json(cls, data: str):
+        payload = json.loads(data)
+        if payload.get("version") != REPLAY_FORMAT_VERSION:
+            raise ReplayCompileError(f"Unsupported replay format version: {payload.get('version')}")
+        return cls(payload["ops"], payload["step_count"], payload.get("source_key"))
+
+
+def compile_plan(plan: list, step_results: list = None) -> CompiledSequence:
+    """
+    Compiles a plan into a CompiledSequence. `step_results` from a successful run are
+    used to resolve element references: elements found by find_element steps become
+    checkpoints (recording the element's bounds) and supply coordinates for later
+    clicks and typing.
+    """
+    step_results = step_results if step_results else []
+    found = []
+    ops = []
+    run, run_steps = [], []
+
+    def flush_run():
+        if run:
+            events = coalesce_actions(run, {"ui_elements": found})
+            ops.append({"op": "input", "events": events, "steps": list(run_steps)})
+            ops.append({"op": "settle", "action_type": run[-1]["action"], "steps": []})
+            run.clear()
+            run_steps.clear()
+
+    for index, step in enumerate(plan):
+        action, params = step.get("action"), step.get("params", {})
+        if action in LOW_LEVEL_ACTIONS:
+            run.append({"action": action, "params": params})
+            run_steps.append(index)
+            continue
+        flush_run()
+        if action == "find_element":
+            result = step_results[index] if index < len(step_results) else {}
+            element = result.get("details", {}).get("found_element")
+            checkpoint = {"op": "checkpoint", "element": dict(params), "steps": [index]}
+            if element:
+                found.append(element)
+                if element.get("bounds"):
+                    checkpoint["bounds"] = list(element["bounds"])
+            ops.append(checkpoint)
+        elif action == "open_app":
+            ops.append({"op": "open_app", "app_name": params.get("app_name", ""), "steps": [index]})
+            ops.append({"op": "settle", "action_type": "open_app", "steps": []})
+        elif action == "wait":
+            ops.append({"op": "wait", "duration_s": params.get("duration_s", 1.0), "steps": [index]})
+        else:
+            raise ReplayCompileError(f"step {index}: action '{action}' cannot be compiled")
+    flush_run()
+    return CompiledSequence(ops, len(plan), plan_fingerprint(plan))
+
+
+class ReplayEngine:
+    """
+    Runs a CompiledSequence directly against an ActionModule's input backend. A
+    checkpoint fails when its element is missing or no longer at the bounds it had
+    at compile time, since the coordinates of the input that follows would be stale.
+    """
+
+    def __init__(self, action_module, perception_module=None):
+        self.action_module = action_module
+        self.perception_module = perception_module
+
+    def replay(self, compiled: CompiledSequence) -> dict:
+        """
+        Returns the same shape as DecisionModule.execute_plan, with "replayed": True.
+        A failed replay also reports "resume_step": the first plan step that has not
+        completed, from which the plan can be executed step by step without repeating
+        input, or None when input of the failed op may already have been sent.
+        """
+        started = time.monotonic()
+        step_results = [None] * compiled.step_count
+        failed_at = None
+        for pc, op in enumerate(compiled.ops):
+            details = {"replayed": True, "op": pc}
+            success = True
+            try:
+                if op["op"] == "input":
+                    self.action_module.input_backend.send(
+                        op["events"], self.action_module.typing_interval_ms)
+                elif op["op"] == "settle":
+                    details["settle"] = self.action_module.wait_until_settled(op["action_type"])
+                elif op["op"] == "open_app":
+                    success = self.action_module._open_application(op["app_name"])
+                elif op["op"] == "wait":
+                    time.sleep(op["duration_s"])
+                elif op["op"] == "checkpoint" and self.perception_module is not None:
+                    element = self.perception_module.find_element_by_properties(op["element"])
+                    success = element is not None
+                    details["found_element"] = element
+                    if success and op.get("bounds") and list(element.get("bounds") or []) != op["bounds"]:
+                        success = False
+                        details["error"] = (f"Checkpoint element moved from {op['bounds']} "
+                                            f"to {element.get('bounds')}")
+            except Exception as e:
+                success = False
+                details["error"] = f"Error replaying op {pc} ({op['op']}): {e}"
+            for step in op.get("steps", []):
+                step_results[step] = {"success": success, "details": details}
+            if not success:
+                failed_at = pc
+                print(f"Action: Replay stopped at op {pc} ({op['op']}).")
+                break
+        resume_step = None
+        if failed_at is not None and compiled.ops[failed_at]["op"] != "input":
+            # Steps before the failed op completed; a settle op has no steps of its own
+            resume_step = next((op["steps"][0] for op in compiled.ops[failed_at:] if op.get("steps")),
+                               compiled.step_count)
+        step_results = [result for result in step_results if result is not None]
+        overall_success = failed_at is None
+        return {"summary": "Plan replayed from compiled sequence." if overall_success
+                else "Replay failed at a checkpoint or action.",
+                "step_results": step_results, "overall_success": overall_success,
+                "replayed": True, "failed_op": failed_at, "resume_step": resume_step,
+                "elapsed_ms": (time.monotonic() - started) * 1000}
+
+
+class ReplayCache:
+    """LRU of compiled sequences keyed by plan fingerprint, optionally mirrored to a directory."""
+
+    def __init__(self, max_entries: int = 256, directory: str = None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str):
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is not None:
+                self._entries.move_to_end(key)
+                return compiled
+        if self.directory and os.path.exists(self._path(key)):
+            try:
+                with open(self._path(key)) as f:
+                    compiled = CompiledSequence.from_json(f.read())
+            except (OSError, ValueError) as e:
+                print(f"Action: Ignoring unreadable replay {key}: {e}")
+                return None
+            self.put(key, compiled, persist=False)
+            return compiled
+        return None
+
+    def put(self, key: str, compiled: CompiledSequence, persist: bool = True):
+        with self._lock:
+            self._entries[key] = compiled
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        if persist and self.directory:
+            tmp_path = self._path(key) + ".tmp"
+            with open(tmp_path, "w") as f:
+                f.write(compiled.to_json())
+            os.replace(tmp_path, self._path(key))
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.directory and os.path.exists(self._path(key)):
+            os.remove(self._path(key))
+
+
+if __name__ == '__main__':
+    print("Testing compile_plan...")
+    plan = [{"action": "find_element", "params": {"type": "textfield", "name": "document"}},
+            {"action": "click", "params": {"element_id": "doc"}},
+            {"action": "type_text", "params": {"text": "Hello "}},
+            {"action": "type_text", "params": {"text": "world"}},
+            {"action": "press_key", "params": {"key_name": "enter"}}]
+    results = [{"success": True, "details": {"found_element": {
+        "id": "doc", "type": "textfield", "name": "document", "bounds": [10, 10, 200, 40]}}}]
+    compiled = compile_plan(plan, results)
+    print(f"{len(plan)} steps -> {len(compiled)} ops: {compiled.to_json()}")
+    print(f"Round trip ops equal: {CompiledSequence.from_json(compiled.to_json()).ops == compiled.ops}")
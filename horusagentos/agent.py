@@ -3,15 +3,20 @@
 import platform
 import traceback
 
-# Adjusted imports for flattened structure
-from .perception_module import PerceptionModule
-from .decision_module import DecisionModule
-from .action_module import ActionModule
-from .memory_module import MemoryModule
-from .communication_module import CommunicationModule
+from .lazy import is_initialized, lazy_property, warm_up
+
+# Adjusted imports for flattened structure; the module classes are imported on first
+# use (see the lazy properties below) so that creating an agent stays cheap
 # from .utils import get_platform_specific_config # Example utility
 
 
+async def _recording_steps(steps, recorded: list):
+    """Passes a streamed plan through, appending each step to `recorded` as it arrives."""
+    async for step in steps:
+        recorded.append(step)
+        yield step
+
+
 class HorusAgentOS:
     def __init__(self, llm_provider_config: dict, agent_config: dict = None):
         """
@@ -28,26 +33,68 @@ class HorusAgentOS:
 
         print(f"Initializing HorusAgentOS on {self.platform_os}...")
 
-        # Initialize Modules (Layers)
-        self.perception_module = PerceptionModule(
+        # Modules (Layers) and their tools are initialized on first use; see warm_up()
+        print("HorusAgentOS initialized successfully.")
+
+    @lazy_property
+    def event_bus(self):
+        # Internal pub/sub shared by the modules (step results, internal messages)
+        from .event_bus import EventBus
+        return EventBus(self.agent_config.get('event_bus_config'))
+
+    @lazy_property
+    def perception_module(self):
+        from .perception_module import PerceptionModule
+        return PerceptionModule(
             config=self.agent_config.get('perception_config'))
-        self.action_module = ActionModule(
-            config=self.agent_config.get('action_config'))
-        self.memory_module = MemoryModule(
+
+    @lazy_property
+    def action_module(self):
+        from .action_module import ActionModule
+        return ActionModule(
+            config=self.agent_config.get('action_config'),
+            perception_module=self.perception_module)
+
+    @lazy_property
+    def memory_module(self):
+        from .memory_module import MemoryModule
+        return MemoryModule(
             config=self.agent_config.get('memory_config'))
 
-        self.decision_module = DecisionModule(
+    @lazy_property
+    def decision_module(self):
+        from .decision_module import DecisionModule
+        return DecisionModule(
             llm_provider_config=self.llm_provider_config,
             perception_module=self.perception_module,
             action_module=self.action_module,
             memory_module=self.memory_module,
-            config=self.agent_config.get('decision_config')
+            config=self.agent_config.get('decision_config'),
+            event_bus=self.event_bus
         )
 
-        self.communication_module = CommunicationModule(
-            config=self.agent_config.get('communication_config'))
+    @lazy_property
+    def communication_module(self):
+        from .communication_module import CommunicationModule
+        return CommunicationModule(
+            config=self.agent_config.get('communication_config'),
+            event_bus=self.event_bus)
 
-        print("HorusAgentOS initialized successfully.")
+    def warm_up(self, modules: list = None) -> dict:
+        """
+        Initializes the given modules (default: all) and their tools now, e.g. before
+        the first task of a long-running worker. Returns the time each took in ms.
+        """
+        timings = warm_up(self, modules)
+        print(f"HorusAgentOS warmed up: { {name: round(ms, 1) for name, ms in timings.items()} }")
+        return timings
+
+    def start_api_server(self):
+        """
+        Serves this agent over HTTP on the communication host/port: submit tasks (202 +
+        job id), poll them, follow their steps as server-sent events, read the status.
+        """
+        return self.communication_module.start_api_server(self)
 
     def execute_task(self, natural_language_instruction: str) -> dict:
         """
@@ -59,6 +106,15 @@ class HorusAgentOS:
         Returns:
             A dictionary summarizing the outcome of the task execution.
         """
+        from .async_runtime import run_sync  # asyncio is only imported once a task runs
+        return run_sync(self.execute_task_async(natural_language_instruction))
+
+    async def execute_task_async(self, natural_language_instruction: str) -> dict:
+        """
+        Async execute_task(): LLM calls, waits and module I/O are awaited, so one
+        process can interleave many agents' tasks on a single event loop.
+        """
+        from .async_runtime import call_async
         print(f"Received task: {natural_language_instruction}")
         task_summary = {
             "instruction": natural_language_instruction,
@@ -69,19 +125,28 @@ class HorusAgentOS:
         }
 
         try:
-            task_plan = self.decision_module.create_plan(
-                natural_language_instruction)
+            # Streamed plans start executing as soon as the first step is generated
+            task_plan = await self.decision_module.create_plan_async(
+                natural_language_instruction, stream=self.agent_config.get('stream_plans', True))
+            if isinstance(task_plan, list):
+                task_summary["plan"] = task_plan
+            else:
+                # Keep the steps streamed so far, so a failure summary still has them
+                task_summary["plan"] = []
+                task_plan = _recording_steps(task_plan, task_summary["plan"])
+
+            # A streamed plan is only known to be empty once its stream has ended
+            if isinstance(task_plan, list) and not task_plan:
+                return await self._reject_empty_plan(natural_language_instruction, task_summary)
+
+            execution_results = await self.decision_module.execute_plan_async(task_plan)
+            task_plan = execution_results.get("plan", task_summary["plan"])
             task_summary["plan"] = task_plan
 
             if not task_plan:
-                task_summary["message"] = "Failed to create a task plan."
-                self.memory_module.record_error(
-                    natural_language_instruction, None, task_summary, None)
-                return task_summary
-
-            print(f"Generated Plan: {task_plan}")
+                return await self._reject_empty_plan(natural_language_instruction, task_summary)
 
-            execution_results = self.decision_module.execute_plan(task_plan)
+            print(f"Executed Plan: {task_plan}")
             task_summary["results"] = execution_results
             task_summary["message"] = execution_results.get(
                 "summary", "Plan execution finished.")
@@ -103,7 +168,7 @@ class HorusAgentOS:
             else:
                 task_summary["status"] = "failed"
 
-            self.decision_module.learn_from_execution(
+            await self.decision_module.learn_from_execution_async(
                 natural_language_instruction, task_plan, execution_results)
 
             return task_summary
@@ -114,38 +179,49 @@ class HorusAgentOS:
             task_summary["message"] = error_message
             tb_str = traceback.format_exc()
             print(tb_str)
-            self.memory_module.record_error(natural_language_instruction, task_summary.get("plan"),
-                                            {"error": str(e), "traceback": tb_str}, None)
+            await call_async(self.memory_module, 'record_error', natural_language_instruction, task_summary.get("plan"),
+                             {"error": str(e), "traceback": tb_str}, None)
             return task_summary
 
+    async def _reject_empty_plan(self, natural_language_instruction: str, task_summary: dict) -> dict:
+        from .async_runtime import call_async
+        task_summary["message"] = "Failed to create a task plan."
+        await call_async(self.memory_module, 'record_error',
+                         natural_language_instruction, None, task_summary, None)
+        return task_summary
+
     def get_agent_status(self):
         """Returns the current status of the agent and its modules."""
         return {
             "platform": self.platform_os,
             "llm_config_model": self.llm_provider_config.get("model", "N/A"),
+            # Reports which modules have been built so far; never triggers initialization
             "modules_initialized": {
-                "perception": hasattr(self, 'perception_module') and self.perception_module is not None,
-                "decision": hasattr(self, 'decision_module') and self.decision_module is not None,
-                "action": hasattr(self, 'action_module') and self.action_module is not None,
-                "memory": hasattr(self, 'memory_module') and self.memory_module is not None,
-                "communication": hasattr(self, 'communication_module') and self.communication_module is not None
+                "perception": is_initialized(self, 'perception_module'),
+                "decision": is_initialized(self, 'decision_module'),
+                "action": is_initialized(self, 'action_module'),
+                "memory": is_initialized(self, 'memory_module'),
+                "communication": is_initialized(self, 'communication_module')
             }
         }
 
 
 # Example of how to run if this file is executed directly (for testing)
 if __name__ == "__main__":
+    import os
+    import tempfile
+
     print("Running HorusAgentOS Core (agent.py) direct execution example...")
 
     mock_llm_config = {
-        "provider": "mock_llm",
+        "provider": "mock",
         "model": "mock_model_v1",
         "api_key": "mock_key_123"
     }
     mock_agent_config = {
         'perception_config': {'os_override': None},  # Example config
         'action_config': {'default_timeout': 10},  # Example config
-        'memory_config': {'db_type': 'sqlite', 'path': './horus_memory.db'},
+        'memory_config': {'db_type': 'sqlite', 'path': os.path.join(tempfile.mkdtemp(), 'horus_memory.db')},
         'decision_config': {'max_retries': 3},
         'communication_config': {'port': 0}  # 0 for dynamic port or None
     }
@@ -156,8 +232,10 @@ if __name__ == "__main__":
         print("\nAgent Status Before Task:")
         print(agent.get_agent_status())
 
+        step_results = agent.event_bus.subscribe("decision.step_result", delivery="pull")
         task = "Simulate opening a file and typing hello."
         result = agent.execute_task(task)
+        print(f"Step results published on the event bus: {len(step_results.drain())}")
 
         print("\nTask Execution Result:")
         print(f"Instruction: {result['instruction']}")
@@ -0,0 +1,442 @@
+# tech.md: 4.2. Decision Layer - Multi-Agent Coordination
+import asyncio
+import inspect
+import itertools
+import json
+import time
+from collections import deque
+
+from .plan_scheduler import step_dependencies
+
+
+def split_task(task_definition: dict) -> list:
+    """
+    Splits a task definition into sub-plans, each {"id", "instruction" | "plan",
+    "capabilities"}. Accepted forms (checked in this order):
+
+    - "subtasks": instructions (str) or sub-plan dicts, one sub-plan each.
+    - "items" + "instruction_template": a batch; "{item}" is replaced per item.
+    - "plan": plan steps, split into the independent groups of its dependency graph.
+    - "instruction": a single sub-plan.
+
+    "capabilities" on the definition apply to sub-plans that do not set their own.
+    """
+    capabilities = list(task_definition.get("capabilities", []))
+    if "subtasks" in task_definition:
+        subtasks = [{"instruction": sub} if isinstance(sub, str) else dict(sub)
+                    for sub in task_definition["subtasks"]]
+    elif "items" in task_definition:
+        template = task_definition["instruction_template"]
+        subtasks = [{"instruction": template.format(item=item)} for item in task_definition["items"]]
+    elif "plan" in task_definition:
+        subtasks = [{"plan": group} for group in _independent_groups(task_definition["plan"])]
+    elif "instruction" in task_definition:
+        subtasks = [{"instruction": task_definition["instruction"]}]
+    else:
+        raise ValueError("Task definition needs 'subtasks', 'items', 'plan' or 'instruction'")
+    for index, subtask in enumerate(subtasks):
+        subtask.setdefault("id", f"subtask-{index}")
+        subtask.setdefault("capabilities", capabilities)
+    return subtasks
+
+
+def _independent_groups(plan: list) -> list:
+    """Groups plan steps into connected components of the dependency graph, in plan order."""
+    steps, parent = [], {}
+
+    def find(step_id):
+        while parent[step_id] != step_id:
+            parent[step_id] = parent[parent[step_id]]
+            step_id = parent[step_id]
+        return step_id
+
+    previous_id = None
+    for index, step in enumerate(plan):
+        # Make ids and dependencies explicit: positions and "previous step" change once split
+        step = dict(step, id=str(step.get("id", index)))
+        step["depends_on"] = [str(d) for d in step_dependencies(step, index, previous_id)]
+        previous_id = step["id"]
+        parent.setdefault(step["id"], step["id"])
+        for dependency in step["depends_on"]:
+            parent.setdefault(dependency, dependency)
+            parent[find(dependency)] = find(step["id"])
+        steps.append(step)
+    groups = {}
+    for step in steps:
+        groups.setdefault(find(step["id"]), []).append(step)
+    return list(groups.values())
+
+
+def succeeded(result) -> bool:
+    """Interprets execute_task summaries, execute_plan results and {"success": ...} dicts."""
+    if not isinstance(result, dict):
+        return result is not None
+    if "status" in result:
+        return result["status"] == "success"
+    if "overall_success" in result:
+        return bool(result["overall_success"])
+    return bool(result.get("success", True))
+
+
+def agent_executor(agent):
+    """
+    Wraps an agent as an async `executor(subtask) -> result`: a HorusAgentOS, a
+    DecisionModule (plans itself), a TaskRunner (instructions only) or a plain
+    function / coroutine function taking the subtask dict.
+    """
+    if hasattr(agent, 'execute_task_async'):
+        async def run(subtask):
+            if "plan" in subtask:
+                return await agent.decision_module.execute_plan_async(subtask["plan"])
+            return await agent.execute_task_async(subtask["instruction"])
+    elif hasattr(agent, 'execute_plan_async'):
+        async def run(subtask):
+            plan = subtask.get("plan") or await agent.create_plan_async(subtask["instruction"])
+            return await agent.execute_plan_async(plan)
+    elif hasattr(agent, 'submit'):
+        async def run(subtask):
+            if "plan" in subtask:
+                raise ValueError("A TaskRunner executes instructions, not plans")
+            return await asyncio.wrap_future(agent.submit(subtask["instruction"], block=False))
+    elif inspect.iscoroutinefunction(agent):
+        run = agent
+    else:
+        async def run(subtask):
+            return await asyncio.to_thread(agent, subtask)
+    return run
+
+
+def serve_agent(agent, communication_module):
+    """
+    Lets a coordinator in another process use this agent: answers the IPC requests
+    "ping" (heartbeat probe) and "execute_subplan" on the agent's IPC server.
+    """
+    executor = agent_executor(agent)
+
+    async def execute_subplan(subtask):
+        result = await executor(subtask)
+        return json.loads(json.dumps(result, default=str))  # only plain data crosses the wire
+
+    communication_module.register_ipc_handler("ping", lambda payload: {"alive": True})
+    communication_module.register_ipc_handler("execute_subplan", execute_subplan)
+    return communication_module.ipc_server
+
+
+class _Subtask:
+    __slots__ = ("spec", "capabilities", "future", "attempts", "agent_id")
+
+    def __init__(self, spec: dict, future):
+        self.spec = spec
+        self.capabilities = frozenset(spec.get("capabilities", ()))
+        self.future = future
+        self.attempts = 0
+        self.agent_id = None
+
+
+class _AgentSlot:
+    """A registered agent: its own queue of assigned sub-plans and the ones it is running."""
+
+    def __init__(self, agent_id: str, executor, capabilities, capacity: int, probe):
+        self.agent_id = agent_id
+        self.executor = executor
+        self.capabilities = frozenset(capabilities)
+        self.capacity = capacity
+        self.probe = probe
+        self.queue = deque()
+        self.running = {}  # _Subtask -> asyncio.Task
+        self.alive = True
+        self.last_heartbeat = None  # set by heartbeat() / a successful probe
+        self.workers = []
+        self.stats = {"completed": 0, "failed": 0, "stolen": 0}
+
+    @property
+    def load(self) -> float:
+        return (len(self.queue) + len(self.running)) / self.capacity
+
+    def can_run(self, subtask: _Subtask) -> bool:
+        return self.alive and subtask.capabilities <= self.capabilities
+
+
+class AgentCoordinator:
+    """
+    Runs multi-agent tasks across registered agents. Each sub-plan goes to the least
+    loaded live agent that has its capabilities; every agent works through its own
+    queue and, when that is empty, steals the newest queued sub-plan it can run from
+    the busiest other agent. Agents with a heartbeat (a `probe`, or pushes to
+    heartbeat()) that stay silent for `heartbeat_timeout_s` are declared dead and
+    their queued and running sub-plans are reassigned; so are those of an agent that
+    raises ConnectionError. A sub-plan that raises anything else is retried, on
+    another capable agent when there is one, up to `max_attempts` times. Results are merged in
+    sub-plan order.
+    """
+
+    def __init__(self, config: dict = None):
+        self.config = config if config else {}
+        self.heartbeat_interval_s = self.config.get('heartbeat_interval_s', 1.0)
+        self.heartbeat_timeout_s = self.config.get('heartbeat_timeout_s', 5.0)
+        self.max_attempts = self.config.get('max_attempts', 2)
+        self.agents = {}
+        self.stats = {"tasks": 0, "subtasks": 0, "stolen": 0, "reassigned": 0, "retried": 0}
+        self._task_ids = itertools.count(1)
+        self._loop = None
+        self._wakeup = None
+        self._monitor = None
+        self._pools = []  # IPC pools created for remote agents, closed with the coordinator
+
+    # --- agents ---------------------------------------------------------------
+
+    def register_agent(self, agent_id: str, agent, capabilities=(), capacity: int = 1, probe=None):
+        """
+        Registers an agent (see agent_executor for what `agent` may be) that can run
+        `capacity` sub-plans at once. `probe` is an optional coroutine function
+        returning truthy while the agent is alive; it is polled every heartbeat interval.
+        """
+        slot = _AgentSlot(agent_id, agent_executor(agent), capabilities, capacity, probe)
+        self.agents[agent_id] = slot
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._start_workers, slot)
+        return slot
+
+    def register_remote_agent(self, agent_id: str, address, capabilities=(), capacity: int = 1,
+                              pool=None, timeout_s: float = 600.0):
+        """Registers an agent in another process that runs serve_agent() on its IPC server at `address`."""
+        from .ipc_transport import IPCConnectionPool
+        if pool is None:
+            pool = IPCConnectionPool()
+            self._pools.append(pool)
+
+        async def execute(subtask):
+            return await pool.request(address, "execute_subplan", subtask, timeout_s)
+
+        async def probe():
+            return await pool.request(address, "ping", None, self.heartbeat_interval_s)
+
+        return self.register_agent(agent_id, execute, capabilities, capacity, probe)
+
+    def heartbeat(self, agent_id: str):
+        """Records that an agent is alive (for agents that push heartbeats instead of being probed)."""
+        slot = self.agents.get(agent_id)
+        if slot is not None:
+            slot.last_heartbeat = time.monotonic()
+
+    def unregister_agent(self, agent_id: str):
+        slot = self.agents.get(agent_id)
+        if slot is not None and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._retire, slot, "unregistered")
+        self.agents.pop(agent_id, None)
+
+    # --- scheduling -----------------------------------------------------------
+
+    def _start_workers(self, slot: _AgentSlot):
+        slot.last_heartbeat = slot.last_heartbeat or (time.monotonic() if slot.probe else None)
+        slot.workers = [asyncio.ensure_future(self._work(slot)) for _ in range(slot.capacity)]
+
+    def _ensure_started(self):
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Condition()
+            for slot in self.agents.values():
+                self._start_workers(slot)
+            self._monitor = asyncio.ensure_future(self._watch_heartbeats())
+
+    def _assign(self, subtask: _Subtask, avoid: _AgentSlot = None):
+        candidates = [slot for slot in self.agents.values() if slot.can_run(subtask)]
+        if avoid in candidates and len(candidates) > 1:
+            candidates.remove(avoid)  # retry somewhere else when possible
+        if not candidates:
+            self._settle(subtask, None, error=f"No live agent with capabilities {sorted(subtask.capabilities)}")
+            return
+        slot = min(candidates, key=lambda candidate: candidate.load)
+        subtask.agent_id = slot.agent_id
+        slot.queue.append(subtask)
+        asyncio.ensure_future(self._notify())
+
+    async def _notify(self):
+        async with self._wakeup:
+            self._wakeup.notify_all()
+
+    def _next(self, slot: _AgentSlot):
+        if slot.queue:
+            return slot.queue.popleft()
+        # Steal the newest queued sub-plan we can run from the busiest agent
+        for victim in sorted(self.agents.values(), key=lambda other: len(other.queue), reverse=True):
+            if victim is slot or not victim.queue:
+                continue
+            for subtask in reversed(victim.queue):
+                if slot.can_run(subtask):
+                    victim.queue.remove(subtask)
+                    subtask.agent_id = slot.agent_id
+                    slot.stats["stolen"] += 1
+                    self.stats["stolen"] += 1
+                    return subtask
+        return None
+
+    async def _work(self, slot: _AgentSlot):
+        while slot.alive:
+            subtask = self._next(slot)
+            if subtask is None:
+                async with self._wakeup:
+                    await self._wakeup.wait()
+                continue
+            subtask.attempts += 1
+            run = asyncio.ensure_future(slot.executor(subtask.spec))
+            slot.running[subtask] = run
+            try:
+                result = await run
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    raise  # the coordinator is closing
+                continue  # the agent was declared dead; the sub-plan has been reassigned
+            except ConnectionError as e:
+                # A remote agent that cannot be reached is treated like a missed heartbeat
+                self._retire(slot, f"is unreachable ({type(e).__name__})")
+            except Exception as e:
+                slot.stats["failed"] += 1
+                if subtask.attempts < self.max_attempts:
+                    self.stats["retried"] += 1
+                    self._assign(subtask, avoid=slot)
+                else:
+                    self._settle(subtask, slot, error=f"{type(e).__name__}: {e}")
+            else:
+                slot.stats["completed"] += 1
+                self._settle(subtask, slot, result)
+            finally:
+                slot.running.pop(subtask, None)
+
+    def _settle(self, subtask: _Subtask, slot, result=None, error: str = None):
+        if subtask.future.done():
+            return
+        outcome = {"id": subtask.spec["id"], "agent_id": slot.agent_id if slot else None,
+                   "attempts": subtask.attempts, "success": error is None and succeeded(result)}
+        outcome.update({"error": error} if error is not None else {"result": result})
+        subtask.future.set_result(outcome)
+
+    def _retire(self, slot: _AgentSlot, reason: str):
+        """Stops a dead or removed agent and hands its queued and running sub-plans to others."""
+        if not slot.alive:
+            return
+        slot.alive = False
+        print(f"Decision: Agent '{slot.agent_id}' {reason}; reassigning "
+              f"{len(slot.queue) + len(slot.running)} sub-plan(s).")
+        orphans = list(slot.running) + list(slot.queue)
+        slot.queue.clear()
+        for run in slot.running.values():
+            run.cancel()
+        for subtask in orphans:
+            self.stats["reassigned"] += 1
+            self._assign(subtask)
+        asyncio.ensure_future(self._notify())  # idle workers of this agent wake up and exit
+
+    async def _watch_heartbeats(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval_s)
+            slots = [slot for slot in self.agents.values() if slot.alive]
+            probed = [slot for slot in slots if slot.probe is not None]
+            outcomes = await asyncio.gather(*(asyncio.wait_for(slot.probe(), self.heartbeat_interval_s)
+                                              for slot in probed), return_exceptions=True)
+            now = time.monotonic()
+            for slot, outcome in zip(probed, outcomes):
+                if outcome and not isinstance(outcome, BaseException):
+                    slot.last_heartbeat = now
+            for slot in slots:
+                if slot.last_heartbeat is not None and now - slot.last_heartbeat > self.heartbeat_timeout_s:
+                    self._retire(slot, f"missed heartbeats for {now - slot.last_heartbeat:.1f} s")
+
+    # --- tasks ----------------------------------------------------------------
+
+    async def run_async(self, task_definition: dict) -> dict:
+        """
+        Splits the task, runs the sub-plans and returns the merged result: {"task_id",
+        "name", "success", "results" (in sub-plan order), "per_agent", "elapsed_ms"}.
+        """
+        self._ensure_started()
+        started = time.monotonic()
+        task_id = f"multi-{next(self._task_ids)}"
+        loop = asyncio.get_running_loop()
+        subtasks = [_Subtask(spec, loop.create_future()) for spec in split_task(task_definition)]
+        self.stats["tasks"] += 1
+        self.stats["subtasks"] += len(subtasks)
+        for subtask in subtasks:
+            self._assign(subtask)
+        results = list(await asyncio.gather(*(subtask.future for subtask in subtasks)))
+        per_agent = {}
+        for outcome in results:
+            per_agent[outcome["agent_id"]] = per_agent.get(outcome["agent_id"], 0) + 1
+        return {"task_id": task_id, "name": task_definition.get("name", "Unnamed Task"),
+                "success": all(outcome["success"] for outcome in results), "results": results,
+                "per_agent": per_agent, "elapsed_ms": (time.monotonic() - started) * 1000}
+
+    def run(self, task_definition: dict) -> dict:
+        """Synchronous wrapper around run_async()."""
+        from .async_runtime import run_sync
+        return run_sync(self.run_async(task_definition))
+
+    async def close_async(self):
+        tasks = [self._monitor] if self._monitor else []
+        for slot in self.agents.values():
+            slot.alive = False
+            tasks.extend(slot.workers)
+            tasks.extend(slot.running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for pool in self._pools:
+            pool.close()
+        await asyncio.sleep(0)  # let the closed connections' readers finish
+        self._loop = self._monitor = None
+
+    def close(self):
+        from .async_runtime import run_sync
+        if self._loop is not None and not self._loop.is_closed():
+            run_sync(self.close_async())
+
+
+if __name__ == '__main__':
+    from .async_runtime import run_sync
+
+    def simulated_agent(duration_s: float):
+        async def execute(subtask):
+            await asyncio.sleep(duration_s)
+            return {"success": True, "instruction": subtask.get("instruction")}
+        return execute
+
+    print("Testing AgentCoordinator...")
+    batch = {"name": "Invoice batch", "instruction_template": "Process invoice {item}", "items": list(range(48))}
+    baseline = None
+    for count in (1, 2, 4, 8):
+        coordinator = AgentCoordinator()
+        for i in range(count):
+            coordinator.register_agent(f"agent-{i}", simulated_agent(0.02))
+        result = coordinator.run(batch)
+        baseline = baseline or result["elapsed_ms"]
+        print(f"{count} agent(s): {len(result['results'])} sub-plans in {result['elapsed_ms']:.0f} ms "
+              f"(speed-up {baseline / result['elapsed_ms']:.1f}x), success {result['success']}")
+        coordinator.close()
+
+    # Uneven agents: the fast one steals from the slow one's queue
+    coordinator = AgentCoordinator()
+    coordinator.register_agent("fast", simulated_agent(0.01))
+    coordinator.register_agent("slow", simulated_agent(0.05))
+    result = coordinator.run(batch)
+    print(f"Work stealing: per agent {result['per_agent']}, stolen {coordinator.stats['stolen']}")
+    coordinator.close()
+
+    # A dead agent: its probe stops answering, its sub-plans move to the others
+    coordinator = AgentCoordinator({"heartbeat_interval_s": 0.05, "heartbeat_timeout_s": 0.15})
+    born = time.monotonic()
+
+    async def dies_soon():
+        return time.monotonic() - born < 0.1
+
+    coordinator.register_agent("crashing", simulated_agent(10), probe=dies_soon)
+    coordinator.register_agent("healthy", simulated_agent(0.02), capabilities=["browser"])
+    result = coordinator.run({"name": "Heartbeat", "subtasks": [f"Step {i}" for i in range(6)] +
+                              [{"instruction": "Needs a browser", "capabilities": ["browser"]}]})
+    print(f"After heartbeat loss: success {result['success']}, per agent {result['per_agent']}, "
+          f"reassigned {coordinator.stats['reassigned']}")
+
+    # Plans split into independent groups by their dependencies
+    plan = [{"id": "a", "action": "wait", "params": {}}, {"id": "b", "action": "wait", "params": {}},
+            {"id": "c", "action": "wait", "params": {}, "depends_on": []}]
+    print(f"Plan groups: {[[step['id'] for step in group] for group in _independent_groups(plan)]}")
+    coordinator.close()
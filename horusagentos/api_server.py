@@ -0,0 +1,338 @@
+# tech.md: 4.5. Communication Layer - Agent API
+import asyncio
+import contextvars
+import itertools
+import json
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs, urlsplit
+
+# The job whose task is running in the current context; step events published by
+# the DecisionModule while it runs are attributed to it
+current_job = contextvars.ContextVar("horus_api_job", default=None)
+
+_REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class _Job:
+    """One submitted task: its state, result and event history (replayed to late SSE clients)."""
+
+    def __init__(self, job_id: str, instruction: str):
+        self.job_id = job_id
+        self.instruction = instruction
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.events = []
+        self.listeners = set()
+        self.task = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("done", "error", "cancelled")
+
+    def emit(self, event: str, data: dict):
+        self.events.append((len(self.events) + 1, event, data))
+        for listener in self.listeners:
+            listener.put_nowait(self.events[-1])
+
+    def summary(self) -> dict:
+        return {"job_id": self.job_id, "instruction": self.instruction, "status": self.status,
+                "submitted": self.submitted, "started": self.started, "finished": self.finished,
+                "steps": sum(1 for _, event, _ in self.events if event == "step"),
+                "result": self.result, "error": self.error}
+
+
+class AgentAPIServer:
+    """
+    HTTP/1.1 API for submitting and following tasks, on stdlib asyncio (one event loop,
+    no thread per request, keep-alive connections):
+
+    - POST /tasks {"instruction": ...} -> 202 {"job_id", ...} (Location: /tasks/<id>)
+    - GET /tasks/<id>         -> job state and, once done, the execute_task summary
+    - GET /tasks/<id>/events  -> server-sent events: "status", one "step" per executed
+                                 plan step, and a final "done" (Last-Event-ID resumes)
+    - DELETE /tasks/<id>      -> cancels a job that has not started yet
+    - GET /tasks              -> all retained jobs;  GET /status -> agent and server status
+
+    `backend` runs the tasks: a HorusAgentOS (tasks run on this loop, at most
+    `max_concurrent_tasks` at a time; step events come from its event bus) or a
+    TaskRunner (tasks go to its worker processes; status events only).
+
+    `max_concurrent_tasks` defaults to 1 for an agent, which drives a single screen
+    and input device, and to the worker count for a TaskRunner. Set it explicitly
+    to run more tasks at once on one agent.
+    """
+
+    def __init__(self, backend=None, host: str = "127.0.0.1", port: int = 0, event_bus=None, config: dict = None):
+        self.backend = backend
+        self.host = host
+        self.port = port
+        self.config = config if config else {}
+        self.max_concurrent_tasks = self.config.get(
+            'max_concurrent_tasks', getattr(backend, 'worker_count', 1) if hasattr(backend, 'submit') else 1)
+        self.max_jobs = self.config.get('max_jobs', 1000)
+        self.max_body_bytes = self.config.get('max_body_bytes', 1024 * 1024)
+        self.event_bus = event_bus if event_bus is not None else getattr(backend, 'event_bus', None)
+        self.jobs = OrderedDict()
+        self.stats = {"requests": 0, "submitted": 0, "completed": 0, "failed": 0}
+        self._ids = itertools.count(1)
+        self._slots = None
+        self._server = None
+        self._loop = None
+        self._step_subscription = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start_async(self):
+        if self.backend is None:
+            raise ValueError("AgentAPIServer needs a backend (HorusAgentOS or TaskRunner) to run tasks")
+        self._loop = asyncio.get_running_loop()
+        self._slots = asyncio.Semaphore(self.max_concurrent_tasks)
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        if self.event_bus is not None:
+            # Sync delivery runs in the publisher's context, where current_job is set
+            self._step_subscription = self.event_bus.subscribe(
+                "decision.step_result", self._on_step_result, delivery="sync")
+        print(f"Communication: Agent API listening on {self.base_url}")
+        return self
+
+    def start(self):
+        """Starts serving on the shared runtime loop; returns the server."""
+        from .async_runtime import run_sync
+        return run_sync(self.start_async())
+
+    def _on_step_result(self, topic: str, message: dict):
+        job = current_job.get()
+        if job is None:
+            return  # a task not started through this API
+        step, result = message["step"], message["result"]
+        data = {"index": message["index"], "action": step.get("action"),
+                "description": step.get("description"), "success": result.get("success")}
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            job.emit("step", data)
+        else:
+            self._loop.call_soon_threadsafe(job.emit, "step", data)
+
+    # --- jobs -----------------------------------------------------------------
+
+    def _submit(self, instruction: str) -> _Job:
+        job = _Job(f"job-{next(self._ids)}", instruction)
+        self.jobs[job.job_id] = job
+        self.stats["submitted"] += 1
+        job.emit("status", {"status": job.status})
+        job.task = asyncio.ensure_future(self._run_job(job))
+        # Forget the oldest finished jobs beyond the retention limit
+        while len(self.jobs) > self.max_jobs:
+            oldest = next((j for j in self.jobs.values() if j.done), None)
+            if oldest is None:
+                break
+            del self.jobs[oldest.job_id]
+        return job
+
+    async def _execute(self, instruction: str) -> dict:
+        backend = self.backend
+        if hasattr(backend, 'execute_task_async'):
+            return await backend.execute_task_async(instruction)
+        if hasattr(backend, 'submit'):
+            # Never block the loop on a full TaskRunner queue; the job fails with TaskRejected instead
+            return await asyncio.wrap_future(backend.submit(instruction, block=False))
+        return await asyncio.to_thread(backend.execute_task, instruction)
+
+    async def _run_job(self, job: _Job):
+        try:
+            async with self._slots:
+                current_job.set(job)
+                job.status, job.started = "running", time.time()
+                job.emit("status", {"status": job.status})
+                job.result = await self._execute(job.instruction)
+                job.status = "done"
+                self.stats["completed"] += 1
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+        except Exception as e:
+            job.status, job.error = "error", f"{type(e).__name__}: {e}"
+            self.stats["failed"] += 1
+        finally:
+            job.finished = time.time()
+            job.emit("done", {"status": job.status, "error": job.error,
+                              "task_status": (job.result or {}).get("status"),
+                              "message": (job.result or {}).get("message")})
+            for listener in job.listeners:
+                listener.put_nowait(None)
+
+    def _status(self) -> dict:
+        backend = self.backend
+        if hasattr(backend, 'get_agent_status'):
+            agent_status = backend.get_agent_status()
+        else:
+            agent_status = {"workers": len(getattr(backend, 'workers', [])), "stats": getattr(backend, 'stats', None),
+                            "pending": backend.pending() if hasattr(backend, 'pending') else None}
+        states = {}
+        for job in self.jobs.values():
+            states[job.status] = states.get(job.status, 0) + 1
+        return {"agent": agent_status, "api": dict(self.stats, jobs=states)}
+
+    # --- HTTP -----------------------------------------------------------------
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length > self.max_body_bytes:
+                    self._respond(writer, 413, {"error": "Request body too large"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                self.stats["requests"] += 1
+                url = urlsplit(target)
+                parts = [part for part in url.path.split("/") if part]
+                if method == "GET" and len(parts) == 3 and parts[0] == "tasks" and parts[2] == "events":
+                    await self._stream_events(writer, parts[1], headers)
+                    break  # the event stream ends with the connection
+                status, payload, extra_headers = self._dispatch(method, parts, parse_qs(url.query), body)
+                self._respond(writer, status, payload, extra_headers, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass  # client went away or sent a malformed request
+        finally:
+            writer.close()
+
+    def _dispatch(self, method: str, parts: list, query: dict, body: bytes):
+        """Returns (status, JSON payload, extra headers) for a non-streaming request."""
+        if parts == ["tasks"] and method == "POST":
+            try:
+                instruction = json.loads(body or b"{}").get("instruction")
+            except (ValueError, AttributeError):
+                instruction = None
+            if not isinstance(instruction, str) or not instruction.strip():
+                return 400, {"error": 'Expected a JSON body {"instruction": "..."}'}, None
+            job = self._submit(instruction)
+            location = f"/tasks/{job.job_id}"
+            return 202, {"job_id": job.job_id, "status": job.status, "poll": location,
+                         "events": f"{location}/events"}, {"Location": location}
+        if parts == ["tasks"] and method == "GET":
+            status_filter = query.get("status", [None])[0]
+            return 200, {"jobs": [job.summary() for job in self.jobs.values()
+                                  if status_filter is None or job.status == status_filter]}, None
+        if parts == ["status"] and method == "GET":
+            return 200, self._status(), None
+        if len(parts) == 2 and parts[0] == "tasks":
+            job = self.jobs.get(parts[1])
+            if job is None:
+                return 404, {"error": f"Unknown job '{parts[1]}'"}, None
+            if method == "GET":
+                return 200, job.summary(), None
+            if method == "DELETE":
+                if job.status != "queued":
+                    return 409, {"error": f"Job is {job.status}; only queued jobs can be cancelled"}, None
+                job.task.cancel()
+                return 200, {"job_id": job.job_id, "status": "cancelling"}, None
+            return 405, {"error": f"{method} not allowed"}, None
+        return 404, {"error": "Not found"}, None
+
+    @staticmethod
+    def _respond(writer, status: int, payload: dict, extra_headers: dict = None, keep_alive: bool = True):
+        data = json.dumps(payload, default=str).encode("utf-8")
+        head = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}", "Content-Type: application/json",
+                f"Content-Length: {len(data)}", "Connection: " + ("keep-alive" if keep_alive else "close")]
+        head.extend(f"{name}: {value}" for name, value in (extra_headers or {}).items())
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + data)
+
+    async def _stream_events(self, writer, job_id: str, headers: dict):
+        job = self.jobs.get(job_id)
+        if job is None:
+            self._respond(writer, 404, {"error": f"Unknown job '{job_id}'"}, keep_alive=False)
+            await writer.drain()
+            return
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                     b"Connection: close\r\n\r\n")
+        last_seen = int(headers.get("last-event-id", 0) or 0)
+        listener = asyncio.Queue()
+        # Replay what happened before the client connected, then follow live events
+        for event in job.events[last_seen:]:
+            listener.put_nowait(event)
+        if job.done:
+            listener.put_nowait(None)
+        else:
+            job.listeners.add(listener)
+        try:
+            while (event := await listener.get()) is not None:
+                event_id, name, data = event
+                writer.write(f"id: {event_id}\nevent: {name}\ndata: {json.dumps(data, default=str)}\n\n".encode())
+                await writer.drain()
+        finally:
+            job.listeners.discard(listener)
+
+    async def close_async(self):
+        if self._step_subscription is not None:
+            self._step_subscription.close()
+            self._step_subscription = None
+        if self._server is not None:
+            self._server.close()
+            for job in self.jobs.values():
+                if job.task is not None and not job.task.done():
+                    job.task.cancel()
+            self._server = None
+
+    def close(self):
+        from .async_runtime import run_sync
+        if self._loop is not None and not self._loop.is_closed():
+            run_sync(self.close_async())
+
+
+if __name__ == '__main__':
+    from .agent import HorusAgentOS
+    from .http_pool import AsyncHTTPConnectionPool
+    from .async_runtime import run_sync
+
+    async def follow(pool, base_url, instruction):
+        accepted = await pool.request("POST", base_url + "/tasks", {"instruction": instruction})
+        job = accepted.json()
+        events = [line.decode() async for line in pool.stream_lines("GET", base_url + job["events"])
+                  if line.startswith(b"event:")]
+        final = (await pool.request("GET", base_url + job["poll"])).json()
+        return accepted.status, job["job_id"], events, final["status"], final["result"]["status"]
+
+    async def main(base_url):
+        pool = AsyncHTTPConnectionPool()
+        started = time.monotonic()
+        outcomes = await asyncio.gather(*(follow(pool, base_url, f'Type "hello {i}"') for i in range(5)))
+        for status, job_id, events, job_status, task_status in outcomes:
+            print(f"{job_id}: POST -> {status}, events {[e.split(': ')[1] for e in events]}, "
+                  f"job {job_status}, task {task_status}")
+        print(f"5 tasks submitted and streamed (run one at a time on the agent) in {(time.monotonic() - started) * 1000:.0f} ms")
+        status = (await pool.request("GET", base_url + "/status")).json()
+        print(f"Status: {status['api']}")
+        missing = await pool.request("GET", base_url + "/tasks/job-999")
+        print(f"Unknown job -> {missing.status}")
+        pool.close()
+
+    print("Testing AgentAPIServer...")
+    agent = HorusAgentOS({"provider": "mock"}, {
+        'perception_config': {'parallel_perception': False, 'shared_frames': False},
+        'memory_config': {'db_type': 'in_memory'}})
+    server = AgentAPIServer(agent).start()
+    run_sync(main(server.base_url))
+    server.close()
@@ -0,0 +1,64 @@
+# tech.md: 5. Core Agent Class (Conceptual) - Concurrency
+import asyncio
+import threading
+
+_loop = None
+_loop_thread = None
+_loop_lock = threading.Lock()
+
+
+def get_runtime_loop() -> asyncio.AbstractEventLoop:
+    """Process-wide event loop, run by a daemon thread, that backs the synchronous API."""
+    global _loop, _loop_thread
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(target=_loop.run_forever, name="horus-async", daemon=True)
+            _loop_thread.start()
+        return _loop
+
+
+def run_sync(coroutine, timeout_s: float = None):
+    """
+    Runs a coroutine to completion from synchronous code and returns its result. All
+    such calls share one background loop, so pooled connections and other per-loop
+    state survive between sync calls.
+    """
+    loop = get_runtime_loop()
+    if threading.current_thread() is _loop_thread:
+        coroutine.close()
+        raise RuntimeError("Synchronous HorusAgentOS API called from its own event loop; await the *_async variant.")
+    return asyncio.run_coroutine_threadsafe(coroutine, loop).result(timeout_s)
+
+
+async def call_async(obj, method_name: str, *args, **kwargs):
+    """
+    Awaits `obj.<method_name>_async(...)` when the object provides it, otherwise runs
+    the blocking `obj.<method_name>(...)` in a worker thread.
+    """
+    async_method = getattr(obj, f"{method_name}_async", None)
+    if async_method is not None:
+        return await async_method(*args, **kwargs)
+    return await asyncio.to_thread(getattr(obj, method_name), *args, **kwargs)
+
+
+async def acquire_lock(lock: threading.Lock, poll_s: float = 0.002):
+    """Acquires a threading lock without blocking the event loop (cancellation-safe)."""
+    while not lock.acquire(blocking=False):
+        await asyncio.sleep(poll_s)
+
+
+if __name__ == '__main__':
+    import time
+
+    async def nap(duration_s):
+        await asyncio.sleep(duration_s)
+        return duration_s
+
+    async def many():
+        return await asyncio.gather(*(nap(0.1) for _ in range(50)))
+
+    print("Testing async runtime...")
+    started = time.monotonic()
+    results = run_sync(many())
+    print(f"{len(results)} concurrent 100 ms waits took {(time.monotonic() - started) * 1000:.0f} ms")
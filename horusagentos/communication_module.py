@@ -1,117 +1,268 @@
 # tech.md: 4.5. Communication Layer
+import asyncio
+
+from .api_server import AgentAPIServer
+from .event_bus import EventBus
+from .ipc_transport import IPCConnectionPool, IPCError, IPCServer
+from .lazy import is_initialized, lazy_property, warm_up
+from .service_client import ServiceClient
 # Potential future imports: paho-mqtt, pyzmq, fastapi, flask
 
 class CommunicationModule:
-    def __init__(self, config: dict = None):
+    def __init__(self, config: dict = None, event_bus: EventBus = None):
         self.config = config if config else {}
+        # In-process pub/sub for internal messages; shared with the other modules by the agent
+        self.event_bus = event_bus if event_bus is not None else EventBus(self.config.get('event_bus_config'))
         self.host = self.config.get('host', 'localhost')
         # 0 might mean dynamic or not used for some methods
         self.port = self.config.get('port', 0)
+        # Inter-agent transport: 'peers' maps agent ids to IPC addresses ("tcp://host:port",
+        # "unix:///path"); topics live on 'broker' (default: this agent's own IPC server)
+        self.agent_id = self.config.get('agent_id', 'horus-agent')
+        self.peers = self.config.get('peers', {})
+        self._ipc_handlers = {"message": self._receive_agent_message}
+        self._topic_subscriptions = {}
+        self.external_services = {}
 
-        self.message_queue_client = self._initialize_mq_client()
-        self.api_server_instance = self._initialize_api_server()  # If agent exposes an API
         print(f"CommunicationModule initialized (config: {self.config})")
 
+    @lazy_property
+    def message_queue_client(self):
+        return self._initialize_mq_client()
+
+    @lazy_property
+    def ipc_server(self):
+        # Serves this agent's inbox and topics when 'ipc_listen' is configured
+        listen = self.config.get('ipc_listen')
+        return IPCServer(listen, self._handle_ipc_request).start() if listen else None
+
+    @lazy_property
+    def service_client(self):
+        # Keep-alive pools, rate limits, circuit breakers and caching for external HTTP services
+        return ServiceClient(self.config.get('service_client_config'))
+
+    @lazy_property
+    def api_server_instance(self):
+        return self._initialize_api_server()  # If agent exposes an API
+
+    def warm_up(self) -> dict:
+        """Builds the IPC client pool, starts the IPC server and builds the API server now instead of on first use."""
+        return warm_up(self)
+
     def _initialize_mq_client(self):
-        # Placeholder for RabbitMQ, Kafka, ZeroMQ client
-        mq_type = self.config.get('mq_type', 'mock')
-        print(f"Mock: Message Queue client initialized (type: {mq_type}).")
-        # Example: if mq_type == 'zmq': import zmq; context = zmq.Context(); socket = context.socket(zmq.REQ); return socket
-        return "MockMQClient"
+        # Persistent, pipelined connections to peer agents and the topic broker
+        pool = IPCConnectionPool(**self.config.get('ipc_config', {}))
+        print(f"Communication: IPC client pool initialized (codec id {pool.codec_id}).")
+        return pool
+
+    def _handle_ipc_request(self, method: str, payload):
+        handler = self._ipc_handlers.get(method)
+        if handler is None:
+            raise IPCError(f"Agent '{self.agent_id}' has no IPC handler for '{method}'")
+        return handler(payload)
+
+    def register_ipc_handler(self, method: str, handler):
+        """Answers IPC requests for `method` with handler(payload) (runs on the IPC loop; keep it quick or async)."""
+        self._ipc_handlers[method] = handler
+
+    def _receive_agent_message(self, payload: dict) -> dict:
+        # Incoming agent messages are handed to the internal modules on "agent.message"
+        self.event_bus.publish("agent.message", payload)
+        return {"received": True, "agent_id": self.agent_id}
+
+    def _broker_address(self):
+        broker = self.config.get('broker')
+        if broker is None and self.ipc_server is not None:
+            broker = self.ipc_server.address
+        return broker
 
     def _initialize_api_server(self):
-        # Placeholder for FastAPI or Flask app if the agent needs to serve API requests
+        # asyncio HTTP API for submitting and streaming tasks; it starts serving in start_api_server()
         api_type = self.config.get('api_type', None)
         if api_type:
             print(
-                f"Mock: API server ({api_type}) would be initialized here on host {self.host}, port {self.port}.")
-            # Example: if api_type == 'fastapi': from fastapi import FastAPI; return FastAPI()
-            return "MockAPIServer"
+                f"Communication: Agent API ({api_type}) prepared for host {self.host}, port {self.port}.")
+            return AgentAPIServer(host=self.host, port=self.port, event_bus=self.event_bus,
+                                  config=self.config.get('api_config'))
         return None
 
+    def start_api_server(self, backend) -> AgentAPIServer:
+        """
+        Serves tasks for `backend` (a HorusAgentOS, or a TaskRunner for worker processes)
+        on host/port; see AgentAPIServer for the endpoints. Returns the running server.
+        """
+        server = self.api_server_instance
+        if server is None:  # no 'api_type' configured: serve with the defaults
+            server = self.api_server_instance = AgentAPIServer(
+                host=self.host, port=self.port, event_bus=self.event_bus, config=self.config.get('api_config'))
+        server.backend = backend
+        return server.start()
+
     def send_internal_message(self, target_module_name: str, message_type: str, payload: dict) -> dict:
-        """Sends a message to another internal module of the agent (conceptual for monolithic)."""
+        """
+        Publishes a message for another internal module on the event bus topic
+        "<target_module_name>.<message_type>". The payload is passed by reference;
+        subscribers receive it according to their delivery mode and overflow policy.
+        """
+        topic = f"{target_module_name}.{message_type}"
+        delivered = self.event_bus.publish(topic, payload)
         print(
-            f"Communication: Sending internal message to '{target_module_name}' (type: '{message_type}'): {payload}")
-        # In a truly monolithic agent where modules are just classes, this might not be used.
-        # If modules were microservices, this would use an internal bus.
-        return {"success": True, "response": "Internal message dispatched (mock)."}
+            f"Communication: Internal message on '{topic}' delivered to {delivered} subscriber(s)")
+        return {"success": True, "topic": topic, "delivered": delivered}
+
+    def subscribe_internal(self, module_name: str, callback=None, message_type: str = "*", **options):
+        """Subscribes to internal messages for a module (see EventBus.subscribe for options)."""
+        return self.event_bus.subscribe(f"{module_name}.{message_type}", callback, **options)
+
+    async def send_internal_message_async(self, target_module_name: str, message_type: str, payload: dict) -> dict:
+        return await asyncio.to_thread(self.send_internal_message, target_module_name, message_type, payload)
 
     def send_message_to_agent(self, target_agent_id: str, message_content: dict) -> dict:
-        """Sends a message to another agent in a multi-agent setup."""
-        print(
-            f"Communication: Sending message to agent '{target_agent_id}' via {self.message_queue_client}: {message_content}")
-        # Example with ZMQ:
-        # self.message_queue_client.connect(f"tcp://{target_agent_address}:{port}")
-        # self.message_queue_client.send_json(message_content)
-        # response = self.message_queue_client.recv_json()
-        # return {"success": True, "response_from_agent": response}
-        return {"success": True, "response": f"Message sent to agent {target_agent_id} (mock)."}
+        """
+        Sends a message to another agent over the IPC transport and waits for its
+        acknowledgement. The receiving agent publishes it on its event bus as "agent.message".
+        """
+        from .async_runtime import run_sync
+        return run_sync(self.send_message_to_agent_async(target_agent_id, message_content))
+
+    async def send_message_to_agent_async(self, target_agent_id: str, message_content: dict) -> dict:
+        print(f"Communication: Sending message to agent '{target_agent_id}': {message_content}")
+        address = self.peers.get(target_agent_id)
+        if address is None:
+            return {"success": False, "error": f"Unknown agent '{target_agent_id}' (not in 'peers')."}
+        try:
+            response = await self.message_queue_client.request(
+                address, "message", {"sender": self.agent_id, "content": message_content})
+        except (OSError, IPCError) as e:  # includes connection errors and timeouts
+            return {"success": False, "error": f"{type(e).__name__}: {e}"}
+        return {"success": True, "response_from_agent": response}
+
+    def subscribe_topic(self, topic: str, callback=None, message_filter: dict = None, **options):
+        """
+        Subscribes to a topic (glob patterns allowed) on the broker. `message_filter`
+        is applied by the broker (see ipc_transport.matches_filter).
+        """
+        from .async_runtime import run_sync
+        return run_sync(self.message_queue_client.subscribe(
+            self._broker_address(), topic, message_filter, callback, **options))
+
+    def publish_to_topic(self, topic: str, payload) -> dict:
+        """Publishes a message to a topic on the broker (fire-and-forget)."""
+        from .async_runtime import run_sync
+        broker = self._broker_address()
+        if broker is None:
+            return {"success": False, "error": "No broker configured ('broker' or 'ipc_listen')."}
+        run_sync(self.message_queue_client.publish(broker, topic, payload))
+        return {"success": True, "topic": topic}
 
     def receive_message_from_topic(self, topic: str, timeout_ms: int = 100) -> dict or None:
-        """Receives a message from a specific topic (e.g., via MQTT or Kafka subscription)."""
+        """
+        Receives the next message published on a topic. The first call subscribes on the
+        broker; messages are buffered from then on, so later calls return immediately
+        while messages are waiting.
+        """
         print(
-            f"Communication: Checking for incoming messages on topic '{topic}' (timeout: {timeout_ms}ms) via {self.message_queue_client}...")
-        # Placeholder for actual message receiving logic from a pub/sub system
-        # Example: message = self.mqtt_client.check_msg()
-        #          if message: return message.payload
-        return None  # Return received message or None if no message / timeout
+            f"Communication: Checking for incoming messages on topic '{topic}' (timeout: {timeout_ms}ms)...")
+        if self._broker_address() is None:
+            return None  # no broker to subscribe to
+        subscription = self._topic_subscriptions.get(topic)
+        if subscription is None:
+            subscription = self._topic_subscriptions[topic] = self.subscribe_topic(topic)
+        item = subscription.get(timeout_ms / 1000)
+        return item[1] if item is not None else None  # Return received message or None if no message / timeout
+
+    def close(self):
+        """Closes topic subscriptions, pooled IPC and HTTP connections and the IPC and API servers, if started."""
+        for subscription in self._topic_subscriptions.values():
+            subscription.close()
+        self._topic_subscriptions = {}
+        if is_initialized(self, 'message_queue_client'):
+            self.message_queue_client.close()
+        if is_initialized(self, 'ipc_server') and self.ipc_server is not None:
+            self.ipc_server.close()
+        if is_initialized(self, 'service_client'):
+            self.service_client.close()
+        if is_initialized(self, 'api_server_instance') and self.api_server_instance is not None:
+            self.api_server_instance.close()
 
     def register_external_service(self, service_name: str, service_details: dict):
-        """Registers an external tool or service that the agent can interact with."""
-        if not hasattr(self, 'external_services'):
-            self.external_services = {}
+        """
+        Registers an external tool or service that the agent can interact with. For
+        "http_api" services the details may also set rate_limit_per_s/burst,
+        failure_threshold/reset_timeout_s, cache_ttl_s/cache_methods, http_method,
+        headers and timeout_s (see ServiceClient).
+        """
         self.external_services[service_name] = service_details
+        if service_details.get('type', 'http_api') == 'http_api':
+            self.service_client.register(service_name, service_details)
         print(
             f"Communication: Registered external service: '{service_name}' with details: {service_details}")
 
+    def _service_unavailable(self, service_name: str):
+        if service_name not in self.external_services or service_name not in self.service_client.services:
+            return {"success": False, "error": f"External service '{service_name}' not registered or call not implemented."}
+        return None
+
     def call_external_service(self, service_name: str, method: str, params: dict) -> dict:
         """Calls a method of a registered external service (e.g., via HTTP API)."""
         print(
             f"Communication: Calling external service '{service_name}', method '{method}' with params: {params}")
-        if hasattr(self, 'external_services') and service_name in self.external_services:
-            service_config = self.external_services[service_name]
-            # Example: if service_config['type'] == 'http_api':
-            #    import requests
-            #    url = f"{service_config['base_url']}/{method}"
-            #    response = requests.post(url, json=params) if params else requests.get(url)
-            #    return {"success": response.ok, "data": response.json() if response.ok else response.text}
-            return {"success": True, "data": f"Mock call to {service_name}/{method} successful."}
-        return {"success": False, "error": f"External service '{service_name}' not registered or call not implemented."}
-
-    # Example methods for an agent exposing its own API (if self.api_server_instance is used)
-    # def start_api_server_thread(self):
-    #     if self.api_server_instance and hasattr(self.api_server_instance, 'run'):
-    #         import threading
-    #         # Define API endpoints on self.api_server_instance first
-    #         thread = threading.Thread(target=self.api_server_instance.run, args=(self.host, self.port))
-    #         thread.daemon = True
-    #         thread.start()
-    #         print(f"Mock API server started on {self.host}:{self.port}")
+        return self._service_unavailable(service_name) or self.service_client.call(service_name, method, params)
+
+    async def call_external_service_async(self, service_name: str, method: str, params: dict) -> dict:
+        """call_external_service() without blocking the event loop."""
+        return self._service_unavailable(service_name) or await self.service_client.call_async(
+            service_name, method, params)
+
+    def call_external_services(self, calls) -> list:
+        """Calls many (service_name, method, params) concurrently; results in call order."""
+        from .async_runtime import run_sync
+        return run_sync(self.call_external_services_async(list(calls)))
+
+    async def call_external_services_async(self, calls) -> list:
+        print(f"Communication: Calling {len(calls)} external service method(s) concurrently")
+        return list(await asyncio.gather(*(self.call_external_service_async(*call) for call in calls)))
 
 
 if __name__ == '__main__':
     print("Testing CommunicationModule...")
-    config = {'mq_type': 'mock_zmq', 'host': '127.0.0.1',
-              'port': 5555, 'api_type': 'fastapi'}
+    config = {'host': '127.0.0.1', 'port': 5555, 'api_type': 'asyncio',
+              'agent_id': 'Agent001', 'ipc_listen': 'tcp://127.0.0.1:0'}
     comm_module = CommunicationModule(config=config)
+    peer_module = CommunicationModule(config={'agent_id': 'Agent007', 'ipc_listen': 'unix:///tmp/horus-agent007.sock'})
+    comm_module.peers["Agent007"] = peer_module.ipc_server.address
+    peer_inbox = peer_module.subscribe_internal("agent", delivery="pull", message_type="message")
 
+    updates = comm_module.subscribe_internal("DecisionModule", delivery="pull")
     comm_module.send_internal_message(
         "DecisionModule", "task_update", {"status": "in_progress"})
+    print(f"DecisionModule received: {updates.get(timeout_s=1)}")
 
-    comm_module.send_message_to_agent("Agent007", {"request": "status_report"})
+    reply = comm_module.send_message_to_agent("Agent007", {"request": "status_report"})
+    print(f"Agent007 replied {reply}; its inbox got {peer_inbox.get(timeout_s=1)}")
 
     msg = comm_module.receive_message_from_topic("agent/tasks/new")
     if msg:
         print(f"Received external message: {msg}")
     else:
         print("No external message received on topic.")
+    comm_module.publish_to_topic("agent/tasks/new", {"task": "Open the calculator"})
+    print(f"Received external message: {comm_module.receive_message_from_topic('agent/tasks/new', timeout_ms=1000)}")
 
+    from .mock_service_server import MockServiceServer
+    weather_server = MockServiceServer().start()  # local stand-in for https://api.weather.com
     comm_module.register_external_service(
-        "WeatherAPI", {"type": "http_api", "base_url": "https://api.weather.com"})
+        "WeatherAPI", {"type": "http_api", "base_url": weather_server.base_url, "http_method": "GET",
+                       "cache_ttl_s": 30, "rate_limit_per_s": 50})
     weather_data = comm_module.call_external_service(
         "WeatherAPI", "getCurrent", {"location": "London"})
     print(f"Weather API call result: {weather_data}")
+    forecasts = comm_module.call_external_services(
+        [("WeatherAPI", "getForecast", {"location": city}) for city in ("Cairo", "Oslo", "Lima")])
+    print(f"Fan-out results: {[f['data']['params']['location'] for f in forecasts]}, "
+          f"server stats {weather_server.stats}")
+    peer_module.close()
+    comm_module.close()
+    weather_server.stop()
 
-    # if comm_module.api_server_instance:
-    #     print("API server instance seems to be initialized (mock). Consider testing start_api_server_thread if implemented.")
+    # The agent API needs an agent to run tasks: see HorusAgentOS.start_api_server() and api_server.py
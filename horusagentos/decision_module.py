@@ -1,4 +1,16 @@
 # tech.md: 4.2. Decision Layer
+import asyncio
+import json
+
+from .action_replay import ReplayCompileError, plan_fingerprint
+from .agent_coordinator import AgentCoordinator
+from .async_runtime import call_async, run_sync
+from .event_bus import EventBus
+from .lazy import lazy_property, warm_up
+from .llm_client import LLMClient, LLMError
+from .plan_cache import PlanCache
+from .plan_scheduler import InputLocks, PlanScheduler
+from .plan_stream import PlanStreamParser, validate_step
 # Potential future imports: openai, transformers, or other LLM/planning libraries
 
 # Forward-declare ActionModule and MemoryModule for type hinting if they were complex classes
@@ -9,25 +21,58 @@
 #     from .memory_module import MemoryModule
 
 class DecisionModule:
-    def __init__(self, llm_provider_config: dict, perception_module, action_module, memory_module, config: dict = None):
+    def __init__(self, llm_provider_config: dict, perception_module, action_module, memory_module, config: dict = None,
+                 event_bus: EventBus = None):
         self.llm_provider_config = llm_provider_config
         self.perception_module = perception_module  # Actual instance
         self.action_module = action_module         # Actual instance
         self.memory_module = memory_module         # Actual instance
         self.config = config if config else {}
 
-        self.llm_client = self._initialize_llm_client()
-        self.task_planner = self._initialize_task_planner()
-        self.rl_engine = self._initialize_rl_engine()
+        # Serializes GUI input steps per display when plan steps run concurrently
+        self.input_locks = InputLocks(self.config.get('display'))
+        # Step results and plan outcomes are published here ("decision.step_result", "decision.plan_executed")
+        self.event_bus = event_bus
         print("DecisionModule initialized")
 
+    @lazy_property
+    def llm_client(self):
+        return self._initialize_llm_client()
+
+    @lazy_property
+    def task_planner(self):
+        return self._initialize_task_planner()
+
+    @lazy_property
+    def rl_engine(self):
+        return self._initialize_rl_engine()
+
+    @lazy_property
+    def plan_cache(self):
+        # Successful plans keyed by instruction template (exact) and embedding (similar)
+        return PlanCache(self.config, encoder=getattr(
+            self.memory_module, 'encode_many', None)) if self.config.get('use_plan_cache', True) else None
+
+    @lazy_property
+    def coordinator(self):
+        # Register peer agents with coordinator.register_agent / register_remote_agent
+        return AgentCoordinator(self.config.get('coordinator_config'))
+
+    def warm_up(self) -> dict:
+        """Builds the LLM client, planner, RL engine, plan cache and coordinator now instead of on first use."""
+        return warm_up(self)
+
+    def _publish(self, topic: str, make_message):
+        # Building the message is skipped entirely when nobody listens
+        if self.event_bus is not None and self.event_bus.has_subscribers(topic):
+            self.event_bus.publish(topic, make_message())
+
     def _initialize_llm_client(self):
+        # Pooled, caching, single-flight client; "mock" runs in-process, unknown providers raise
+        client = LLMClient(self.llm_provider_config)
         print(
-            f"Mock: LLM client initialized with provider: {self.llm_provider_config.get('provider')}, model: {self.llm_provider_config.get('model')}")
-        # Placeholder for OpenAI or HuggingFace client
-        # Example: if self.llm_provider_config.get('provider') == 'openai':
-        #              import openai; openai.api_key = self.llm_provider_config.get('api_key'); return openai
-        return "MockLLMClient"
+            f"LLM client initialized with provider: {client.provider}, model: {client.model}")
+        return client
 
     def _initialize_task_planner(self):
         print("Mock: Task planner initialized.")
@@ -39,8 +84,20 @@ class DecisionModule:
         # Placeholder for Stable Baselines3 or RLlib integration
         return "MockRLEngine"
 
-    def create_plan(self, natural_language_instruction: str) -> list:
-        """Creates a task plan from a natural language instruction."""
+    def create_plan(self, natural_language_instruction: str, stream: bool = False):
+        """
+        Creates a task plan from a natural language instruction.
+        With stream=True an iterator is returned instead of a list; it yields each
+        validated step as soon as it has been generated, so execution can start
+        before the whole plan exists. A cached plan is complete already and is always
+        returned as a list, which also lets execute_plan() find its compiled replay.
+        """
+        cached_plan = self._cached_plan(natural_language_instruction)
+        if cached_plan is not None:
+            return cached_plan
+        if stream:
+            return self._stream_plan(natural_language_instruction)
+
         print(
             f"Decision: Creating plan for: '{natural_language_instruction}' using {self.task_planner} and {self.llm_client}")
 
@@ -54,7 +111,104 @@ class DecisionModule:
         # 2. Use LLM to understand instruction and generate a sequence of actions,
         #    potentially informed by past_experiences and current UI state via perception_module.
         # current_context = self.perception_module.get_current_state() # If planner needs immediate context
+        if self.llm_client.provider != 'mock':
+            plan = self._plan_with_llm(
+                natural_language_instruction, past_experiences)
+            if plan:
+                print(f"Decision: Generated plan with {len(plan)} steps.")
+                return plan
 
+        plan = self._mock_plan(natural_language_instruction)
+        print(f"Decision: Generated plan with {len(plan)} steps.")
+        return plan
+
+    async def create_plan_async(self, natural_language_instruction: str, stream: bool = False):
+        """
+        Like create_plan(), awaiting memory and the LLM instead of blocking; with
+        stream=True an async iterator of steps is returned (a list for cached plans).
+        """
+        cached_plan = self._cached_plan(natural_language_instruction)
+        if cached_plan is not None:
+            return cached_plan
+        if stream:
+            return self._stream_plan_async(natural_language_instruction)
+        print(
+            f"Decision: Creating plan for: '{natural_language_instruction}' using {self.task_planner} and {self.llm_client}")
+        past_experiences = await call_async(
+            self.memory_module, 'retrieve_relevant_experience', natural_language_instruction, top_k=3)
+        if self.llm_client.provider != 'mock':
+            try:
+                reply = await self.llm_client.complete_async(
+                    self._planning_messages(natural_language_instruction, past_experiences))
+                plan = self._parse_plan(reply["text"])
+            except (LLMError, OSError, asyncio.TimeoutError) as e:
+                print(f"Decision: LLM planning failed: {e}")
+                plan = []
+            if plan:
+                print(f"Decision: Generated plan with {len(plan)} steps.")
+                return plan
+        plan = self._mock_plan(natural_language_instruction)
+        print(f"Decision: Generated plan with {len(plan)} steps.")
+        return plan
+
+    def _cached_plan(self, natural_language_instruction: str):
+        if self.plan_cache is None:
+            return None
+        cached = self.plan_cache.lookup(natural_language_instruction)
+        if cached is None:
+            return None
+        print(
+            f"Decision: Using cached plan for '{natural_language_instruction}' ({cached['match']} match, similarity {cached['similarity']:.2f}).")
+        return cached["plan"]
+
+    def _stream_plan(self, natural_language_instruction: str):
+        print(
+            f"Decision: Streaming plan for: '{natural_language_instruction}' using {self.llm_client}")
+        past_experiences = self.memory_module.retrieve_relevant_experience(
+            natural_language_instruction, top_k=3)
+        if self.llm_client.provider != 'mock':
+            parser = PlanStreamParser()
+            produced = 0
+            try:
+                for chunk in self.llm_client.stream(self._planning_messages(natural_language_instruction, past_experiences)):
+                    for step in parser.feed(chunk):
+                        error = validate_step(step)
+                        if error:
+                            print(f"Decision: Skipping invalid streamed step ({error}): {step}")
+                            continue
+                        produced += 1
+                        yield step
+            except (LLMError, OSError, ValueError) as e:
+                print(f"Decision: Plan stream failed after {produced} steps: {e}")
+            if produced:
+                return
+        yield from self._mock_plan(natural_language_instruction)
+
+    async def _stream_plan_async(self, natural_language_instruction: str):
+        print(
+            f"Decision: Streaming plan for: '{natural_language_instruction}' using {self.llm_client}")
+        past_experiences = await call_async(
+            self.memory_module, 'retrieve_relevant_experience', natural_language_instruction, top_k=3)
+        if self.llm_client.provider != 'mock':
+            parser = PlanStreamParser()
+            produced = 0
+            try:
+                async for chunk in self.llm_client.stream_async(self._planning_messages(natural_language_instruction, past_experiences)):
+                    for step in parser.feed(chunk):
+                        error = validate_step(step)
+                        if error:
+                            print(f"Decision: Skipping invalid streamed step ({error}): {step}")
+                            continue
+                        produced += 1
+                        yield step
+            except (LLMError, OSError, ValueError, asyncio.TimeoutError) as e:
+                print(f"Decision: Plan stream failed after {produced} steps: {e}")
+            if produced:
+                return
+        for step in self._mock_plan(natural_language_instruction):
+            yield step
+
+    def _mock_plan(self, natural_language_instruction: str) -> list:
         # Mock plan generation
         plan = []
         if "open" in natural_language_instruction.lower() and "file" in natural_language_instruction.lower():
@@ -70,56 +224,146 @@ class DecisionModule:
         if not plan:
             plan.append({"action": "generic_task_step", "params": {
                         "instruction_summary": natural_language_instruction[:30]}, "description": "Default step for unknown instruction"})
-
-        print(f"Decision: Generated plan with {len(plan)} steps.")
         return plan
 
+    def _planning_messages(self, instruction: str, past_experiences: list) -> list:
+        examples = [{"instruction": e.get("instruction"), "plan": e.get("plan")}
+                    for e in past_experiences or [] if e.get("plan")]
+        system = ("You control a desktop GUI. Reply with only a JSON array of steps, each "
+                  '{"action": ..., "params": {...}, "description": ...}. Actions: find_element, '
+                  "click, type_text, press_key, scroll, open_app, wait. Steps that do not need "
+                  'the previous step may add "id" and "depends_on": [ids of the steps they need].')
+        user = f"Instruction: {instruction}"
+        if examples:
+            user += f"\nSimilar past tasks: {json.dumps(examples, default=str)}"
+        return [{"role": "system", "content": system}, {"role": "user", "content": user}]
+
+    def _plan_with_llm(self, instruction: str, past_experiences: list) -> list:
+        """Asks the LLM for a JSON plan; returns [] if the call fails or the reply is unusable."""
+        try:
+            reply = self.llm_client.complete(
+                self._planning_messages(instruction, past_experiences))
+        except (LLMError, OSError) as e:
+            print(f"Decision: LLM planning failed: {e}")
+            return []
+        return self._parse_plan(reply["text"])
+
+    @staticmethod
+    def _parse_plan(text: str) -> list:
+        try:
+            plan = json.loads(text[text.index("["):text.rindex("]") + 1])
+        except ValueError:
+            print("Decision: LLM reply did not contain a JSON plan.")
+            return []
+        return [step for step in plan if not validate_step(step)]
+
     def execute_plan(self, plan: list, execution_context: dict = None) -> dict:
-        """Executes a given task plan, coordinating with perception and action modules."""
-        print(f"Decision: Executing plan with {len(plan)} steps.")
-        step_results = []
-        overall_success = True
+        """
+        Executes a given task plan, coordinating with perception and action modules.
+        `plan` may be a list or an iterator of steps (see create_plan(stream=True));
+        steps are executed as they arrive and the executed steps are returned as "plan".
+        Steps may name an "id" and declare "depends_on" (a list of step ids, [] for
+        none); steps without it wait for the previous step. Independent steps run
+        concurrently (config `max_parallel_steps`) while input steps on the same display
+        are serialized, so the plan takes critical-path time instead of sum-of-steps.
+        A plan list that already ran successfully is replayed from its compiled
+        sequence (no per-step perception); if the replay fails, the plan is executed
+        normally from the first step the replay did not complete.
+        Synchronous wrapper around execute_plan_async().
+        """
+        return run_sync(self.execute_plan_async(plan, execution_context))
+
+    async def execute_plan_async(self, plan, execution_context: dict = None) -> dict:
+        """
+        Async execute_plan(); `plan` may also be an async iterator of steps (see
+        create_plan_async(stream=True)). Step I/O waits do not block the event loop.
+        """
+        replay_cache = getattr(self.action_module, 'replay_cache', None)
+        use_replay = replay_cache is not None and self.config.get('use_replay', True)
+        plan_key = plan_fingerprint(plan) if use_replay and isinstance(plan, list) and plan else None
+        compiled = replay_cache.get(plan_key) if plan_key else None
+        # Steps a failed replay already completed; execution resumes after them
+        done_steps, done_results = [], []
+        if compiled is not None:
+            print(f"Decision: Replaying compiled plan {plan_key}.")
+            replay_results = await asyncio.to_thread(self.action_module.replay, compiled)
+            if replay_results["overall_success"]:
+                replay_results["plan"] = plan
+                return replay_results
+            replay_cache.invalidate(plan_key)
+            resume_step = replay_results["resume_step"]
+            if resume_step is None:
+                # Part of the failed input may have been sent; running it again would repeat it
+                print("Decision: Replay failed during input, invalidated it; not re-running the plan.")
+                replay_results["plan"] = plan
+                return replay_results
+            print(f"Decision: Replay failed, invalidated it; resuming step by step at step {resume_step + 1}.")
+            done_steps, done_results = plan[:resume_step], replay_results["step_results"][:resume_step]
+            plan = plan[resume_step:]
 
-        for i, step in enumerate(plan):
+        total = f"/{len(plan) + len(done_steps)}" if isinstance(plan, list) else ""
+        print(f"Decision: Executing plan with {len(plan) if total else 'streamed'} steps.")
+
+        async def run_step(i, step):
+            i += len(done_steps)
             print(
-                f"Decision: Executing step {i+1}/{len(plan)}: {step.get('description', step['action'])}")
-            current_ui_state = self.perception_module.get_current_state()  # Get state before action
-
-            action_result = {"success": False, "details": {}}
-            # Special handling for find_element by decision layer
-            if step["action"] == "find_element":
-                element = self.perception_module.find_element_by_properties(
-                    step["params"])
-                if element:
-                    action_result = {"success": True, "details": {
-                        "found_element": element, "message": "Element found"}}
-                    # Potentially update context for subsequent steps, e.g., plan[i+1]["params"]["element_id"] = element["id"]
-                else:
-                    action_result = {"success": False, "details": {
-                        "error": "Element not found", "params": step["params"]}}
-            else:
-                action_result = self.action_module.perform_action(
-                    action_type=step["action"],
-                    parameters=step["params"],
-                    current_state=current_ui_state
-                )
-
-            step_results.append(action_result)
+                f"Decision: Executing step {i+1}{total}: {step.get('description', step['action'])}")
+            action_result = await self._execute_step(step)
             print(
                 f"Decision: Step {i+1} result: Success={action_result['success']}")
-
             if not action_result["success"]:
-                overall_success = False
                 print(
                     f"Decision: Step failed: {step.get('description', step['action'])}. Attempting error recovery or stopping.")
-                # Basic error handling: Log and stop. More advanced could involve replanning or retries.
-                break
+            self._publish("decision.step_result", lambda: {"index": i, "step": step, "result": action_result})
+            return action_result
+
+        # Steps run in dependency order ("depends_on"); independent steps run concurrently.
+        # Basic error handling: after a failure no further steps start. More advanced could involve replanning or retries.
+        outcome = await PlanScheduler(run_step, self.config, self.input_locks).run_async(plan)
+        executed_plan = done_steps + outcome["executed_steps"]
+        step_results = done_results + outcome["step_results"]
+        overall_success = outcome["overall_success"]
+
+        # Replay is sequential, so only plans without declared dependencies are compiled.
+        # Replays are looked up by a plan list's fingerprint: a streamed plan can only
+        # come back as a list through the plan cache, so without it there is no point.
+        sequential = not any("depends_on" in step for step in executed_plan)
+        reusable = isinstance(plan, list) or self.plan_cache is not None
+        if overall_success and use_replay and executed_plan and sequential and reusable:
+            try:
+                replay_cache.put(plan_fingerprint(executed_plan), self.action_module.compile_action_sequence(
+                    executed_plan, step_results))
+            except ReplayCompileError as e:
+                print(f"Decision: Plan not replayable: {e}")
 
         summary_message = "Plan executed successfully." if overall_success else "Plan execution failed or partially completed."
-        if not plan:
+        if not executed_plan:
             summary_message = "Empty plan, nothing to execute."
 
-        return {"summary": summary_message, "step_results": step_results, "overall_success": overall_success}
+        execution_results = {"summary": summary_message, "step_results": step_results, "overall_success": overall_success,
+                             "plan": executed_plan, "time_to_first_step_ms": outcome["time_to_first_step_ms"]}
+        self._publish("decision.plan_executed", lambda: execution_results)
+        return execution_results
+
+    async def _execute_step(self, step: dict) -> dict:
+        # Special handling for find_element by decision layer
+        if step["action"] == "find_element":
+            element = await call_async(
+                self.perception_module, 'find_element_by_properties', step.get("params", {}))
+            if element:
+                # Potentially update context for subsequent steps, e.g., plan[i+1]["params"]["element_id"] = element["id"]
+                return {"success": True, "details": {
+                    "found_element": element, "message": "Element found"}}
+            return {"success": False, "details": {
+                "error": "Element not found", "params": step.get("params", {})}}
+        # Only actions consume the UI state, so perception runs just for them
+        current_ui_state = await call_async(self.perception_module, 'get_current_state')  # Get state before action
+        return await call_async(
+            self.action_module, 'perform_action',
+            action_type=step["action"],
+            parameters=step.get("params", {}),
+            current_state=current_ui_state
+        )
 
     def learn_from_execution(self, instruction: str, plan: list, execution_results: dict):
         """Learns from the execution feedback to improve future decisions."""
@@ -129,7 +373,14 @@ class DecisionModule:
         self.memory_module.record_experience(
             instruction, plan, execution_results, reflections="Mock reflection: task outcome was as expected.")
 
-        # 2. Update RL policies or other models if applicable (using self.rl_engine)
+        # 2. Keep successful plans for reuse; drop a cached plan that just failed
+        if self.plan_cache is not None and plan:
+            if execution_results.get("overall_success"):
+                self.plan_cache.store(instruction, plan)
+            elif self.plan_cache.invalidate(instruction, plan):
+                print("Decision: Invalidated cached plan after failure.")
+
+        # 3. Update RL policies or other models if applicable (using self.rl_engine)
         # Example: self.rl_engine.update(state, action, reward, next_state)
         if execution_results.get("overall_success"):
             print("Decision: Positive reinforcement signal for RL engine (mock).")
@@ -137,12 +388,31 @@ class DecisionModule:
             print("Decision: Negative reinforcement signal for RL engine (mock).")
         pass
 
+    async def learn_from_execution_async(self, instruction: str, plan: list, execution_results: dict):
+        """learn_from_execution() in a worker thread (memory writes and embeddings)."""
+        return await asyncio.to_thread(self.learn_from_execution, instruction, plan, execution_results)
+
     def coordinate_multi_agent_task(self, task_definition: dict):
-        """Coordinates a task that requires multiple agents."""
+        """
+        Coordinates a task that requires multiple agents: splits it into sub-plans (see
+        agent_coordinator.split_task), runs them on the agents registered with
+        self.coordinator and returns the merged result. Without registered agents this
+        agent runs every sub-plan itself.
+        """
+        return run_sync(self.coordinate_multi_agent_task_async(task_definition))
+
+    async def coordinate_multi_agent_task_async(self, task_definition: dict):
         print(
             f"Decision: Coordinating multi-agent task: {task_definition.get('name', 'Unnamed Task')}")
-        # Placeholder for multi-agent coordination logic using CommunicationModule
-        return {"summary": "Multi-agent task coordination initiated (mock)", "task_id": "multi_task_123"}
+        coordinator = self.coordinator
+        if not coordinator.agents:
+            coordinator.register_agent("local", self, self.config.get('agent_capabilities', ()))
+        result = await coordinator.run_async(task_definition)
+        succeeded = sum(outcome["success"] for outcome in result["results"])
+        result["summary"] = (f"{succeeded}/{len(result['results'])} sub-plans succeeded on "
+                             f"{len(result['per_agent'])} agent(s).")
+        print(f"Decision: Multi-agent task {result['task_id']}: {result['summary']}")
+        return result
 
 
 if __name__ == '__main__':
@@ -153,7 +423,7 @@ if __name__ == '__main__':
         def get_current_state(
             self, **kwargs): return {"description": "Mock current UI state for decision testing"}
         def find_element_by_properties(
-            self, **kwargs): return {"id": "mock_found_elem"}
+            self, *args, **kwargs): return {"id": "mock_found_elem"}
 
     class MockActionModule:
         def perform_action(self, action_type, parameters, **kwargs): return {
@@ -165,7 +435,7 @@ if __name__ == '__main__':
         def record_experience(
             self, *args, **kwargs): print("MockMemory: Experience recorded.")
 
-    mock_llm_conf = {"provider": "test_llm", "model": "test_model"}
+    mock_llm_conf = {"provider": "mock", "model": "test_model"}
     decision = DecisionModule(
         llm_provider_config=mock_llm_conf,
         perception_module=MockPerceptionModule(),
@@ -183,3 +453,9 @@ if __name__ == '__main__':
         decision.learn_from_execution(test_instruction, plan, results)
     else:
         print("No plan generated for test instruction.")
+
+    # Independent plan groups run as sub-plans on the registered agents (here: this one)
+    multi = decision.coordinate_multi_agent_task({"name": "Two windows", "plan": [
+        {"id": "left", "action": "wait", "params": {"duration_s": 0.01}},
+        {"id": "right", "action": "wait", "params": {"duration_s": 0.01}, "depends_on": []}]})
+    print(f"Multi-agent result: {multi['summary']} per agent {multi['per_agent']}")
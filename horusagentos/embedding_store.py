@@ -0,0 +1,256 @@
+# tech.md: 4.4. Memory Layer - Long-Term Memory Storage
+import os
+import time
+
+import numpy as np
+
+EMBEDDING_DTYPES = ("float32", "float16", "int8")
+
+# Per-row bookkeeping used by retrieval statistics and the pruning policies
+ROW_META_DTYPE = np.dtype([
+    ("timestamp", np.float64),
+    ("last_access", np.float64),
+    ("hits", np.int32),
+    ("alive", np.bool_),
+])
+
+
+def _save_array(path: str, array: np.ndarray):
+    # Write-then-rename so saving over a file that is currently memory-mapped is safe
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as f:
+        np.save(f, array)
+    os.replace(temporary, path)
+
+
+class EmbeddingMatrix:
+    """
+    Preallocated, growable embedding matrix with a parallel int64 ID array.
+
+    Rows are stored as float32, float16, or int8 with a per-row float32 scale. The
+    matrix can be saved as `.npy` files and loaded back memory-mapped, so a large
+    memory opens instantly and its pages are shared between processes. Appending to
+    a memory-mapped matrix first copies it into process memory.
+
+    IDs must be appended in increasing order so ID lookups can binary-search. Removed
+    rows are tombstoned and only dropped by `compacted`.
+    """
+
+    def __init__(self, dim: int, dtype: str = "float32", initial_capacity: int = 1024):
+        if dtype not in EMBEDDING_DTYPES:
+            raise ValueError(
+                f"Unsupported embedding dtype '{dtype}'. Available: {EMBEDDING_DTYPES}")
+        self.dim = dim
+        self.dtype = dtype
+        self.size = 0
+        self.dead = 0
+        self.vectors = np.empty((initial_capacity, dim), dtype=np.dtype(dtype))
+        self.ids = np.empty(initial_capacity, dtype=np.int64)
+        self.scales = np.empty(
+            initial_capacity, dtype=np.float32) if dtype == "int8" else None
+        self.meta = np.zeros(initial_capacity, dtype=ROW_META_DTYPE)
+        # Rows scored per matmul for non-float32 storage, bounds the float32 temporary
+        self.chunk_rows = 65536
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def live_count(self) -> int:
+        return self.size - self.dead
+
+    @property
+    def nbytes(self) -> int:
+        used = self.size * (self.vectors.itemsize * self.dim +
+                            self.ids.itemsize + ROW_META_DTYPE.itemsize)
+        return used + (self.size * 4 if self.scales is not None else 0)
+
+    def _reserve(self, extra: int):
+        needed = self.size + extra
+        capacity = self.vectors.shape[0]
+        if needed <= capacity and self.vectors.flags.writeable:
+            return
+        while capacity < needed:
+            capacity = max(capacity * 2, 16)
+
+        def grow(array):
+            grown = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            return grown
+
+        self.vectors, self.ids, self.meta = grow(
+            self.vectors), grow(self.ids), grow(self.meta)
+        if self.scales is not None:
+            self.scales = grow(self.scales)
+
+    def append(self, ids, vectors: np.ndarray, timestamps=None) -> np.ndarray:
+        """Appends float32 vectors and returns their row offsets."""
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        count = len(ids)
+        if count and ((self.size and ids[0] <= self.ids[self.size - 1]) or np.any(np.diff(ids) <= 0)):
+            raise ValueError("EmbeddingMatrix IDs must be appended in increasing order")
+        self._reserve(count)
+        rows = np.arange(self.size, self.size + count)
+        if self.dtype == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self.vectors[rows] = np.rint(
+                vectors / scales[:, None]).astype(np.int8)
+            self.scales[rows] = scales
+        else:
+            self.vectors[rows] = vectors
+        self.ids[rows] = ids
+        meta = self.meta[self.size:self.size + count]
+        meta["timestamp"] = time.time() if timestamps is None else timestamps
+        meta["last_access"] = 0.0
+        meta["hits"] = 0
+        meta["alive"] = True
+        self.size += count
+        return rows
+
+    def extend_from(self, other, rows: np.ndarray) -> np.ndarray:
+        """Copies rows (raw storage and metadata) from another matrix of the same dtype."""
+        count = len(rows)
+        self._reserve(count)
+        target = np.arange(self.size, self.size + count)
+        self.vectors[target] = other.vectors[rows]
+        self.ids[target] = other.ids[rows]
+        self.meta[target] = other.meta[rows]
+        if self.scales is not None:
+            self.scales[target] = other.scales[rows]
+        self.size += count
+        self.dead += int(count - np.count_nonzero(self.meta["alive"][target]))
+        return target
+
+    def rows_for_ids(self, ids) -> np.ndarray:
+        """Returns the row offsets of the given IDs (-1 for IDs that are not stored)."""
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        if self.size == 0:
+            return np.full(len(ids), -1, dtype=np.int64)
+        stored = self.ids[:self.size]
+        rows = np.searchsorted(stored, ids)
+        rows[rows >= self.size] = 0
+        return np.where(stored[rows] == ids, rows, -1)
+
+    def touch(self, rows, now: float = None):
+        """Records a retrieval hit on the given rows."""
+        self.meta["hits"][rows] += 1
+        self.meta["last_access"][rows] = time.time() if now is None else now
+
+    def remove(self, rows) -> int:
+        """Tombstones rows so they are skipped by searches; returns how many were live."""
+        rows = np.asarray(rows, dtype=np.int64)
+        rows = rows[self.meta["alive"][rows]]
+        self.meta["alive"][rows] = False
+        self.dead += len(rows)
+        return len(rows)
+
+    def compacted(self, upto: int = None):
+        """
+        Returns a new in-memory matrix holding only the live rows below `upto`, plus
+        the old row offsets that were kept (in order).
+        """
+        upto = self.size if upto is None else upto
+        kept = np.flatnonzero(self.meta["alive"][:upto])
+        matrix = EmbeddingMatrix(
+            self.dim, self.dtype, initial_capacity=max(len(kept), 16))
+        matrix.chunk_rows = self.chunk_rows
+        for start in range(0, len(kept), self.chunk_rows):
+            matrix.extend_from(self, kept[start:start + self.chunk_rows])
+        return matrix, kept
+
+    def get(self, rows) -> np.ndarray:
+        """Returns the (dequantized) float32 vectors at the given row offsets."""
+        vectors = self.vectors[rows].astype(np.float32)
+        if self.scales is not None:
+            vectors *= self.scales[rows][..., None]
+        return vectors
+
+    def scores(self, query: np.ndarray, rows=None) -> np.ndarray:
+        """
+        Inner products between the query and all rows (or the given row offsets).
+        Removed rows score -inf.
+        """
+        if rows is not None:
+            result = self.get(rows) @ query
+            if self.dead:
+                result[~self.meta["alive"][rows]] = -np.inf
+            return result
+        if self.dtype == "float32":
+            result = self.vectors[:self.size] @ query
+        else:
+            result = np.empty(self.size, dtype=np.float32)
+            for start in range(0, self.size, self.chunk_rows):
+                end = min(start + self.chunk_rows, self.size)
+                result[start:end] = self.vectors[start:end].astype(
+                    np.float32) @ query
+            if self.scales is not None:
+                result *= self.scales[:self.size]
+        if self.dead:
+            result[~self.meta["alive"][:self.size]] = -np.inf
+        return result
+
+    def save(self, path: str):
+        """Writes the matrix to `path` (.npy) plus `.ids`/`.meta`/`.scales` side files."""
+        base = path[:-4] if path.endswith(".npy") else path
+        _save_array(f"{base}.npy", self.vectors[:self.size])
+        _save_array(f"{base}.ids.npy", self.ids[:self.size])
+        _save_array(f"{base}.meta.npy", self.meta[:self.size])
+        if self.scales is not None:
+            _save_array(f"{base}.scales.npy", self.scales[:self.size])
+        print(
+            f"EmbeddingMatrix: Saved {self.size} rows ({self.dtype}) to {base}.npy")
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True):
+        """
+        Loads a matrix written by `save`. Vectors are memory-mapped read-only by
+        default; row metadata is mapped copy-on-write so statistics stay updatable.
+        """
+        base = path[:-4] if path.endswith(".npy") else path
+        vectors = np.load(f"{base}.npy", mmap_mode="r" if mmap else None)
+        matrix = cls(vectors.shape[1], vectors.dtype.name, initial_capacity=0)
+        matrix.vectors = vectors
+        matrix.ids = np.load(f"{base}.ids.npy", mmap_mode="r" if mmap else None)
+        if matrix.dtype == "int8":
+            matrix.scales = np.load(
+                f"{base}.scales.npy", mmap_mode="r" if mmap else None)
+        matrix.size = vectors.shape[0]
+        if os.path.exists(f"{base}.meta.npy"):
+            matrix.meta = np.load(f"{base}.meta.npy",
+                                  mmap_mode="c" if mmap else None)
+        else:
+            matrix.meta = np.zeros(matrix.size, dtype=ROW_META_DTYPE)
+            matrix.meta["alive"] = True
+        matrix.dead = int(matrix.size - np.count_nonzero(matrix.meta["alive"]))
+        print(
+            f"EmbeddingMatrix: Loaded {matrix.size} rows ({matrix.dtype}) from {base}.npy (mmap: {mmap})")
+        return matrix
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        base = path[:-4] if path.endswith(".npy") else path
+        return os.path.exists(f"{base}.npy") and os.path.exists(f"{base}.ids.npy")
+
+
+if __name__ == '__main__':
+    import tempfile
+
+    print("Testing EmbeddingMatrix...")
+    rng = np.random.default_rng(0)
+    data = rng.standard_normal((10000, 256)).astype(np.float32)
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    for dtype in EMBEDDING_DTYPES:
+        matrix = EmbeddingMatrix(256, dtype=dtype)
+        matrix.append(np.arange(len(data)), data)
+        error = float(np.abs(matrix.scores(data[7]) - data @ data[7]).max())
+        print(f"{dtype}: {matrix.nbytes / 1e6:.1f} MB, max score error {error:.4f}")
+
+    matrix.remove(matrix.rows_for_ids([3, 5, 7]))
+    compacted, kept = matrix.compacted()
+    print(f"After removing 3 rows: {len(compacted)} rows, id 8 now at row {compacted.rows_for_ids([8])[0]}")
+
+    path = os.path.join(tempfile.mkdtemp(), "embeddings.npy")
+    matrix.save(path)
+    loaded = EmbeddingMatrix.load(path)
+    print(f"Loaded matrix is memory-mapped: {isinstance(loaded.vectors, np.memmap)}, live rows: {loaded.live_count}")
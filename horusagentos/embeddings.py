@@ -0,0 +1,134 @@
+# tech.md: 4.4. Memory Layer - Embedding Models
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+# Potential future imports: sentence_transformers
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+class HashingEmbeddingModel:
+    """
+    Dependency-free embedding model based on signed feature hashing of word tokens.
+
+    Mirrors the `encode` interface of Sentence Transformers so a real model can be
+    dropped in later. Vectors are L2-normalised float32, so the inner product of two
+    embeddings is their cosine similarity.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def _token_features(self, token: str):
+        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        return value % self.dim, 1.0 if (value >> 63) & 1 else -1.0
+
+    def encode(self, texts, batch_size: int = 256) -> np.ndarray:
+        """Encodes a string or a list of strings into a (n, dim) float32 matrix."""
+        single = isinstance(texts, str)
+        if single:
+            texts = [texts]
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in _TOKEN_PATTERN.findall(text.lower()):
+                column, sign = self._token_features(token)
+                matrix[row, column] += sign
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix[0] if single else matrix
+
+
+def _npz_path(path: str) -> str:
+    # np.savez appends .npz to paths without it; use the name it actually writes
+    return path if path.endswith(".npz") else f"{path}.npz"
+
+
+class EmbeddingCache:
+    """
+    Bounded LRU cache of embeddings keyed by a content hash of the text.
+
+    When `path` is set the cache can be saved to and reloaded from a `.npz` file,
+    so embeddings survive restarts.
+    """
+
+    def __init__(self, max_entries: int = 10000, path: str = None, namespace: str = ""):
+        self.max_entries = max_entries
+        self.path = _npz_path(path) if path else None
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if self.path and os.path.exists(self.path):
+            self.load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def key(self, text: str) -> str:
+        return hashlib.blake2b(f"{self.namespace}\x00{text}".encode("utf-8"), digest_size=16).hexdigest()
+
+    def get(self, key: str):
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, key: str, vector: np.ndarray):
+        # Copy so a cached row does not keep a whole batch matrix alive
+        vector = np.array(vector, dtype=np.float32)
+        vector.setflags(write=False)
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def save(self, path: str = None):
+        """Writes the cache (in LRU order) to a .npz file."""
+        path = _npz_path(path) if path else self.path
+        if not path:
+            return
+        with self._lock:
+            keys = np.array(list(self._entries.keys()))
+            vectors = np.stack(list(self._entries.values())) if self._entries else np.empty(
+                (0, 0), dtype=np.float32)
+        np.savez(path, keys=keys, vectors=vectors)
+        print(f"EmbeddingCache: Saved {len(keys)} embeddings to {path}")
+
+    def load(self, path: str = None):
+        """Loads a cache previously written by `save`."""
+        path = _npz_path(path) if path else self.path
+        with np.load(path) as data:
+            keys, vectors = data["keys"], data["vectors"]
+        with self._lock:
+            for key, vector in zip(keys.tolist(), vectors):
+                self._entries[key] = vector
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        print(f"EmbeddingCache: Loaded {len(keys)} embeddings from {path}")
+
+
+if __name__ == '__main__':
+    print("Testing HashingEmbeddingModel...")
+    model = HashingEmbeddingModel(dim=64)
+    vectors = model.encode(["Open Chrome", "open chrome browser", "Write a note"])
+    print(f"Embedding matrix shape: {vectors.shape}, dtype: {vectors.dtype}")
+    print(f"Similarity (0, 1): {float(vectors[0] @ vectors[1]):.3f}")
+    print(f"Similarity (0, 2): {float(vectors[0] @ vectors[2]):.3f}")
+
+    cache = EmbeddingCache(max_entries=2)
+    for text in ["a", "b", "a", "c"]:
+        key = cache.key(text)
+        if cache.get(key) is None:
+            cache.put(key, model.encode(text))
+    print(f"Cache size: {len(cache)}, hits: {cache.hits}, misses: {cache.misses}")
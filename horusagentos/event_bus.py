@@ -0,0 +1,282 @@
+# tech.md: 4.5. Communication Layer - Internal Message Bus
+import fnmatch
+import inspect
+import pickle
+import tempfile
+import threading
+import time
+from collections import deque
+
+OVERFLOW_POLICIES = ("drop_oldest", "block", "spill")
+DELIVERY_MODES = ("sync", "async", "pull")
+
+
+class Subscription:
+    """
+    One subscriber's bounded buffer. Messages are kept by reference (no copies, no
+    serialization) in a ring of `capacity` entries; when it is full the overflow
+    policy applies:
+
+    - "drop_oldest": the oldest buffered message is discarded (counted in `dropped`).
+    - "block": the publisher waits up to `block_timeout_s` for space, then drops.
+    - "spill": overflow is pickled to a temporary file and read back in order.
+
+    Delivery "async" hands messages to `callback` on a dedicated thread (coroutine
+    callbacks run on the shared runtime loop); "pull" leaves them for get().
+    """
+
+    def __init__(self, bus, pattern: str, callback=None, delivery: str = "async", capacity: int = 1024,
+                 overflow: str = "drop_oldest", block_timeout_s: float = None):
+        if delivery not in DELIVERY_MODES:
+            raise ValueError(f"Unknown delivery mode '{delivery}', expected one of {DELIVERY_MODES}")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{overflow}', expected one of {OVERFLOW_POLICIES}")
+        if delivery != "pull" and callback is None:
+            raise ValueError(f"'{delivery}' delivery needs a callback")
+        self.bus = bus
+        self.pattern = pattern
+        self.callback = callback
+        self.delivery = delivery
+        self.capacity = capacity
+        self.overflow = overflow
+        self.block_timeout_s = block_timeout_s
+        self.stats = {"published": 0, "delivered": 0, "dropped": 0, "spilled": 0, "errors": 0}
+        self._buffer = deque()
+        self._condition = threading.Condition()
+        self._spill_file = None
+        self._spill_read = 0
+        self._spill_pending = 0
+        self._closed = False
+        self._thread = None
+        if delivery == "async":
+            self._thread = threading.Thread(target=self._deliver_loop, name=f"horus-bus-{pattern}", daemon=True)
+            self._thread.start()
+
+    def __len__(self):
+        return len(self._buffer) + self._spill_pending
+
+    def put(self, topic: str, message) -> bool:
+        """Buffers (or, for sync delivery, delivers) one message; False if it was dropped."""
+        self.stats["published"] += 1
+        if self.delivery == "sync":
+            self._invoke(topic, message)
+            return True
+        with self._condition:
+            if self._closed:
+                return False
+            if self._spill_pending or len(self._buffer) >= self.capacity:
+                if self.overflow == "drop_oldest":
+                    self._buffer.popleft()
+                    self.stats["dropped"] += 1
+                elif self.overflow == "block":
+                    if not self._condition.wait_for(
+                            lambda: self._closed or len(self._buffer) < self.capacity, self.block_timeout_s) \
+                            or self._closed:
+                        self.stats["dropped"] += 1
+                        return False
+                else:
+                    return self._spill(topic, message)
+            self._buffer.append((topic, message))
+            self._condition.notify_all()
+        return True
+
+    def _spill(self, topic: str, message) -> bool:
+        try:
+            data = pickle.dumps((topic, message), pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            self.stats["dropped"] += 1  # not picklable: nothing to spill
+            return False
+        if self._spill_file is None:
+            self._spill_file = tempfile.TemporaryFile(prefix="horus-bus-")
+        self._spill_file.seek(0, 2)
+        self._spill_file.write(len(data).to_bytes(4, "little") + data)
+        self._spill_pending += 1
+        self.stats["spilled"] += 1
+        self._condition.notify_all()
+        return True
+
+    def _unspill(self):
+        """Moves spilled messages back into the ring, oldest first, as space allows."""
+        self._spill_file.seek(self._spill_read)
+        while self._spill_pending and len(self._buffer) < self.capacity:
+            size = int.from_bytes(self._spill_file.read(4), "little")
+            self._buffer.append(pickle.loads(self._spill_file.read(size)))
+            self._spill_read += 4 + size
+            self._spill_pending -= 1
+        if not self._spill_pending:
+            self._spill_file.seek(0)
+            self._spill_file.truncate()
+            self._spill_read = 0
+
+    def get(self, timeout_s: float = None):
+        """
+        Returns the next (topic, message), or None after `timeout_s` or once the
+        subscription is closed and drained.
+        """
+        with self._condition:
+            if not self._condition.wait_for(
+                    lambda: self._buffer or self._spill_pending or self._closed, timeout_s):
+                return None
+            if not self._buffer and self._spill_pending:
+                self._unspill()
+            if not self._buffer:
+                return None
+            item = self._buffer.popleft()
+            if self.delivery == "pull":
+                self.stats["delivered"] += 1
+            self._condition.notify_all()  # wake publishers blocked on a full buffer
+            return item
+
+    async def get_async(self, timeout_s: float = None):
+        """get() without blocking the event loop."""
+        import asyncio
+        return await asyncio.to_thread(self.get, timeout_s)
+
+    def drain(self) -> list:
+        """Returns and removes every buffered (topic, message) without waiting."""
+        items = []
+        while len(self):
+            item = self.get(0)
+            if item is None:
+                break
+            items.append(item)
+        return items
+
+    def _invoke(self, topic: str, message):
+        try:
+            result = self.callback(topic, message)
+            if inspect.isawaitable(result):
+                # Coroutine callbacks run on the shared runtime loop: awaited on the
+                # delivery thread, scheduled without waiting for sync delivery
+                import asyncio
+                from .async_runtime import get_runtime_loop, run_sync
+                if self.delivery == "async":
+                    run_sync(result)
+                else:
+                    asyncio.run_coroutine_threadsafe(result, get_runtime_loop())
+            self.stats["delivered"] += 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"EventBus: Subscriber '{self.pattern}' failed on '{topic}': {e}")
+
+    def _deliver_loop(self):
+        while True:
+            item = self.get()
+            if item is None:
+                if self._closed:
+                    return
+                continue
+            self._invoke(*item)
+
+    def close(self, drain: bool = True):
+        """Unsubscribes; async delivery finishes the buffered messages first when `drain` is set."""
+        self.bus._unsubscribe(self)
+        with self._condition:
+            self._closed = True
+            if not drain:
+                self._buffer.clear()
+                self._spill_pending = 0
+            self._condition.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        if self._spill_file is not None and not self._spill_pending:
+            self._spill_file.close()
+            self._spill_file = None
+
+
+class EventBus:
+    """
+    In-process publish/subscribe bus. Topics are dotted names ("decision.step_result");
+    a topic registered with a message type only accepts instances of it. Subscribers
+    match topics by name or glob pattern ("decision.*") and each gets its own bounded
+    buffer (see Subscription), so a slow consumer never slows the publisher beyond its
+    overflow policy.
+    """
+
+    def __init__(self, config: dict = None):
+        self.config = config if config else {}
+        self.default_capacity = self.config.get('capacity', 1024)
+        self.default_overflow = self.config.get('overflow', 'drop_oldest')
+        self.topics = {}
+        self._subscriptions = []
+        self._routes = {}  # topic -> matching subscriptions (cache, reset on (un)subscribe)
+        self._lock = threading.Lock()
+
+    def register_topic(self, name: str, message_type: type = None):
+        """Declares a topic; with `message_type`, publishing anything else raises TypeError."""
+        self.topics[name] = message_type
+
+    def subscribe(self, pattern: str, callback=None, delivery: str = "async", capacity: int = None,
+                  overflow: str = None, block_timeout_s: float = None) -> Subscription:
+        """
+        Subscribes to a topic or glob pattern. `callback(topic, message)` is called in
+        the publisher's thread ("sync"), on a delivery thread ("async"), or not at all
+        ("pull", read with Subscription.get()).
+        """
+        subscription = Subscription(self, pattern, callback, delivery,
+                                    capacity if capacity is not None else self.default_capacity,
+                                    overflow if overflow is not None else self.default_overflow,
+                                    block_timeout_s)
+        with self._lock:
+            self._subscriptions.append(subscription)
+            self._routes = {}
+        return subscription
+
+    def _unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+                self._routes = {}
+
+    def _route(self, topic: str) -> list:
+        routes = self._routes
+        matches = routes.get(topic)
+        if matches is None:
+            with self._lock:
+                matches = [s for s in self._subscriptions
+                           if s.pattern == topic or fnmatch.fnmatchcase(topic, s.pattern)]
+                self._routes[topic] = matches
+        return matches
+
+    def has_subscribers(self, topic: str) -> bool:
+        return bool(self._route(topic))
+
+    def publish(self, topic: str, message) -> int:
+        """Publishes a message by reference; returns how many subscribers accepted it."""
+        message_type = self.topics.get(topic)
+        if message_type is not None and not isinstance(message, message_type):
+            raise TypeError(f"Topic '{topic}' expects {message_type.__name__}, got {type(message).__name__}")
+        return sum(subscription.put(topic, message) for subscription in self._route(topic))
+
+    def close(self):
+        for subscription in list(self._subscriptions):
+            subscription.close()
+
+
+if __name__ == '__main__':
+    print("Testing EventBus...")
+    bus = EventBus()
+    bus.register_topic("decision.step_result", dict)
+
+    received = []
+    fast = bus.subscribe("decision.*", lambda topic, message: received.append(message["index"]))
+    slow = bus.subscribe("decision.step_result", lambda topic, message: time.sleep(0.01),
+                         capacity=8, overflow="drop_oldest")
+    spill = bus.subscribe("decision.step_result", delivery="pull", capacity=8, overflow="spill")
+
+    started = time.monotonic()
+    for index in range(1000):
+        bus.publish("decision.step_result", {"index": index, "success": True})
+    publish_ms = (time.monotonic() - started) * 1000
+    print(f"Published 1000 messages in {publish_ms:.1f} ms")
+    try:
+        bus.publish("decision.step_result", "not a dict")
+    except TypeError as e:
+        print(f"Typed topic rejected: {e}")
+    fast.close()
+    print(f"Fast subscriber got {len(received)} in order: {received == list(range(1000))}")
+    print(f"Slow subscriber (drop_oldest): {slow.stats}")
+    spilled = spill.drain()
+    print(f"Spill subscriber read back {len(spilled)} in order: "
+          f"{[m['index'] for _, m in spilled] == list(range(1000))}, stats {spill.stats}")
+    bus.close()
@@ -0,0 +1,293 @@
+# tech.md: 4.4. Memory Layer - Long-Term Memory Storage
+import atexit
+import itertools
+import json
+import os
+import queue
+import sqlite3
+import threading
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS experiences (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp REAL,
+        instruction TEXT,
+        plan TEXT,       -- JSON string
+        results TEXT,    -- JSON string
+        reflections TEXT,
+        instruction_embedding BLOB -- float32 bytes, used to rebuild the vector index
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS errors (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp REAL,
+        instruction TEXT,
+        plan TEXT,        -- JSON string
+        error_details TEXT -- JSON string
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_experiences_timestamp ON experiences (timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_experiences_instruction ON experiences (instruction)",
+    "CREATE INDEX IF NOT EXISTS idx_errors_timestamp ON errors (timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_errors_instruction ON errors (instruction)",
+)
+
+# Statement texts are constants so sqlite3's statement cache reuses the prepared statements.
+_INSERT_EXPERIENCE = (
+    "INSERT INTO experiences (id, timestamp, instruction, plan, results, reflections, instruction_embedding) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)")
+_INSERT_ERROR = (
+    "INSERT INTO errors (id, timestamp, instruction, plan, error_details) VALUES (?, ?, ?, ?, ?)")
+_SELECT_EXPERIENCES = (
+    "SELECT id, timestamp, instruction, plan, results, reflections FROM experiences WHERE id IN ({})")
+_SELECT_EMBEDDINGS = (
+    "SELECT id, timestamp, instruction_embedding FROM experiences WHERE id > ? ORDER BY id LIMIT ?")
+_DELETE_EXPERIENCE = "DELETE FROM experiences WHERE id = ?"
+
+_EXPERIENCE_COLUMNS = ("id", "timestamp", "instruction",
+                       "plan", "results", "reflections")
+_STOP = object()
+
+
+def _dumps(value):
+    return json.dumps(value) if value is not None else None
+
+
+def create_tables(conn):
+    """Creates the experiences/errors tables and their indexes if they do not exist."""
+    for statement in _SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+
+
+class SQLiteExperienceStore:
+    """
+    SQLite-backed experience and error store running in WAL mode.
+
+    Writes are queued and applied by a background writer thread, which groups up to
+    `write_batch_size` rows into one transaction, so callers never wait on disk I/O.
+    IDs are assigned at enqueue time, and rows still waiting in the queue are visible
+    to readers. Processes sharing one database file must use disjoint IDs: give each
+    a distinct `id_offset` below a common `id_stride` (e.g. TaskRunner workers).
+    """
+
+    def __init__(self, db_path: str, config: dict = None):
+        self.config = config if config else {}
+        self.db_path = db_path
+        self.write_batch_size = self.config.get('write_batch_size', 256)
+        self.flush_interval_s = self.config.get(
+            'flush_interval_ms', 50) / 1000.0
+        self.cached_statements = self.config.get('cached_statements', 128)
+
+        self._read_conn = self._connect()
+        create_tables(self._read_conn)
+        self._read_lock = threading.Lock()
+
+        self._id_lock = threading.Lock()
+        self.id_stride = self.config.get('id_stride', 1)
+        self.id_offset = self.config.get('id_offset', 0)
+        self._experience_ids = self._id_sequence("experiences")
+        self._error_ids = self._id_sequence("errors")
+        # Rows accepted but not yet committed, keyed by experience ID
+        self._pending_experiences = {}
+
+        self._queue = queue.Queue(
+            maxsize=self.config.get('max_pending_writes', 10000))
+        self._writer = threading.Thread(
+            target=self._write_loop, name="horus-memory-writer", daemon=True)
+        self._closed = False
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _connect(self):
+        directory = os.path.dirname(self.db_path)
+        if directory and self.db_path != ":memory:":
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # In WAL mode NORMAL only syncs at checkpoints instead of on every commit
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            f"PRAGMA busy_timeout={int(self.config.get('busy_timeout_ms', 5000))}")
+        return conn
+
+    def _max_id(self, table: str) -> int:
+        row = self._read_conn.execute(
+            f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()
+        return row[0]
+
+    def _id_sequence(self, table: str):
+        # IDs after the current maximum that are congruent to id_offset modulo id_stride
+        first = self._max_id(table) + 1
+        first += (self.id_offset - first) % self.id_stride
+        return itertools.count(first, self.id_stride)
+
+    def add_experience(self, timestamp: float, instruction: str, plan: list, results: dict,
+                       reflections: str = None, embedding=None) -> int:
+        """Queues an experience for writing and returns its ID immediately."""
+        # Serialize on the caller's thread so unserializable values raise here, not in the writer
+        plan, results = _dumps(plan), _dumps(results)
+        with self._id_lock:
+            experience_id = next(self._experience_ids)
+        row = {"id": experience_id, "timestamp": timestamp, "instruction": instruction,
+               "plan": plan, "results": results, "reflections": reflections,
+               "embedding": embedding}
+        self._pending_experiences[experience_id] = row
+        self._queue.put(("experience", row))
+        return experience_id
+
+    def add_error(self, timestamp: float, instruction: str, plan: list = None,
+                  error_details: dict = None) -> int:
+        """Queues an error record for writing and returns its ID immediately."""
+        plan, error_details = _dumps(plan), _dumps(error_details)
+        with self._id_lock:
+            error_id = next(self._error_ids)
+        self._queue.put(("error", {"id": error_id, "timestamp": timestamp, "instruction": instruction,
+                                   "plan": plan, "error_details": error_details}))
+        return error_id
+
+    def delete_experiences(self, ids: list):
+        """Queues the deletion of experiences (used by memory pruning)."""
+        for experience_id in ids:
+            self._pending_experiences.pop(experience_id, None)
+        self._queue.put(("delete", list(ids)))
+
+    def get_experiences(self, ids: list) -> dict:
+        """Returns {id: experience row} for the given IDs, including rows not yet committed."""
+        found = {}
+        missing = []
+        for experience_id in ids:
+            row = self._pending_experiences.get(experience_id)
+            if row is None:
+                missing.append(experience_id)
+            else:
+                found[experience_id] = {
+                    "id": row["id"], "timestamp": row["timestamp"], "instruction": row["instruction"],
+                    "plan": row["plan"], "results": row["results"],
+                    "reflections": row["reflections"]}
+        if missing:
+            sql = _SELECT_EXPERIENCES.format(",".join("?" * len(missing)))
+            with self._read_lock:
+                rows = self._read_conn.execute(sql, missing).fetchall()
+            for row in rows:
+                found[row[0]] = dict(zip(_EXPERIENCE_COLUMNS, row))
+        return found
+
+    def iter_embeddings(self, batch_size: int = 4096, after_id: int = 0):
+        """Yields (id, timestamp, embedding bytes) for committed experiences after `after_id`, in ID order."""
+        last_id = after_id
+        while True:
+            with self._read_lock:
+                rows = self._read_conn.execute(
+                    _SELECT_EMBEDDINGS, (last_id, batch_size)).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                if row[2] is not None:
+                    yield row
+            last_id = rows[-1][0]
+
+    def count(self, table: str = "experiences") -> int:
+        """Returns the number of rows in a table, counting queued writes as well."""
+        self.flush()
+        with self._read_lock:
+            return self._read_conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            # Group everything already queued (up to the batch size) into one transaction
+            try:
+                while len(batch) < self.write_batch_size:
+                    batch.append(self._queue.get(timeout=self.flush_interval_s))
+            except queue.Empty:
+                pass
+            stop = any(entry is _STOP for entry in batch)
+            records = [entry for entry in batch if entry is not _STOP]
+            try:
+                self._write_batch(conn, records)
+            except Exception as e:
+                # One bad record must not cost the whole batch: retry each on its own
+                print(f"Memory: Failed to write batch of {len(records)} records ({e}), retrying one by one.")
+                for record in records:
+                    try:
+                        self._write_batch(conn, [record])
+                    except Exception as record_error:
+                        print(f"Memory: Dropped {record[0]} record: {record_error}")
+            finally:
+                # Readers must never see rows that were not stored
+                for kind, row in records:
+                    if kind == "experience":
+                        self._pending_experiences.pop(row["id"], None)
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                conn.close()
+                return
+
+    def _write_batch(self, conn, batch: list):
+        experiences = []
+        errors = []
+        deletions = []
+        for kind, row in batch:
+            if kind == "delete":
+                deletions.extend((experience_id,) for experience_id in row)
+            elif kind == "experience":
+                embedding = row["embedding"]
+                experiences.append((
+                    row["id"], row["timestamp"], row["instruction"], row["plan"],
+                    row["results"], row["reflections"],
+                    embedding.tobytes() if embedding is not None else None))
+            else:
+                errors.append((
+                    row["id"], row["timestamp"], row["instruction"], row["plan"],
+                    row["error_details"]))
+        with conn:
+            if experiences:
+                conn.executemany(_INSERT_EXPERIENCE, experiences)
+            if errors:
+                conn.executemany(_INSERT_ERROR, errors)
+            if deletions:
+                conn.executemany(_DELETE_EXPERIENCE, deletions)
+
+    def flush(self):
+        """Blocks until every queued write has been committed."""
+        if not self._closed:
+            self._queue.join()
+
+    def close(self):
+        """Flushes pending writes and stops the writer thread."""
+        if self._closed:
+            return
+        self._queue.put(_STOP)
+        self._queue.join()
+        self._writer.join()
+        self._closed = True
+        with self._read_lock:
+            self._read_conn.close()
+        atexit.unregister(self.close)
+
+
+if __name__ == '__main__':
+    import tempfile
+    import time
+
+    print("Testing SQLiteExperienceStore...")
+    path = os.path.join(tempfile.mkdtemp(), "horus_store_test.db")
+    store = SQLiteExperienceStore(path)
+    start = time.perf_counter()
+    for i in range(5000):
+        store.add_experience(time.time(), f"Instruction {i}", [{"action": "click"}], {"summary": "ok"})
+    print(f"Queued 5000 experiences in {(time.perf_counter() - start) * 1000:.1f} ms")
+    store.add_error(time.time(), "Failed instruction", None, {"error": "mock"})
+    print(f"Experience 42 before flush: {store.get_experiences([42])[42]['instruction']}")
+    store.close()
+
+    reopened = SQLiteExperienceStore(path)
+    print(f"Experiences after reopen: {reopened.count()}, errors: {reopened.count('errors')}")
+    reopened.close()
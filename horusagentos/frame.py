@@ -0,0 +1,191 @@
+# tech.md: 4.1. Perception Layer - Screen Analysis
+import atexit
+import base64
+import struct
+import threading
+import time
+import zlib
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+def encode_png(pixels: np.ndarray, compress_level: int = 6) -> bytes:
+    """Encodes an (h, w, 3) uint8 RGB or (h, w) gray array as PNG (stdlib only)."""
+    pixels = np.ascontiguousarray(pixels, dtype=np.uint8)
+    height, width = pixels.shape[:2]
+    color_type = 2 if pixels.ndim == 3 else 0
+    # Filter type 0 (None) in front of every scanline
+    rows = np.empty((height, pixels[0].nbytes + 1), dtype=np.uint8)
+    rows[:, 0] = 0
+    rows[:, 1:] = pixels.reshape(height, -1)
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+            + chunk(b"IDAT", zlib.compress(rows.tobytes(), compress_level)) + chunk(b"IEND", b""))
+
+
+class Frame:
+    """
+    Raw screen frame: an (h, w, 3) uint8 NumPy view over a heap or shared-memory
+    buffer. Stages read `pixels` (or use the buffer protocol) directly; nothing is
+    encoded until `encode`/`to_base64` is called, e.g. when a frame goes to an LLM.
+
+    A frame backed by shared memory pickles as the segment name plus its shape, so
+    handing it to a worker process does not copy the pixels.
+    """
+
+    def __init__(self, pixels: np.ndarray, origin: tuple = (0, 0), timestamp: float = None,
+                 shm: shared_memory.SharedMemory = None):
+        self.pixels = pixels
+        self.origin = tuple(origin)
+        self.timestamp = timestamp if timestamp is not None else time.time()
+        self._shm = shm
+        self._encoded = {}
+
+    @property
+    def shape(self):
+        return self.pixels.shape
+
+    @property
+    def width(self):
+        return self.pixels.shape[1]
+
+    @property
+    def height(self):
+        return self.pixels.shape[0]
+
+    @property
+    def nbytes(self):
+        return self.pixels.nbytes
+
+    @property
+    def shared(self) -> bool:
+        return self._shm is not None
+
+    def __array__(self, dtype=None, copy=None):
+        return self.pixels if dtype is None else self.pixels.astype(dtype)
+
+    def __buffer__(self, flags):
+        return memoryview(self.pixels)
+
+    def region(self, region: tuple):
+        """Returns a [x, y, width, height] sub-frame that shares this frame's buffer."""
+        x, y, w, h = region
+        return Frame(self.pixels[y:y + h, x:x + w], (self.origin[0] + x, self.origin[1] + y),
+                     self.timestamp, self._shm)
+
+    def encode(self, image_format: str = "png") -> bytes:
+        """Encodes the frame on demand ('png' or 'raw'); the result is cached per format."""
+        if image_format not in self._encoded:
+            if image_format == "png":
+                self._encoded[image_format] = encode_png(self.pixels)
+            elif image_format == "raw":
+                self._encoded[image_format] = self.pixels.tobytes()
+            else:
+                raise ValueError(f"Unsupported image format: {image_format}")
+        return self._encoded[image_format]
+
+    def to_base64(self, image_format: str = "png") -> str:
+        return base64.b64encode(self.encode(image_format)).decode("ascii")
+
+    def as_payload(self, image_format: str = "png") -> dict:
+        """The legacy {"image_data_format", "data"} message form, for LLM or remote consumers."""
+        return {"image_data_format": f"{image_format}_base64", "data": self.to_base64(image_format),
+                "width": self.width, "height": self.height}
+
+    def __reduce__(self):
+        if self._shm is None:
+            return (Frame, (self.pixels, self.origin, self.timestamp))
+        base = self._base_offset()
+        return (_attach_frame, (self._shm.name, base, self.pixels.shape, self.pixels.strides,
+                                self.pixels.dtype.str, self.origin, self.timestamp))
+
+    def _base_offset(self) -> int:
+        start = self.pixels.__array_interface__["data"][0]
+        return start - np.frombuffer(self._shm.buf, dtype=np.uint8, count=1).__array_interface__["data"][0]
+
+    def __repr__(self):
+        backing = f"shm={self._shm.name}" if self._shm else "heap"
+        return f"Frame({self.width}x{self.height}, origin={self.origin}, {backing})"
+
+
+# Segments attached in this process, kept open for the lifetime of their frames
+_attached = {}
+_attached_lock = threading.Lock()
+
+
+def _attach_frame(name, offset, shape, strides, dtype, origin, timestamp):
+    with _attached_lock:
+        shm = _attached.get(name)
+        if shm is None:
+            # track=False: the creating process owns (and unlinks) the segment
+            shm = shared_memory.SharedMemory(name=name, track=False)
+            _attached[name] = shm
+    pixels = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset, strides=strides)
+    return Frame(pixels, origin, timestamp, shm)
+
+
+class SharedFrameRing:
+    """
+    Fixed set of shared-memory frame buffers reused round-robin. A frame handed out
+    stays valid until its slot comes round again, so `slots` bounds how many frames
+    may be in flight at once.
+    """
+
+    def __init__(self, slots: int = 4):
+        self.slots = slots
+        self._buffers = []
+        self._next = 0
+        self._shape = None
+        self._lock = threading.Lock()
+        # Segments outlive the process unless unlinked, so release them on exit too
+        atexit.register(self.close)
+
+    def allocate(self, shape: tuple, dtype=np.uint8) -> Frame:
+        """Returns a frame over the next free slot (contents are left as they were)."""
+        with self._lock:
+            if shape != self._shape:
+                self.close()
+                self._shape = shape
+                size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+                self._buffers = [shared_memory.SharedMemory(create=True, size=size)
+                                 for _ in range(self.slots)]
+            shm = self._buffers[self._next]
+            self._next = (self._next + 1) % self.slots
+        return Frame(np.ndarray(shape, dtype=dtype, buffer=shm.buf), shm=shm)
+
+    def close(self):
+        for shm in self._buffers:
+            try:
+                shm.close()
+            except BufferError:
+                pass  # a frame still views the slot; the mapping goes away with it
+            shm.unlink()
+        self._buffers = []
+        self._shape = None
+
+
+if __name__ == '__main__':
+    import pickle
+
+    print("Testing Frame...")
+    ring = SharedFrameRing(slots=2)
+    frame = ring.allocate((1080, 1920, 3))
+    frame.pixels[:] = 30
+    frame.pixels[100:200, 100:400] = (200, 60, 60)
+    payload = pickle.dumps(frame.region((100, 100, 300, 100)))
+    print(f"{frame}: pickled sub-frame is {len(payload)} bytes for {frame.nbytes} bytes of pixels")
+    clone = pickle.loads(payload)
+    print(f"Unpickled {clone}, first pixel {clone.pixels[0, 0].tolist()}")
+    started = time.perf_counter()
+    png = frame.encode("png")
+    print(f"PNG on demand: {len(png)} bytes in {(time.perf_counter() - started) * 1000:.1f} ms")
+    del clone, frame
+    for shm in _attached.values():
+        shm.close()
+    _attached.clear()
+    ring.close()
@@ -0,0 +1,82 @@
+# tech.md: 4.1. Perception Layer - Screen Analysis
+import zlib
+
+import numpy as np
+
+
+def tile_checksums(pixels: np.ndarray, tile_size: int) -> np.ndarray:
+    """Returns a (rows, cols) grid of CRC32 checksums, one per tile_size x tile_size tile."""
+    height, width = pixels.shape[:2]
+    rows, cols = -(-height // tile_size), -(-width // tile_size)
+    checksums = np.empty((rows, cols), dtype=np.uint32)
+    for r in range(rows):
+        band = pixels[r * tile_size:(r + 1) * tile_size]
+        for c in range(cols):
+            checksums[r, c] = zlib.crc32(np.ascontiguousarray(
+                band[:, c * tile_size:(c + 1) * tile_size]))
+    return checksums
+
+
+class FrameFingerprint:
+    """
+    Cheap per-tile fingerprint of a screen frame. Comparing two fingerprints tells
+    which tiles changed without keeping the previous frame's pixels around.
+    """
+
+    def __init__(self, checksums: np.ndarray, tile_size: int, shape: tuple):
+        self.checksums = checksums
+        self.tile_size = tile_size
+        self.shape = shape
+
+    @classmethod
+    def from_pixels(cls, pixels: np.ndarray, tile_size: int = 64):
+        return cls(tile_checksums(pixels, tile_size), tile_size, pixels.shape)
+
+    def changed_tiles(self, previous) -> np.ndarray:
+        """Boolean (rows, cols) mask of tiles that differ from `previous` (all True if incomparable)."""
+        if previous is None or previous.shape != self.shape or previous.tile_size != self.tile_size:
+            return np.ones(self.checksums.shape, dtype=bool)
+        return self.checksums != previous.checksums
+
+    def dirty_regions(self, previous) -> list:
+        """Changed screen areas as [x, y, width, height] rectangles (adjacent tiles in a row merged)."""
+        return tiles_to_regions(self.changed_tiles(previous), self.tile_size, self.shape)
+
+
+def tiles_to_regions(mask: np.ndarray, tile_size: int, shape: tuple) -> list:
+    """Converts a tile mask into [x, y, width, height] rectangles clipped to the frame."""
+    height, width = shape[:2]
+    if mask.all():
+        return [[0, 0, width, height]]
+    regions = []
+    for r, c_start, c_end in _row_runs(mask):
+        x, y = c_start * tile_size, r * tile_size
+        regions.append([x, y, min(c_end * tile_size, width) - x,
+                        min(y + tile_size, height) - y])
+    return regions
+
+
+def _row_runs(mask: np.ndarray):
+    for r in range(mask.shape[0]):
+        columns = np.flatnonzero(mask[r])
+        if not len(columns):
+            continue
+        # Split wherever consecutive dirty columns are not adjacent
+        breaks = np.flatnonzero(np.diff(columns) > 1) + 1
+        for run in np.split(columns, breaks):
+            yield r, int(run[0]), int(run[-1]) + 1
+
+
+def regions_intersect(a, b) -> bool:
+    """True if two [x, y, width, height] rectangles overlap."""
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+
+if __name__ == '__main__':
+    print("Testing FrameFingerprint...")
+    frame = np.zeros((1080, 1920, 3), dtype=np.uint8)
+    before = FrameFingerprint.from_pixels(frame)
+    frame[100:120, 300:500] = 255
+    after = FrameFingerprint.from_pixels(frame)
+    print(f"Dirty regions: {after.dirty_regions(before)}")
+    print(f"Unchanged frame dirty regions: {after.dirty_regions(after)}")
@@ -0,0 +1,384 @@
+# tech.md: 4.5. Communication Layer - Network Protocols
+import asyncio
+import http.client
+import json
+import queue
+import ssl
+import threading
+from urllib.parse import urlsplit
+
+# Errors that mean a pooled keep-alive connection went stale and the request may be retried
+_STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, http.client.CannotSendRequest,
+                            http.client.BadStatusLine, BrokenPipeError, ConnectionResetError)
+
+
+class HTTPResponse:
+    """Fully read response: status, headers (lower-cased names) and body bytes."""
+
+    def __init__(self, status: int, headers: dict, body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+    def json(self):
+        return json.loads(self.body.decode("utf-8"))
+
+
+class HTTPStreamError(IOError):
+    """Non-2xx status on a streamed request; `response` holds the fully read error response."""
+
+    def __init__(self, response: HTTPResponse):
+        super().__init__(f"HTTP {response.status}: {response.body[:200]!r}")
+        self.response = response
+
+
+def _prepare_request(url: str, body, headers: dict, default_headers: dict):
+    """Splits a URL into (origin, path) and encodes dict/list bodies as JSON."""
+    parts = urlsplit(url)
+    origin = (parts.scheme or "http", parts.hostname,
+              parts.port or (443 if parts.scheme == "https" else 80))
+    path = (parts.path or "/") + ("?" + parts.query if parts.query else "")
+    request_headers = dict(default_headers)
+    request_headers.update(headers or {})
+    if isinstance(body, (dict, list)):
+        body = json.dumps(body).encode("utf-8")
+        request_headers.setdefault("Content-Type", "application/json")
+    elif isinstance(body, str):
+        body = body.encode("utf-8")
+    return origin, path, body, request_headers
+
+
+class HTTPConnectionPool:
+    """
+    Keep-alive connection pool over `http.client`, one bounded idle queue per
+    (scheme, host, port). Connections are reused across requests and threads instead
+    of reconnecting (and re-doing TLS) on every call; a request on a connection the
+    server has since closed is retried once on a fresh connection.
+    """
+
+    def __init__(self, max_connections_per_host: int = 8, timeout_s: float = 30.0, default_headers: dict = None):
+        self.max_connections_per_host = max_connections_per_host
+        self.timeout_s = timeout_s
+        self.default_headers = default_headers if default_headers else {}
+        self.connections_opened = 0
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _idle_queue(self, origin: tuple) -> queue.LifoQueue:
+        with self._lock:
+            if origin not in self._idle:
+                self._idle[origin] = queue.LifoQueue(self.max_connections_per_host)
+            return self._idle[origin]
+
+    def _connect(self, origin: tuple):
+        scheme, host, port = origin
+        connection_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        with self._lock:
+            self.connections_opened += 1
+        return connection_class(host, port, timeout=self.timeout_s)
+
+    def _acquire(self, origin: tuple):
+        try:
+            return self._idle_queue(origin).get_nowait(), True
+        except queue.Empty:
+            return self._connect(origin), False
+
+    def _release(self, origin: tuple, connection):
+        try:
+            self._idle_queue(origin).put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def request(self, method: str, url: str, body=None, headers: dict = None, timeout_s: float = None) -> HTTPResponse:
+        """Sends a request; dict/list bodies are sent as JSON."""
+        origin, path, body, request_headers = _prepare_request(url, body, headers, self.default_headers)
+        for attempt in range(2):
+            connection, reused = self._acquire(origin)
+            if timeout_s is not None:
+                connection.timeout = timeout_s
+                if connection.sock is not None:
+                    connection.sock.settimeout(timeout_s)
+            try:
+                connection.request(method, path, body=body, headers=request_headers)
+                response = connection.getresponse()
+                payload = response.read()
+            except _STALE_CONNECTION_ERRORS:
+                connection.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            except Exception:
+                connection.close()
+                raise
+            result = HTTPResponse(response.status, {k.lower(): v for k, v in response.getheaders()}, payload)
+            if response.will_close:
+                connection.close()
+            else:
+                if timeout_s is not None:
+                    connection.timeout = self.timeout_s
+                    if connection.sock is not None:
+                        connection.sock.settimeout(self.timeout_s)
+                self._release(origin, connection)
+            return result
+
+    def stream_lines(self, method: str, url: str, body=None, headers: dict = None, timeout_s: float = None):
+        """
+        Sends a request and yields the response body line by line (bytes, without the
+        line ending) as it arrives, e.g. for server-sent events. Raises HTTPStreamError
+        with the full body for non-2xx responses. The connection returns to the pool
+        once the body has been read to the end.
+        """
+        origin, path, body, request_headers = _prepare_request(url, body, headers, self.default_headers)
+        for attempt in range(2):
+            connection, reused = self._acquire(origin)
+            if timeout_s is not None:
+                connection.timeout = timeout_s
+                if connection.sock is not None:
+                    connection.sock.settimeout(timeout_s)
+            try:
+                connection.request(method, path, body=body, headers=request_headers)
+                response = connection.getresponse()
+                break
+            except _STALE_CONNECTION_ERRORS:
+                connection.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            except Exception:
+                connection.close()
+                raise
+        finished = False
+        try:
+            if not 200 <= response.status < 300:
+                raise HTTPStreamError(HTTPResponse(
+                    response.status, {k.lower(): v for k, v in response.getheaders()}, response.read()))
+            while True:
+                line = response.readline()
+                if not line:
+                    break
+                yield line.rstrip(b"\r\n")
+            finished = not response.will_close
+        finally:
+            if finished:
+                connection.timeout = self.timeout_s
+                if connection.sock is not None:
+                    connection.sock.settimeout(self.timeout_s)
+                self._release(origin, connection)
+            else:
+                connection.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for pending in idle.values():
+            while True:
+                try:
+                    pending.get_nowait().close()
+                except queue.Empty:
+                    break
+
+
+class AsyncHTTPConnectionPool:
+    """
+    asyncio counterpart of HTTPConnectionPool over stdlib streams: HTTP/1.1 keep-alive
+    with Content-Length and chunked bodies, so many coroutines can wait on the network
+    from one thread. Idle connections are kept per (event loop, origin); a request on a
+    connection the server has since closed is retried once on a fresh connection.
+    """
+
+    def __init__(self, max_connections_per_host: int = 8, timeout_s: float = 30.0, default_headers: dict = None):
+        self.max_connections_per_host = max_connections_per_host
+        self.timeout_s = timeout_s
+        self.default_headers = default_headers if default_headers else {}
+        self.connections_opened = 0
+        self._idle = {}
+
+    async def _acquire(self, origin: tuple):
+        loop = asyncio.get_running_loop()
+        for key in [key for key in self._idle if key[0].is_closed()]:
+            del self._idle[key]
+        idle = self._idle.get((loop, origin), [])
+        while idle:
+            reader, writer = idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer, True
+            writer.close()
+        scheme, host, port = origin
+        reader, writer = await asyncio.open_connection(
+            host, port, ssl=ssl.create_default_context() if scheme == "https" else None)
+        self.connections_opened += 1
+        return reader, writer, False
+
+    def _release(self, origin: tuple, reader, writer):
+        idle = self._idle.setdefault((asyncio.get_running_loop(), origin), [])
+        if len(idle) < self.max_connections_per_host:
+            idle.append((reader, writer))
+        else:
+            writer.close()
+
+    @staticmethod
+    async def _exchange(reader, writer, method: str, origin: tuple, path: str, body, headers: dict):
+        """Writes the request and reads the status line and headers."""
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {origin[1]}:{origin[2]}"]
+        if body is not None or method in ("POST", "PUT", "PATCH"):
+            headers = dict(headers, **{"Content-Length": str(len(body or b""))})
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + (body or b""))
+        await writer.drain()
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Server closed the connection")
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+        return status, response_headers
+
+    @staticmethod
+    async def _body(reader, method: str, status: int, headers: dict):
+        """Yields the response body in pieces (chunked, Content-Length or read-to-close)."""
+        if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+            return
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await reader.readline()).split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass  # trailers
+                    return
+                data = await reader.readexactly(size)
+                await reader.readexactly(2)
+                yield data
+        elif "content-length" in headers:
+            remaining = int(headers["content-length"])
+            while remaining:
+                data = await reader.read(min(65536, remaining))
+                if not data:
+                    raise asyncio.IncompleteReadError(b"", remaining)
+                remaining -= len(data)
+                yield data
+        else:
+            while data := await reader.read(65536):
+                yield data
+
+    @staticmethod
+    def _keeps_alive(headers: dict) -> bool:
+        framed = "content-length" in headers or headers.get("transfer-encoding", "").lower() == "chunked"
+        return framed and headers.get("connection", "").lower() != "close"
+
+    async def _open(self, method: str, origin: tuple, path: str, body, headers: dict):
+        for attempt in range(2):
+            reader, writer, reused = await self._acquire(origin)
+            try:
+                status, response_headers = await self._exchange(reader, writer, method, origin, path, body, headers)
+                return reader, writer, status, response_headers
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+
+    async def request(self, method: str, url: str, body=None, headers: dict = None, timeout_s: float = None) -> HTTPResponse:
+        """Sends a request; dict/list bodies are sent as JSON."""
+        origin, path, body, request_headers = _prepare_request(url, body, headers, self.default_headers)
+        async with asyncio.timeout(timeout_s if timeout_s is not None else self.timeout_s):
+            reader, writer, status, response_headers = await self._open(method, origin, path, body, request_headers)
+            try:
+                payload = b"".join([data async for data in self._body(reader, method, status, response_headers)])
+            except BaseException:
+                writer.close()
+                raise
+        if self._keeps_alive(response_headers):
+            self._release(origin, reader, writer)
+        else:
+            writer.close()
+        return HTTPResponse(status, response_headers, payload)
+
+    async def stream_lines(self, method: str, url: str, body=None, headers: dict = None, timeout_s: float = None):
+        """
+        Async generator over the response body lines; see HTTPConnectionPool.stream_lines.
+        As with the blocking pool's socket timeout, `timeout_s` bounds opening the
+        response and then every single read, so a stalled stream raises TimeoutError.
+        """
+        origin, path, body, request_headers = _prepare_request(url, body, headers, self.default_headers)
+        timeout_s = timeout_s if timeout_s is not None else self.timeout_s
+        async with asyncio.timeout(timeout_s):
+            reader, writer, status, response_headers = await self._open(method, origin, path, body, request_headers)
+        finished = False
+        try:
+            chunks = self._body(reader, method, status, response_headers)
+            if not 200 <= status < 300:
+                async with asyncio.timeout(timeout_s):
+                    error_body = b"".join([d async for d in chunks])
+                raise HTTPStreamError(HTTPResponse(status, response_headers, error_body))
+            pending = b""
+            while True:
+                try:
+                    async with asyncio.timeout(timeout_s):
+                        data = await anext(chunks)
+                except StopAsyncIteration:
+                    break
+                pending += data
+                *lines, pending = pending.split(b"\n")
+                for line in lines:
+                    yield line.rstrip(b"\r")
+            if pending:
+                yield pending.rstrip(b"\r")
+            finished = self._keeps_alive(response_headers)
+        finally:
+            if finished:
+                self._release(origin, reader, writer)
+            else:
+                writer.close()
+
+    def close(self):
+        idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for _, writer in connections:
+                writer.close()
+
+
+# Process-wide pools shared by clients that do not bring their own
+_shared_pool = None
+_shared_async_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_shared_pool() -> HTTPConnectionPool:
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = HTTPConnectionPool()
+        return _shared_pool
+
+
+def get_shared_async_pool() -> AsyncHTTPConnectionPool:
+    global _shared_async_pool
+    with _shared_pool_lock:
+        if _shared_async_pool is None:
+            _shared_async_pool = AsyncHTTPConnectionPool()
+        return _shared_async_pool
+
+
+if __name__ == '__main__':
+    from .mock_llm_server import MockLLMServer
+
+    print("Testing HTTPConnectionPool...")
+    server = MockLLMServer().start()
+    pool = HTTPConnectionPool(max_connections_per_host=2)
+    for _ in range(5):
+        pool.request("POST", server.base_url + "/chat/completions", {"messages": []})
+    print(f"5 requests used {pool.connections_opened} connection(s); server saw {server.stats['connections']}")
+    pool.close()
+    server.stop()
@@ -0,0 +1,257 @@
+# tech.md: 4.3. Action Layer - Cross-Platform Drivers
+import subprocess
+import time
+from collections import deque
+# Potential future imports: evdev (uinput), pyautogui
+
+# Action types that map directly onto native input events and can be batched
+LOW_LEVEL_ACTIONS = ("click", "type_text", "press_key", "scroll")
+
+# Common key names used in plans -> X keysyms
+_XDOTOOL_KEYS = {
+    "enter": "Return", "return": "Return", "esc": "Escape", "escape": "Escape", "tab": "Tab",
+    "backspace": "BackSpace", "delete": "Delete", "space": "space", "up": "Up", "down": "Down",
+    "left": "Left", "right": "Right", "home": "Home", "end": "End", "pageup": "Prior",
+    "pagedown": "Next", "ctrl": "ctrl", "control": "ctrl", "alt": "alt", "shift": "shift",
+    "win": "super", "cmd": "super", "super": "super",
+}
+
+
+def coalesce_actions(actions: list, current_state: dict = None) -> list:
+    """
+    Turns a run of low-level actions ({"action", "params"}) into native input events:
+    consecutive type_text actions become one "text" event and consecutive press_key
+    actions one "keys" event. Events are dicts with "type" in text/keys/click/scroll.
+    """
+    elements = {e.get("id"): e for e in (current_state or {}).get("ui_elements", [])}
+    events = []
+    for action in actions:
+        action_type, params = action["action"], action.get("params", {})
+        last = events[-1] if events else None
+        if action_type == "type_text":
+            if params.get("element_id") and params["element_id"] in elements:
+                events.append(_click_event(params, elements))
+                last = None
+            if last is not None and last["type"] == "text":
+                last["text"] += params.get("text", "")
+            else:
+                events.append({"type": "text", "text": params.get("text", "")})
+        elif action_type == "press_key":
+            if last is not None and last["type"] == "keys":
+                last["keys"].append(params.get("key_name"))
+            else:
+                events.append({"type": "keys", "keys": [params.get("key_name")]})
+        elif action_type == "click":
+            events.append(_click_event(params, elements))
+        elif action_type == "scroll":
+            amount = params.get("amount", 100)
+            events.append({"type": "scroll",
+                           "amount": -amount if params.get("direction", "down") == "down" else amount})
+        else:
+            raise ValueError(f"Not a low-level action: {action_type}")
+    return events
+
+
+def _click_event(params: dict, elements: dict) -> dict:
+    x, y = params.get("x"), params.get("y")
+    element = elements.get(params.get("element_id"))
+    if (x is None or y is None) and element and element.get("bounds"):
+        bx, by, bw, bh = element["bounds"]
+        x, y = bx + bw // 2, by + bh // 2
+    return {"type": "click", "x": x, "y": y, "button": params.get("button", "left")}
+
+
+class FakeInputBackend:
+    """
+    Records the event batches it is sent instead of generating input (for tests and
+    mock runs). Only the last `max_batches` are kept, so a long-running agent on the
+    default backend does not grow without bound.
+    """
+
+    def __init__(self, max_batches: int = 100):
+        self.batches = deque(maxlen=max_batches)
+
+    def send(self, events: list, typing_interval_ms: float = 0):
+        self.batches.append({"events": events, "typing_interval_ms": typing_interval_ms})
+
+
+class XdotoolInputBackend:
+    """
+    Linux/X11 backend that drives `xdotool`. A batch is sent as chained xdotool
+    commands; since `type` and `key` consume the rest of their command line, a new
+    xdotool process is started only after each coalesced text or key run.
+    """
+
+    _BUTTONS = {"left": "1", "middle": "2", "right": "3"}
+
+    def __init__(self, executable: str = "xdotool"):
+        self.executable = executable
+
+    def commands(self, events: list, typing_interval_ms: float = 0) -> list:
+        """Returns the argv lists one batch is sent as."""
+        delay = str(int(typing_interval_ms))
+        commands = []
+        chain = [self.executable]
+        for event in events:
+            if event["type"] == "click":
+                if event["x"] is not None and event["y"] is not None:
+                    chain += ["mousemove", "--sync", str(event["x"]), str(event["y"])]
+                chain += ["click", self._BUTTONS.get(event["button"], "1")]
+            elif event["type"] == "scroll":
+                button = "4" if event["amount"] > 0 else "5"
+                # xdotool scrolls in wheel clicks (buttons 4/5); ~40 units per click
+                chain += ["click", "--repeat", str(max(1, abs(event["amount"]) // 40)), button]
+            elif event["type"] == "text":
+                commands.append(chain + ["type", "--delay", delay, "--", event["text"]])
+                chain = [self.executable]
+            elif event["type"] == "keys":
+                keys = ["+".join(_XDOTOOL_KEYS.get(part.lower(), part) for part in key.split("+"))
+                        for key in event["keys"]]
+                commands.append(chain + ["key", "--delay", delay, "--"] + keys)
+                chain = [self.executable]
+        if len(chain) > 1:
+            commands.append(chain)
+        return commands
+
+    def send(self, events: list, typing_interval_ms: float = 0):
+        for command in self.commands(events, typing_interval_ms):
+            subprocess.run(command, check=True)
+
+
+# US layout: characters typed with shift held, mapped to their unshifted key
+_SHIFTED = {"!": "1", "@": "2", "#": "3", "$": "4", "%": "5", "^": "6", "&": "7", "*": "8",
+            "(": "9", ")": "0", "_": "-", "+": "=", "{": "[", "}": "]", "|": "\\", ":": ";",
+            "\"": "'", "<": ",", ">": ".", "?": "/", "~": "`"}
+_PUNCTUATION_KEYS = {"-": "MINUS", "=": "EQUAL", "[": "LEFTBRACE", "]": "RIGHTBRACE",
+                     "\\": "BACKSLASH", ";": "SEMICOLON", "'": "APOSTROPHE", ",": "COMMA",
+                     ".": "DOT", "/": "SLASH", "`": "GRAVE", " ": "SPACE", "\n": "ENTER",
+                     "\t": "TAB"}
+# X keysyms (see _XDOTOOL_KEYS) whose evdev KEY_* name differs
+_UINPUT_KEYS = {"ctrl": "LEFTCTRL", "alt": "LEFTALT", "shift": "LEFTSHIFT", "super": "LEFTMETA",
+                "Return": "ENTER", "Escape": "ESC", "BackSpace": "BACKSPACE", "Prior": "PAGEUP",
+                "Next": "PAGEDOWN"}
+
+
+class UInputBackend:
+    """
+    Linux backend that writes events straight to uinput virtual devices (`evdev`,
+    imported on construction): a keyboard, and a pointer with absolute X/Y axes
+    spanning `screen_size`, mouse buttons and a scroll wheel. All events of a batch
+    are written back to back with one SYN per key stroke or pointer step and no
+    per-event process or round trip; with typing_interval_ms=0 a whole text field is
+    written in a single burst. Text is mapped on a US layout; a batch containing a
+    character that layout cannot type is rejected with ValueError before any input
+    is written.
+    """
+
+    _BUTTONS = {"left": "BTN_LEFT", "middle": "BTN_MIDDLE", "right": "BTN_RIGHT"}
+
+    def __init__(self, device_name: str = "horus-virtual-input", screen_size: tuple = (1920, 1080)):
+        from evdev import AbsInfo, UInput, ecodes
+        self._ecodes = ecodes
+        self._ui = UInput(name=f"{device_name}-keyboard")
+        width, height = screen_size
+        capabilities = {
+            ecodes.EV_KEY: [ecodes.ecodes[name] for name in self._BUTTONS.values()],
+            ecodes.EV_ABS: [(ecodes.ABS_X, AbsInfo(0, 0, width - 1, 0, 0, 0)),
+                            (ecodes.ABS_Y, AbsInfo(0, 0, height - 1, 0, 0, 0))],
+            ecodes.EV_REL: [ecodes.REL_WHEEL],
+        }
+        self._pointer = UInput(capabilities, name=f"{device_name}-pointer")
+
+    def _key_code(self, name: str) -> int:
+        return self._ecodes.ecodes["KEY_" + name.upper()]
+
+    def _char_strokes(self, char: str) -> tuple:
+        """Returns (needs_shift, key_code) for a character on a US layout."""
+        if not char.isascii():
+            raise ValueError(f"UInputBackend cannot type {char!r} (not on a US layout)")
+        if char.isalpha():
+            return char.isupper(), self._key_code(char)
+        if char.isdigit():
+            return False, self._key_code(char)
+        if char in _SHIFTED:
+            return True, self._key_code(_PUNCTUATION_KEYS.get(_SHIFTED[char], _SHIFTED[char]))
+        if char not in _PUNCTUATION_KEYS:
+            raise ValueError(f"UInputBackend cannot type {char!r} (not on a US layout)")
+        return False, self._key_code(_PUNCTUATION_KEYS[char])
+
+    def _key_strokes(self, key: str) -> list:
+        names = [_XDOTOOL_KEYS.get(part.lower(), part) for part in key.split("+")]
+        try:
+            return [self._key_code(_UINPUT_KEYS.get(name, name)) for name in names]
+        except KeyError:
+            raise ValueError(f"UInputBackend has no key for '{key}'") from None
+
+    def _strokes(self, events: list) -> list:
+        """Maps a batch to (device, [(type, code, value), ...]) steps, each followed by a SYN."""
+        ecodes = self._ecodes
+        shift = self._key_code("LEFTSHIFT")
+        steps = []
+
+        def stroke(codes):
+            steps.append((self._ui, [(ecodes.EV_KEY, code, 1) for code in codes] +
+                          [(ecodes.EV_KEY, code, 0) for code in reversed(codes)]))
+
+        for event in events:
+            if event["type"] == "text":
+                for char in event["text"]:
+                    needs_shift, code = self._char_strokes(char)
+                    stroke([shift, code] if needs_shift else [code])
+            elif event["type"] == "keys":
+                for key in event["keys"]:
+                    stroke(self._key_strokes(key))
+            elif event["type"] == "click":
+                if event["x"] is not None and event["y"] is not None:
+                    steps.append((self._pointer, [(ecodes.EV_ABS, ecodes.ABS_X, int(event["x"])),
+                                                  (ecodes.EV_ABS, ecodes.ABS_Y, int(event["y"]))]))
+                button = ecodes.ecodes[self._BUTTONS.get(event["button"], "BTN_LEFT")]
+                steps.append((self._pointer, [(ecodes.EV_KEY, button, 1)]))
+                steps.append((self._pointer, [(ecodes.EV_KEY, button, 0)]))
+            elif event["type"] == "scroll":
+                # Wheel detents, ~40 scroll units each as in the xdotool backend; positive scrolls up
+                detents = max(1, abs(event["amount"]) // 40)
+                steps.append((self._pointer, [(ecodes.EV_REL, ecodes.REL_WHEEL,
+                                               detents if event["amount"] > 0 else -detents)]))
+            else:
+                raise ValueError(f"UInputBackend does not generate '{event['type']}' events")
+        return steps
+
+    def send(self, events: list, typing_interval_ms: float = 0):
+        interval_s = typing_interval_ms / 1000.0
+        # Map the whole batch first so an untypeable character fails it before any input is sent
+        for device, writes in self._strokes(events):
+            for event_type, code, value in writes:
+                device.write(event_type, code, value)
+            device.syn()
+            if interval_s:
+                time.sleep(interval_s)
+
+    def close(self):
+        self._ui.close()
+        self._pointer.close()
+
+
+INPUT_BACKENDS = {
+    "fake": FakeInputBackend,
+    "xdotool": XdotoolInputBackend,
+    "uinput": UInputBackend,
+}
+
+
+def create_input_backend(name: str = "fake", options: dict = None):
+    """Creates an input backend; `options` are passed to its constructor (e.g. uinput's screen_size)."""
+    if name not in INPUT_BACKENDS:
+        raise ValueError(f"Unknown input backend: {name}")
+    return INPUT_BACKENDS[name](**(options if options else {}))
+
+
+if __name__ == '__main__':
+    print("Testing input batching...")
+    actions = [{"action": "click", "params": {"x": 200, "y": 120}}]
+    actions += [{"action": "type_text", "params": {"text": word}} for word in ("Hello, ", "world", "!")]
+    actions += [{"action": "press_key", "params": {"key_name": "tab"}},
+                {"action": "press_key", "params": {"key_name": "enter"}}]
+    events = coalesce_actions(actions)
+    print(f"{len(actions)} actions -> {len(events)} events: {events}")
+    print(f"xdotool invocations: {XdotoolInputBackend().commands(events)}")
@@ -0,0 +1,610 @@
+# tech.md: 4.5. Communication Layer - Network Protocols (Inter-Agent Transport)
+import asyncio
+import fnmatch
+import inspect
+import itertools
+import os
+import struct
+
+from .event_bus import Subscription
+
+# Message kinds; every frame body is one list starting with its kind
+REQUEST, RESPONSE, PUBLISH, SUBSCRIBE, UNSUBSCRIBE, EVENT = range(6)
+
+# Frame header: body length and codec id. The receiver decodes with the codec named
+# in the header and answers in the same codec, so peers with and without msgpack mix.
+_HEADER = struct.Struct(">IB")
+CODEC_BINARY, CODEC_MSGPACK = 0, 1
+MAX_FRAME_BYTES = 16 * 1024 * 1024
+
+_INT64 = struct.Struct(">q")
+_FLOAT = struct.Struct(">d")
+_SIZE = struct.Struct(">I")
+
+
+class IPCError(RuntimeError):
+    """Raised for a request the remote handler failed (carries the remote error text)."""
+
+
+def _pack(obj, out: bytearray):
+    """Built-in binary codec: None, bool, int, float, str, bytes, list/tuple and dict."""
+    if obj is None:
+        out += b"\x00"
+    elif obj is True or obj is False:
+        out += b"\x02" if obj else b"\x01"
+    elif isinstance(obj, int):
+        if -2 ** 63 <= obj < 2 ** 63:
+            out += b"\x03" + _INT64.pack(obj)
+        else:
+            raw = obj.to_bytes((obj.bit_length() + 8) // 8, "big", signed=True)
+            out += b"\x04" + _SIZE.pack(len(raw)) + raw
+    elif isinstance(obj, float):
+        out += b"\x05" + _FLOAT.pack(obj)
+    elif isinstance(obj, str):
+        raw = obj.encode("utf-8")
+        out += b"\x06" + _SIZE.pack(len(raw)) + raw
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        out += b"\x07" + _SIZE.pack(len(obj)) + obj
+    elif isinstance(obj, (list, tuple)):
+        out += b"\x08" + _SIZE.pack(len(obj))
+        for item in obj:
+            _pack(item, out)
+    elif isinstance(obj, dict):
+        out += b"\x09" + _SIZE.pack(len(obj))
+        for key, value in obj.items():
+            _pack(key, out)
+            _pack(value, out)
+    else:
+        raise TypeError(f"Cannot encode {type(obj).__name__} for IPC")
+
+
+def _unpack(data: bytes, offset: int):
+    tag = data[offset]
+    offset += 1
+    if tag <= 2:
+        return (None, False, True)[tag], offset
+    if tag == 3:
+        return _INT64.unpack_from(data, offset)[0], offset + 8
+    if tag == 5:
+        return _FLOAT.unpack_from(data, offset)[0], offset + 8
+    size = _SIZE.unpack_from(data, offset)[0]
+    offset += 4
+    if tag == 6:
+        return data[offset:offset + size].decode("utf-8"), offset + size
+    if tag == 7:
+        return data[offset:offset + size], offset + size
+    if tag == 4:
+        return int.from_bytes(data[offset:offset + size], "big", signed=True), offset + size
+    if tag == 8:
+        items = []
+        for _ in range(size):
+            item, offset = _unpack(data, offset)
+            items.append(item)
+        return items, offset
+    if tag == 9:
+        mapping = {}
+        for _ in range(size):
+            key, offset = _unpack(data, offset)
+            mapping[key], offset = _unpack(data, offset)
+        return mapping, offset
+    raise ValueError(f"Unknown IPC codec tag {tag}")
+
+
+def encode_binary(obj) -> bytes:
+    out = bytearray()
+    _pack(obj, out)
+    return bytes(out)
+
+
+def decode_binary(data: bytes):
+    return _unpack(data, 0)[0]
+
+
+_codecs = {CODEC_BINARY: (encode_binary, decode_binary)}
+
+
+def _codec(codec_id: int):
+    if codec_id not in _codecs and codec_id == CODEC_MSGPACK:
+        import msgpack
+        _codecs[CODEC_MSGPACK] = (lambda obj: msgpack.packb(obj, use_bin_type=True),
+                                  lambda data: msgpack.unpackb(data, raw=False, strict_map_key=False))
+    return _codecs[codec_id]
+
+
+def resolve_codec(name: str = "auto") -> int:
+    """'msgpack', 'binary', or 'auto' (msgpack when installed, else the built-in codec)."""
+    if name == "binary":
+        return CODEC_BINARY
+    try:
+        _codec(CODEC_MSGPACK)
+        return CODEC_MSGPACK
+    except ImportError:
+        if name == "msgpack":
+            raise
+        return CODEC_BINARY
+
+
+def encode_frame(message, codec_id: int = CODEC_BINARY) -> bytes:
+    body = _codec(codec_id)[0](message)
+    return _HEADER.pack(len(body), codec_id) + body
+
+
+async def read_frame(reader: asyncio.StreamReader, max_frame_bytes: int = MAX_FRAME_BYTES):
+    """Returns (message, codec_id) for the next frame."""
+    size, codec_id = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    if size > max_frame_bytes:
+        raise ConnectionError(f"IPC frame of {size} bytes exceeds the {max_frame_bytes} byte limit")
+    return _codec(codec_id)[1](await reader.readexactly(size)), codec_id
+
+
+def parse_address(address) -> tuple:
+    """'tcp://host:port', 'unix:///path/to.sock' or (host, port) -> ("tcp", host, port) / ("unix", path)."""
+    if isinstance(address, (tuple, list)):
+        return "tcp", address[0], int(address[1])
+    if address.startswith("unix://"):
+        return "unix", address[len("unix://"):]
+    host, _, port = address.removeprefix("tcp://").rpartition(":")
+    return "tcp", host.strip("[]") or "127.0.0.1", int(port)
+
+
+def matches_filter(payload, message_filter: dict) -> bool:
+    """
+    Server-side subscription filter: every key must be present in the (dict) payload
+    and equal the given value, or be one of the values when a list is given.
+    """
+    if not message_filter:
+        return True
+    if not isinstance(payload, dict):
+        return False
+    for key, expected in message_filter.items():
+        if key not in payload:
+            return False
+        value = payload[key]
+        if value != expected and not (isinstance(expected, list) and value in expected):
+            return False
+    return True
+
+
+class _FrameWriter:
+    """
+    Coalesces the frames written during one event loop iteration into a single
+    transport write: pipelined traffic then costs one syscall per batch instead of
+    one per message, and the transport buffer holds a few large chunks.
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self._pending = []
+        self._loop = asyncio.get_running_loop()
+
+    def write(self, message, codec_id: int):
+        frame = encode_frame(message, codec_id)  # raises TypeError before anything is queued
+        if not self._pending:
+            self._loop.call_soon(self._flush)
+        self._pending.append(frame)
+
+    def _flush(self):
+        pending, self._pending = self._pending, []
+        if not self.writer.is_closing():
+            self.writer.write(b"".join(pending))
+
+    def buffered_bytes(self) -> int:
+        return self.writer.transport.get_write_buffer_size() + sum(map(len, self._pending))
+
+
+class _ServerConnection:
+    __slots__ = ("writer", "frames", "codec_id", "subscriptions")
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.frames = _FrameWriter(writer)
+        self.codec_id = CODEC_BINARY
+        self.subscriptions = {}  # subscription id -> (pattern, filter)
+
+    def write(self, message):
+        self.frames.write(message, self.codec_id)
+
+
+class IPCServer:
+    """
+    Inter-agent endpoint over TCP or a Unix domain socket with length-prefixed binary
+    frames. Requests carry an id, so a client may pipeline any number of them on one
+    connection; `handler(method, payload)` answers each (plain functions run inline on
+    the loop and must be quick; coroutine functions run concurrently and may finish
+    out of order). The server is also a topic broker: subscribers register a glob
+    pattern plus an optional field filter (see matches_filter), which is evaluated
+    here so non-matching messages never cross the socket. Events for a subscriber
+    whose socket buffer exceeds `max_buffered_bytes` are dropped (counted in stats).
+    """
+
+    def __init__(self, address="tcp://127.0.0.1:0", handler=None, max_frame_bytes: int = MAX_FRAME_BYTES,
+                 max_buffered_bytes: int = 8 * 1024 * 1024):
+        self.address = address
+        self.handler = handler
+        self.max_frame_bytes = max_frame_bytes
+        self.max_buffered_bytes = max_buffered_bytes
+        self.stats = {"requests": 0, "published": 0, "events": 0, "dropped": 0}
+        self._connections = set()
+        self._routes = {}  # topic -> [(connection, [(subscription id, filter)])]
+        self._server = None
+        self._loop = None
+
+    async def start_async(self):
+        self._loop = asyncio.get_running_loop()
+        parsed = parse_address(self.address)
+        if parsed[0] == "unix":
+            if os.path.exists(parsed[1]):
+                os.unlink(parsed[1])  # left behind by a previous run
+            self._server = await asyncio.start_unix_server(self._serve, parsed[1])
+        else:
+            self._server = await asyncio.start_server(self._serve, parsed[1], parsed[2])
+            host, port = self._server.sockets[0].getsockname()[:2]
+            self.address = f"tcp://{host}:{port}"  # the actual port when 0 was requested
+        print(f"Communication: IPC server listening on {self.address}")
+        return self
+
+    def start(self):
+        """Starts serving on the shared runtime loop; returns the server."""
+        from .async_runtime import run_sync
+        return run_sync(self.start_async())
+
+    async def _serve(self, reader, writer):
+        connection = _ServerConnection(writer)
+        self._connections.add(connection)
+        try:
+            while True:
+                message, connection.codec_id = await read_frame(reader, self.max_frame_bytes)
+                kind = message[0]
+                if kind == REQUEST:
+                    self._handle_request(connection, message[1], message[2], message[3])
+                elif kind == PUBLISH:
+                    self.publish(message[1], message[2])
+                elif kind == SUBSCRIBE:
+                    _, request_id, subscription_id, pattern, message_filter = message
+                    connection.subscriptions[subscription_id] = (pattern, message_filter)
+                    self._routes = {}
+                    connection.write([RESPONSE, request_id, True, None])
+                elif kind == UNSUBSCRIBE:
+                    connection.subscriptions.pop(message[2], None)
+                    self._routes = {}
+                    if message[1]:
+                        connection.write([RESPONSE, message[1], True, None])
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass  # peer went away
+        finally:
+            self._connections.discard(connection)
+            if connection.subscriptions:
+                self._routes = {}
+            writer.close()
+
+    def _handle_request(self, connection: _ServerConnection, request_id: int, method: str, payload):
+        self.stats["requests"] += 1
+        try:
+            if self.handler is None:
+                raise IPCError("No handler registered on this IPC server")
+            result = self.handler(method, payload)
+            if not inspect.isawaitable(result):
+                if request_id:
+                    # Encoding happens here, so a result the codec cannot encode fails this request only
+                    connection.write([RESPONSE, request_id, True, result])
+                return
+        except Exception as e:
+            if request_id:
+                connection.write([RESPONSE, request_id, False, f"{type(e).__name__}: {e}"])
+            return
+        asyncio.ensure_future(self._respond_later(connection, request_id, result))
+
+    @staticmethod
+    async def _respond_later(connection: _ServerConnection, request_id: int, awaitable):
+        try:
+            result = await awaitable
+            if request_id and not connection.writer.is_closing():
+                connection.write([RESPONSE, request_id, True, result])
+        except Exception as e:
+            if request_id and not connection.writer.is_closing():
+                connection.write([RESPONSE, request_id, False, f"{type(e).__name__}: {e}"])
+        if request_id and not connection.writer.is_closing():
+            await connection.writer.drain()
+
+    def _route(self, topic: str) -> list:
+        matches = self._routes.get(topic)
+        if matches is None:
+            matches = []
+            for connection in self._connections:
+                subscribed = [(subscription_id, message_filter)
+                              for subscription_id, (pattern, message_filter) in connection.subscriptions.items()
+                              if pattern == topic or fnmatch.fnmatchcase(topic, pattern)]
+                if subscribed:
+                    matches.append((connection, subscribed))
+            self._routes[topic] = matches
+        return matches
+
+    def publish(self, topic: str, payload):
+        """Sends a message to every matching subscriber; safe to call from any thread."""
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if not on_loop:
+            self._loop.call_soon_threadsafe(self.publish, topic, payload)
+            return
+        self.stats["published"] += 1
+        for connection, subscribed in self._route(topic):
+            subscription_ids = [subscription_id for subscription_id, message_filter in subscribed
+                                if matches_filter(payload, message_filter)]
+            if not subscription_ids:
+                continue
+            if connection.writer.is_closing() or connection.frames.buffered_bytes() > self.max_buffered_bytes:
+                self.stats["dropped"] += 1  # slow subscriber: never let it grow our memory
+                continue
+            try:
+                connection.write([EVENT, topic, payload, subscription_ids])
+            except TypeError as e:
+                # The subscriber's codec cannot carry this payload; drop the event, keep the connection
+                print(f"Communication: Dropped event on '{topic}': {e}")
+                self.stats["dropped"] += 1
+                continue
+            self.stats["events"] += 1
+
+    async def close_async(self):
+        if self._server is not None:
+            self._server.close()
+            for connection in list(self._connections):
+                connection.writer.close()
+            await self._server.wait_closed()
+            self._server = None
+            parsed = parse_address(self.address)
+            if parsed[0] == "unix" and os.path.exists(parsed[1]):
+                os.unlink(parsed[1])
+
+    def close(self):
+        from .async_runtime import run_sync
+        if self._loop is not None and not self._loop.is_closed():
+            run_sync(self.close_async())
+
+
+class RemoteSubscription(Subscription):
+    """
+    A subscription held on an IPC server. Events arrive already filtered and are
+    buffered locally exactly like an EventBus subscription (pull, async or sync
+    delivery); the "block" overflow policy is not available because it would stall
+    the connection. close() unsubscribes on the server.
+    """
+
+    def __init__(self, connection, subscription_id: int, pattern: str, message_filter: dict = None, **options):
+        if options.get("overflow") == "block":
+            raise ValueError("Remote subscriptions cannot use the 'block' overflow policy")
+        options.setdefault("delivery", "async" if options.get("callback") else "pull")
+        super().__init__(connection, pattern, **options)
+        self.subscription_id = subscription_id
+        self.filter = message_filter
+
+    def _disconnect(self):
+        """Marks the subscription closed after the connection dropped (buffered events stay readable)."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+class _Connection:
+    """One pipelined client connection: requests are matched to responses by id."""
+
+    def __init__(self, reader, writer, codec_id: int, max_frame_bytes: int):
+        self.reader = reader
+        self.writer = writer
+        self.frames = _FrameWriter(writer)
+        self.codec_id = codec_id
+        self.max_frame_bytes = max_frame_bytes
+        self.loop = asyncio.get_running_loop()
+        self.pending = {}  # request id -> future
+        self.subscriptions = {}  # subscription id -> RemoteSubscription
+        self.closed = False
+        self._ids = itertools.count(1)
+        self._reader_task = asyncio.ensure_future(self._read_loop())
+
+    async def _read_loop(self):
+        error = ConnectionResetError("IPC connection closed")
+        try:
+            while True:
+                message, _ = await read_frame(self.reader, self.max_frame_bytes)
+                if message[0] == RESPONSE:
+                    future = self.pending.pop(message[1], None)
+                    if future is not None and not future.done():
+                        if message[2]:
+                            future.set_result(message[3])
+                        else:
+                            future.set_exception(IPCError(message[3]))
+                elif message[0] == EVENT:
+                    _, topic, payload, subscription_ids = message
+                    for subscription_id in subscription_ids:
+                        subscription = self.subscriptions.get(subscription_id)
+                        if subscription is not None:
+                            subscription.put(topic, payload)
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            error = ConnectionResetError(f"IPC connection lost: {e}")
+        finally:
+            self.closed = True
+            self.writer.close()
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self.pending.clear()
+            for subscription in self.subscriptions.values():
+                subscription._disconnect()
+
+    def write(self, message):
+        if self.closed:
+            raise ConnectionResetError("IPC connection closed")
+        self.frames.write(message, self.codec_id)
+
+    async def request(self, method: str, payload, timeout_s: float):
+        request_id = next(self._ids)
+        future = self.loop.create_future()
+        self.pending[request_id] = future
+        try:
+            self.write([REQUEST, request_id, method, payload])
+            await self.writer.drain()
+            async with asyncio.timeout(timeout_s):
+                return await future
+        finally:
+            self.pending.pop(request_id, None)
+
+    async def subscribe(self, pattern: str, message_filter: dict, timeout_s: float, **options) -> RemoteSubscription:
+        subscription = RemoteSubscription(self, next(self._ids), pattern, message_filter, **options)
+        self.subscriptions[subscription.subscription_id] = subscription
+        request_id = next(self._ids)
+        future = self.loop.create_future()
+        self.pending[request_id] = future
+        try:
+            self.write([SUBSCRIBE, request_id, subscription.subscription_id, pattern, message_filter])
+            await self.writer.drain()
+            async with asyncio.timeout(timeout_s):
+                await future
+        except BaseException:
+            self.subscriptions.pop(subscription.subscription_id, None)
+            subscription._disconnect()
+            raise
+        finally:
+            self.pending.pop(request_id, None)
+        return subscription
+
+    def _unsubscribe(self, subscription: RemoteSubscription):
+        # Called by RemoteSubscription.close(), possibly from another thread
+        if self.subscriptions.pop(subscription.subscription_id, None) is not None and not self.closed:
+            self.loop.call_soon_threadsafe(self._send_unsubscribe, subscription.subscription_id)
+
+    def _send_unsubscribe(self, subscription_id: int):
+        if not self.closed:
+            self.write([UNSUBSCRIBE, 0, subscription_id])
+
+    def close(self):
+        self.closed = True
+        self.writer.close()
+
+
+class IPCConnectionPool:
+    """
+    Client side of the inter-agent transport. Keeps persistent connections per peer
+    (per event loop), reused by every call; requests are pipelined, so one connection
+    carries many concurrent requests and `connections_per_peer` only adds sockets when
+    all existing ones are busy. A dropped connection is replaced on the next call.
+    """
+
+    def __init__(self, connections_per_peer: int = 1, timeout_s: float = 10.0, codec: str = "auto",
+                 max_frame_bytes: int = MAX_FRAME_BYTES):
+        self.connections_per_peer = connections_per_peer
+        self.timeout_s = timeout_s
+        self.codec_id = resolve_codec(codec)
+        self.max_frame_bytes = max_frame_bytes
+        self.connections_opened = 0
+        self._connections = {}  # (loop, address) -> [_Connection]
+        self._connecting = {}  # (loop, address) -> asyncio.Lock
+
+    async def _connection(self, address) -> _Connection:
+        loop = asyncio.get_running_loop()
+        key = (loop, address if isinstance(address, str) else tuple(address))
+        connections = self._connections.setdefault(key, [])
+        connections[:] = [connection for connection in connections if not connection.closed]
+        if connections:
+            least_busy = min(connections, key=lambda connection: len(connection.pending))
+            if not least_busy.pending or len(connections) >= self.connections_per_peer:
+                return least_busy
+        async with self._connecting.setdefault(key, asyncio.Lock()):
+            if len(connections) >= self.connections_per_peer:
+                return min(connections, key=lambda connection: len(connection.pending))
+            parsed = parse_address(address)
+            if parsed[0] == "unix":
+                reader, writer = await asyncio.open_unix_connection(parsed[1])
+            else:
+                reader, writer = await asyncio.open_connection(parsed[1], parsed[2])
+            connection = _Connection(reader, writer, self.codec_id, self.max_frame_bytes)
+            self.connections_opened += 1
+            connections.append(connection)
+            return connection
+
+    async def request(self, address, method: str, payload=None, timeout_s: float = None):
+        """Sends a request and returns the handler's result (IPCError if it failed remotely)."""
+        connection = await self._connection(address)
+        return await connection.request(method, payload, timeout_s if timeout_s is not None else self.timeout_s)
+
+    async def send(self, address, method: str, payload=None):
+        """Fire-and-forget request: no response is sent or awaited."""
+        connection = await self._connection(address)
+        connection.write([REQUEST, 0, method, payload])
+        await connection.writer.drain()
+
+    async def publish(self, address, topic: str, payload):
+        """Publishes a message on the peer's broker (delivered to its matching subscribers)."""
+        connection = await self._connection(address)
+        connection.write([PUBLISH, topic, payload])
+        await connection.writer.drain()
+
+    async def subscribe(self, address, pattern: str, message_filter: dict = None, callback=None,
+                        timeout_s: float = None, **options) -> RemoteSubscription:
+        """Subscribes to topics on the peer's broker; see RemoteSubscription."""
+        connection = await self._connection(address)
+        return await connection.subscribe(pattern, message_filter,
+                                          timeout_s if timeout_s is not None else self.timeout_s,
+                                          callback=callback, **options)
+
+    def close(self):
+        connections, self._connections = self._connections, {}
+        for (loop, _), peer_connections in connections.items():
+            for connection in peer_connections:
+                if not loop.is_closed():
+                    loop.call_soon_threadsafe(connection.close)
+
+
+if __name__ == '__main__':
+    import tempfile
+    import time
+
+    from .async_runtime import run_sync
+
+    def handler(method, payload):
+        return {"echo": payload} if method == "echo" else payload
+
+    async def benchmark(pool, address, count):
+        # Sequential round trips (latency), then everything in flight at once (throughput)
+        started = time.perf_counter()
+        for i in range(1000):
+            await pool.request(address, "echo", {"i": i})
+        latency_us = (time.perf_counter() - started) / 1000 * 1e6
+        started = time.perf_counter()
+        results = await asyncio.gather(*(pool.request(address, "echo", {"i": i}) for i in range(count)))
+        rate = count / (time.perf_counter() - started)
+        assert [r["echo"]["i"] for r in results] == list(range(count))
+        return latency_us, rate
+
+    async def pubsub(pool, server):
+        alerts = await pool.subscribe(server.address, "agents.*.status", {"level": ["warning", "error"]})
+        for i in range(1000):
+            await pool.publish(server.address, f"agents.{i % 4}.status",
+                               {"level": ("info", "warning", "error", "info")[i % 4], "i": i})
+        received = []
+        while len(received) < 500:
+            item = await alerts.get_async(timeout_s=1)
+            if item is None:
+                break
+            received.append(item)
+        alerts.close()
+        return received
+
+    print("Testing IPC transport (loopback)...")
+    print(f"Codec: {'msgpack' if resolve_codec() == CODEC_MSGPACK else 'built-in binary'}")
+    sample = {"id": 7, "ok": True, "score": 0.5, "tags": ["a", "b"], "raw": b"\x00\x01", "big": 2 ** 70, "none": None}
+    print(f"Binary codec round trip: {decode_binary(encode_binary(sample)) == sample}")
+
+    socket_path = os.path.join(tempfile.gettempdir(), f"horus-ipc-{os.getpid()}.sock")
+    for address in ("tcp://127.0.0.1:0", f"unix://{socket_path}"):
+        server = IPCServer(address, handler).start()
+        pool = IPCConnectionPool()
+        latency_us, rate = run_sync(benchmark(pool, server.address, 20000))
+        print(f"{server.address}: {latency_us:.0f} us per sequential round trip, "
+              f"{rate:,.0f} pipelined requests/s over {pool.connections_opened} connection(s)")
+        received = run_sync(pubsub(pool, server))
+        print(f"Filtered subscription got {len(received)} of 1000 messages "
+              f"(levels {sorted({m['level'] for _, m in received})}), server stats {server.stats}")
+        pool.close()
+        server.close()
@@ -0,0 +1,87 @@
+# tech.md: 5. Core Agent Class (Conceptual) - Startup
+import threading
+import time
+
+_locks_guard = threading.Lock()
+
+
+def _instance_lock(instance, name: str) -> threading.RLock:
+    key = f"_lazy_lock_{name}"
+    lock = instance.__dict__.get(key)
+    if lock is None:
+        with _locks_guard:
+            lock = instance.__dict__.setdefault(key, threading.RLock())
+    return lock
+
+
+class lazy_property:
+    """
+    Builds an attribute on first access and caches it on the instance. Concurrent
+    first accesses build it exactly once; afterwards the cached value is read like a
+    plain attribute (no lock, no descriptor call). Assigning the attribute replaces it.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.name = factory.__name__
+        self.__doc__ = factory.__doc__
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        with _instance_lock(instance, self.name):
+            if self.name not in instance.__dict__:
+                instance.__dict__[self.name] = self.factory(instance)
+            return instance.__dict__[self.name]
+
+
+def is_initialized(instance, name: str) -> bool:
+    """True if the lazy attribute `name` has been built (never triggers initialization)."""
+    return name in instance.__dict__
+
+
+def lazy_attributes(cls) -> list:
+    """Names of all lazy_property attributes of a class, in definition order."""
+    names = []
+    for klass in reversed(cls.__mro__):
+        for name, value in vars(klass).items():
+            if isinstance(value, lazy_property) and name not in names:
+                names.append(name)
+    return names
+
+
+def warm_up(instance, names: list = None) -> dict:
+    """
+    Builds the given (default: all) lazy attributes of an instance now, e.g. before
+    the first task, and returns the build time of each in milliseconds.
+    """
+    timings = {}
+    for name in names if names is not None else lazy_attributes(type(instance)):
+        started = time.monotonic()
+        value = getattr(instance, name)
+        if hasattr(value, "warm_up") and not isinstance(value, type):
+            value.warm_up()
+        timings[name] = (time.monotonic() - started) * 1000
+    return timings
+
+
+if __name__ == '__main__':
+    class Example:
+        @lazy_property
+        def model(self):
+            time.sleep(0.1)  # stands in for loading a heavy library
+            return "loaded"
+
+    print("Testing lazy_property...")
+    example = Example()
+    print(f"Initialized before use: {is_initialized(example, 'model')}")
+    threads = [threading.Thread(target=lambda: example.model) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(f"Initialized after 8 concurrent first uses: {is_initialized(example, 'model')}, value {example.model!r}")
+    print(f"Warm-up timings (ms): {warm_up(Example())}")
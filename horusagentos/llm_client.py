@@ -0,0 +1,381 @@
+# tech.md: 4.2. Decision Layer - LLM Integration
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from .http_pool import (AsyncHTTPConnectionPool, HTTPConnectionPool, HTTPStreamError, get_shared_async_pool,
+                        get_shared_pool)
+from .mock_llm_server import mock_completion, mock_reply_text
+# Potential future imports: openai, transformers
+
+LLM_PROVIDERS = ("openai", "mock")
+
+
+class LLMError(RuntimeError):
+    """Raised when the provider returns an error or an unusable response."""
+
+
+def prompt_key(payload: dict) -> str:
+    """Deterministic hash of a request payload (model, messages and sampling parameters)."""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    On-disk response cache, one JSON file per prompt hash, evicting the least recently
+    used entries beyond `max_entries`. An in-memory index keeps recency.
+    """
+
+    def __init__(self, directory: str, max_entries: int = 10000):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._index = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        entries = [name[:-5] for name in os.listdir(directory) if name.endswith(".json")]
+        entries.sort(key=lambda key: os.path.getmtime(self._path(key)))
+        for key in entries:
+            self._index[key] = None
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str):
+        with self._lock:
+            if key not in self._index:
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+        try:
+            with open(self._path(key)) as f:
+                response = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self._index.pop(key, None)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return response
+
+    def put(self, key: str, response: dict):
+        tmp_path = f"{self._path(key)}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(response, f)
+        os.replace(tmp_path, self._path(key))
+        with self._lock:
+            self._index[key] = None
+            self._index.move_to_end(key)
+            evicted = []
+            while len(self._index) > self.max_entries:
+                evicted.append(self._index.popitem(last=False)[0])
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+
+
+class _MicroBatcher:
+    """
+    Collects concurrent requests for up to `window_ms` (or `max_batch_size` requests)
+    and sends them to the provider's batch endpoint in one HTTP call.
+    """
+
+    def __init__(self, send_batch, window_ms: float = 10, max_batch_size: int = 16):
+        self.send_batch = send_batch
+        self.window_s = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self._pending = []
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="horus-llm-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, payload: dict) -> Future:
+        future = Future()
+        with self._condition:
+            self._pending.append((payload, future))
+            self._condition.notify()
+        return future
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                deadline = time.monotonic() + self.window_s
+                while len(self._pending) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = self._pending[:self.max_batch_size]
+                del self._pending[:self.max_batch_size]
+            try:
+                responses = self.send_batch([payload for payload, _ in batch])
+                for (_, future), response in zip(batch, responses):
+                    future.set_result(response)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+
+class LLMClient:
+    """
+    Chat-completion client driven by `llm_provider_config`:
+
+    - provider: "openai" (or any OpenAI-compatible endpoint via `base_url`) or "mock"
+      (in-process, no network); any other name raises ValueError.
+    - Requests share a keep-alive HTTPConnectionPool instead of reconnecting per call.
+    - Concurrent identical requests are coalesced (single-flight).
+    - Deterministic requests (temperature 0) are served from an on-disk prompt-hash
+      cache when `cache_dir` is set (`cache_max_entries` bounds it).
+    - With `batch_endpoint` set (e.g. "/batch"), concurrent requests are micro-batched
+      for `batch_window_ms` / `max_batch_size`.
+    - `complete_async` / `stream_async` wait on an AsyncHTTPConnectionPool, so one
+      thread can have many requests in flight; single-flight spans both APIs.
+    """
+
+    def __init__(self, llm_provider_config: dict = None, pool: HTTPConnectionPool = None,
+                 async_pool: AsyncHTTPConnectionPool = None):
+        self.config = llm_provider_config if llm_provider_config else {}
+        self.provider = self.config.get('provider', 'mock')
+        if self.provider not in LLM_PROVIDERS:
+            # A typo must not silently turn real planning into mock plans
+            raise ValueError(f"Unknown LLM provider '{self.provider}'. Available: {LLM_PROVIDERS}")
+        self.model = self.config.get('model', 'mock')
+        self.base_url = self.config.get('base_url', 'https://api.openai.com/v1').rstrip('/')
+        self.timeout_s = self.config.get('timeout_s', 60.0)
+        self.pool = pool if pool is not None else get_shared_pool()
+        self.async_pool = async_pool if async_pool is not None else get_shared_async_pool()
+        cache_dir = self.config.get('cache_dir')
+        self.cache = LLMResponseCache(cache_dir, self.config.get('cache_max_entries', 10000)) if cache_dir else None
+        self.calls = 0  # requests actually sent to the provider
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self._batcher = None
+        if self.provider == 'openai' and self.config.get('batch_endpoint'):
+            self._batcher = _MicroBatcher(self._send_batch, self.config.get('batch_window_ms', 10),
+                                          self.config.get('max_batch_size', 16))
+
+    def __repr__(self):
+        return f"LLMClient({self.provider}:{self.model})"
+
+    def _headers(self) -> dict:
+        headers = {}
+        if self.config.get('api_key'):
+            headers["Authorization"] = f"Bearer {self.config['api_key']}"
+        return headers
+
+    def build_payload(self, prompt, **params) -> dict:
+        messages = [{"role": "user", "content": prompt}] if isinstance(prompt, str) else list(prompt)
+        payload = {"model": self.model, "messages": messages, "temperature": 0}
+        payload.update(params)
+        return payload
+
+    def complete(self, prompt, **params) -> dict:
+        """
+        Sends a prompt (string or message list) and returns
+        {"text", "response", "cached", "coalesced", "latency_ms"}.
+        """
+        started = time.monotonic()
+        payload, key, cacheable, cached = self._prepare(prompt, params)
+        if cached is not None:
+            return self._result(cached, started, cached=True)
+        future, leader = self._join_inflight(key)
+        if not leader:
+            return self._result(future.result(timeout=self.timeout_s), started, coalesced=True)
+        try:
+            response = self._dispatch(payload)
+        except Exception as e:
+            self._settle_inflight(key, future, error=e)
+            raise
+        self._settle_inflight(key, future, response, cacheable)
+        return self._result(response, started)
+
+    async def complete_async(self, prompt, **params) -> dict:
+        """Like complete(), without blocking the event loop while the provider answers."""
+        started = time.monotonic()
+        payload, key, cacheable, cached = self._prepare(prompt, params)
+        if cached is not None:
+            return self._result(cached, started, cached=True)
+        future, leader = self._join_inflight(key)
+        if not leader:
+            return self._result(await asyncio.wait_for(asyncio.wrap_future(future), self.timeout_s),
+                                started, coalesced=True)
+        try:
+            response = await self._dispatch_async(payload)
+        except BaseException as e:
+            self._settle_inflight(key, future, error=e)
+            raise
+        self._settle_inflight(key, future, response, cacheable)
+        return self._result(response, started)
+
+    def _prepare(self, prompt, params: dict):
+        payload = self.build_payload(prompt, **params)
+        key = prompt_key(payload)
+        cacheable = self.cache is not None and payload.get("temperature", 0) == 0 and not payload.get("stream")
+        return payload, key, cacheable, self.cache.get(key) if cacheable else None
+
+    def _join_inflight(self, key: str):
+        """Returns (future, leader): the leader sends the request, followers wait on its future."""
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future, False
+            future = self._inflight[key] = Future()
+            return future, True
+
+    def _settle_inflight(self, key: str, future: Future, response: dict = None, cacheable: bool = False,
+                         error: BaseException = None):
+        try:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                if cacheable:
+                    self.cache.put(key, response)
+                future.set_result(response)
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+    def stream(self, prompt, **params):
+        """
+        Yields the reply text in pieces as the provider streams it (server-sent events).
+        Streamed replies bypass the response cache and single-flight.
+        """
+        payload = self._stream_payload(prompt, params)
+        if self.provider == 'mock':
+            yield from self._mock_chunks(payload)
+            return
+        try:
+            for line in self.pool.stream_lines("POST", f"{self.base_url}/chat/completions", payload,
+                                               self._headers(), self.timeout_s):
+                delta = self._sse_delta(line)
+                if delta:
+                    yield delta
+        except HTTPStreamError as e:
+            raise LLMError(f"LLM stream failed with HTTP {e.response.status}: {e.response.body[:200]!r}")
+
+    async def stream_async(self, prompt, **params):
+        """Async generator counterpart of stream()."""
+        payload = self._stream_payload(prompt, params)
+        if self.provider == 'mock':
+            for chunk in self._mock_chunks(payload):
+                yield chunk
+            return
+        try:
+            async for line in self.async_pool.stream_lines("POST", f"{self.base_url}/chat/completions", payload,
+                                                           self._headers(), self.timeout_s):
+                delta = self._sse_delta(line)
+                if delta:
+                    yield delta
+        except HTTPStreamError as e:
+            raise LLMError(f"LLM stream failed with HTTP {e.response.status}: {e.response.body[:200]!r}")
+
+    def _stream_payload(self, prompt, params: dict) -> dict:
+        payload = self.build_payload(prompt, **params)
+        payload["stream"] = True
+        self.calls += 1
+        return payload
+
+    @staticmethod
+    def _mock_chunks(payload: dict):
+        text = mock_reply_text(payload)
+        return [text[start:start + 16] for start in range(0, len(text), 16)]
+
+    @staticmethod
+    def _sse_delta(line: bytes) -> str:
+        """Content of one server-sent event line, or "" for comments, keep-alives and [DONE]."""
+        if not line.startswith(b"data:"):
+            return ""
+        data = line[5:].strip()
+        if data == b"[DONE]":
+            # Callers keep reading to the end of the body so the connection can be reused
+            return ""
+        return json.loads(data)["choices"][0].get("delta", {}).get("content") or ""
+
+    def complete_many(self, prompts: list, **params) -> list:
+        """Completes several prompts concurrently (micro-batched when the provider supports it)."""
+        results = [None] * len(prompts)
+        errors = []
+
+        def run(index, prompt):
+            try:
+                results[index] = self.complete(prompt, **params)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(i, p)) for i, p in enumerate(prompts)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        return results
+
+    def _dispatch(self, payload: dict) -> dict:
+        self.calls += 1
+        if self.provider == 'mock':
+            return mock_completion(payload)
+        if self._batcher is not None:
+            return self._batcher.submit(payload).result(timeout=self.timeout_s)
+        return self._check(self.pool.request("POST", f"{self.base_url}/chat/completions", payload,
+                                             self._headers(), self.timeout_s))
+
+    async def _dispatch_async(self, payload: dict) -> dict:
+        self.calls += 1
+        if self.provider == 'mock':
+            return mock_completion(payload)
+        if self._batcher is not None:
+            return await asyncio.wait_for(asyncio.wrap_future(self._batcher.submit(payload)), self.timeout_s)
+        return self._check(await self.async_pool.request("POST", f"{self.base_url}/chat/completions", payload,
+                                                         self._headers(), self.timeout_s))
+
+    def _send_batch(self, payloads: list) -> list:
+        response = self._check(self.pool.request(
+            "POST", f"{self.base_url}{self.config['batch_endpoint']}", {"requests": payloads},
+            self._headers(), self.timeout_s))
+        return response["responses"]
+
+    @staticmethod
+    def _check(response) -> dict:
+        if not response.ok:
+            raise LLMError(f"LLM request failed with HTTP {response.status}: {response.body[:200]!r}")
+        return response.json()
+
+    @staticmethod
+    def _result(response: dict, started: float, cached: bool = False, coalesced: bool = False) -> dict:
+        try:
+            text = response["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            raise LLMError(f"Unexpected LLM response: {str(response)[:200]}")
+        return {"text": text, "response": response, "cached": cached, "coalesced": coalesced,
+                "latency_ms": (time.monotonic() - started) * 1000}
+
+
+if __name__ == '__main__':
+    import tempfile
+
+    from .mock_llm_server import MockLLMServer
+
+    print("Testing LLMClient against the mock server...")
+    server = MockLLMServer(latency_ms=20).start()
+    with tempfile.TemporaryDirectory() as cache_dir:
+        client = LLMClient({"provider": "openai", "model": "mock", "base_url": server.base_url,
+                            "cache_dir": cache_dir, "batch_endpoint": "/batch"})
+        results = client.complete_many([f"step {i % 4}" for i in range(12)])
+        print(f"12 prompts (4 distinct): provider calls {client.calls}, server stats {server.stats}")
+        print(f"Coalesced: {sum(r['coalesced'] for r in results)}")
+        again = client.complete("step 1")
+        print(f"Repeat prompt cached: {again['cached']}, text: {again['text']!r}")
+    server.stop()
@@ -1,7 +1,22 @@
 # tech.md: 4.4. Memory Layer
+import asyncio
+import os
 import time
 import json  # For serializing complex data if stored as text
-# Potential future imports: faiss, sentence_transformers, sqlite3, psycopg2
+import threading
+
+import numpy as np
+
+from .embedding_store import EmbeddingMatrix
+from .embeddings import EmbeddingCache, HashingEmbeddingModel
+from .experience_store import SQLiteExperienceStore
+from .lazy import is_initialized, lazy_property, warm_up
+from .memory_pruning import MemoryPruner
+from .vector_index import create_vector_index
+# Potential future imports: sentence_transformers, psycopg2
+
+# File-based stores default to the user's data directory, not the working directory
+DEFAULT_DB_PATH = os.path.join(os.path.expanduser("~"), ".horusagentos", "horus_memory.db")
 
 
 class MemoryModule:
@@ -9,68 +24,149 @@ class MemoryModule:
         self.config = config if config else {}
         # e.g., sqlite, faiss, weaviate
         self.db_type = self.config.get('db_type', 'mock')
-        self.db_path = self.config.get(
-            'path', './horus_memory.db')  # For file-based DBs
+        self.db_path = self.config.get('db_path', self.config.get(
+            'path', DEFAULT_DB_PATH))  # For file-based DBs
+        self.embedding_dim = self.config.get('embedding_dim', 256)
+        # Minimum cosine similarity for an experience to count as relevant
+        self.min_similarity = self.config.get('min_similarity', 0.1)
+        # Optional .npy file holding the embedding matrix, memory-mapped on startup (sqlite only)
+        self.embedding_matrix_path = self.config.get('embedding_matrix_path')
 
-        self.vector_db = self._initialize_vector_db()
-        self.embedding_model = self._initialize_embedding_model()
-        self.structured_db = self._initialize_structured_db()
+        # Guards the vector index against concurrent pruning/compaction
+        self.lock = threading.RLock()
+        # The vector index, embedding model and cache, store and pruner are built on first use
+        self._experiences_by_id = {}
+        self._last_experience_id = 0
         print(
             f"MemoryModule initialized (type: {self.db_type}, path: {self.db_path})")
 
+    @lazy_property
+    def vector_db(self):
+        index = self._initialize_vector_db()
+        if self.db_type == 'sqlite':
+            self._load_persisted_embeddings(index)
+        if self.config.get('pruning', {}).get('background'):
+            self.pruner.start()
+        return index
+
+    @lazy_property
+    def embedding_model(self):
+        return self._initialize_embedding_model()
+
+    @lazy_property
+    def embedding_cache(self):
+        return EmbeddingCache(
+            max_entries=self.config.get('embedding_cache_size', 10000),
+            path=self.config.get('embedding_cache_path'),
+            namespace=f"{self.config.get('embedding_model_name', 'hashing')}:{self.embedding_dim}")
+
+    @lazy_property
+    def structured_db(self):
+        return self._initialize_structured_db()
+
+    @lazy_property
+    def pruner(self):
+        return MemoryPruner(self, self.config.get('pruning'))
+
+    def warm_up(self) -> dict:
+        """Loads the embedding model, vector index and store now instead of on first use."""
+        return warm_up(self)
+
     def _initialize_vector_db(self):
+        # 'flat' (exact NumPy scan) or 'ivf' (approximate inverted file), see vector_index.py
+        vector_db_config = dict(self.config.get('vector_db_config', {}))
+        # 'float32', 'float16' or 'int8' rows in the shared embedding matrix
+        vector_db_config.setdefault(
+            'dtype', self.config.get('embedding_dtype', 'float32'))
+        storage = None
+        if self.db_type == 'sqlite' and self.embedding_matrix_path and EmbeddingMatrix.exists(self.embedding_matrix_path):
+            storage = EmbeddingMatrix.load(
+                self.embedding_matrix_path, mmap=self.config.get('embedding_matrix_mmap', True))
+        index = create_vector_index(
+            self.embedding_dim, vector_db_config, storage)
         print(
-            f"Mock: Vector DB initialized ({self.config.get('vector_db_config', 'default vector config')})")
-        # Placeholder for FAISS, Annoy, Pinecone, Weaviate, etc.
-        # Example: import faiss; self.index = faiss.IndexFlatL2(embedding_dim); return self.index
-        # Mock in-memory vector store
-        return {"data": [], "index_type": "mock_flat_L2"}
+            f"Vector DB initialized (index: {index.index_type}, dim: {self.embedding_dim})")
+        # Placeholder for FAISS, Annoy, Pinecone, Weaviate, etc. behind the same add/search interface
+        return index
 
     def _initialize_embedding_model(self):
         print(
-            f"Mock: Embedding model initialized ({self.config.get('embedding_model_name', 'default_sbert')})")
+            f"Mock: Embedding model initialized ({self.config.get('embedding_model_name', 'hashing')})")
         # Placeholder for Sentence Transformers or other embedding models
         # Example: from sentence_transformers import SentenceTransformer; return SentenceTransformer('all-MiniLM-L6-v2')
-        return "MockEmbeddingModel"
+        return HashingEmbeddingModel(dim=self.embedding_dim)
 
-    def _get_embedding(self, text: str) -> list:
-        # Mock embedding generation
-        print(f"Memory: Generating mock embedding for text: '{text[:30]}...'")
-        # In a real scenario: return self.embedding_model.encode(text).tolist()
-        # Simple mock
-        return [hash(word) * 0.00001 for word in text.split()[:5]]
+    def _get_embedding(self, text: str):
+        """Returns the float32 embedding vector for a text."""
+        return self.encode_many([text])[0]
+
+    def encode_many(self, texts: list) -> np.ndarray:
+        """
+        Embeds a batch of texts, serving repeats from the embedding cache and sending
+        all cache misses to the embedding model in a single call.
+        """
+        vectors = [None] * len(texts)
+        pending = {}  # cache key -> (text, positions), deduplicates repeated texts
+        for position, text in enumerate(texts):
+            key = self.embedding_cache.key(text)
+            if key in pending:
+                pending[key][1].append(position)
+                continue
+            cached = self.embedding_cache.get(key)
+            if cached is not None:
+                vectors[position] = cached
+            else:
+                pending[key] = (text, [position])
+
+        if pending:
+            encoded = self.embedding_model.encode(
+                [text for text, _ in pending.values()])
+            for (key, (_, positions)), vector in zip(pending.items(), encoded):
+                self.embedding_cache.put(key, vector)
+                for position in positions:
+                    vectors[position] = vector
+
+        if not vectors:
+            return np.empty((0, self.embedding_dim), dtype=np.float32)
+        return np.stack(vectors)
 
     def _initialize_structured_db(self):
+        if self.db_type == 'sqlite':
+            # Write-behind store: records are queued and committed in batched WAL transactions
+            store = SQLiteExperienceStore(
+                self.db_path, self.config.get('sqlite_config'))
+            print(f"Structured DB initialized (sqlite at {self.db_path})")
+            return store
         print(
             f"Mock: Structured DB initialized ({self.db_type} at {self.db_path})")
-        # Placeholder for SQLite or PostgreSQL connection
-        # Example: import sqlite3; conn = sqlite3.connect(self.db_path); self._create_tables(conn); return conn
+        # Placeholder for PostgreSQL connection
         # Mock in-memory structured store
         return {"experiences": [], "errors": []}
 
-    def _create_tables(self, conn):  # Example for SQLite
-        cursor = conn.cursor()
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS experiences (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp REAL,
-            instruction TEXT,
-            plan TEXT,       -- JSON string
-            results TEXT,    -- JSON string
-            reflections TEXT,
-            instruction_embedding BLOB -- For vector DBs this might be just an ID
-        )
-        """)
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS errors (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp REAL,
-            instruction TEXT,
-            plan TEXT,        -- JSON string
-            error_details TEXT -- JSON string
-        )
-        """)
-        conn.commit()
+    def _load_persisted_embeddings(self, index, batch_size: int = 4096):
+        """
+        Catches the vector index up with embeddings stored in the SQLite store that are
+        newer than the memory-mapped matrix (or rebuilds it entirely if there is none).
+        """
+        storage = index.storage
+        last_id = int(storage.ids[:len(storage)].max()) if len(storage) else 0
+        ids, timestamps, vectors = [], [], []
+        for experience_id, ts, blob in self.structured_db.iter_embeddings(batch_size, after_id=last_id):
+            ids.append(experience_id)
+            timestamps.append(ts)
+            vectors.append(np.frombuffer(blob, dtype=np.float32))
+            if len(ids) >= batch_size:
+                index.add(ids, np.stack(vectors), timestamps)
+                ids, timestamps, vectors = [], [], []
+        if ids:
+            index.add(ids, np.stack(vectors), timestamps)
+        print(f"Memory: Loaded {len(index)} persisted embeddings.")
+
+    def _get_experiences(self, ids: list) -> dict:
+        if self.db_type == 'sqlite':
+            return self.structured_db.get_experiences(ids)
+        return {experience_id: self._experiences_by_id[experience_id]
+                for experience_id in ids if experience_id in self._experiences_by_id}
 
     def record_experience(self, instruction: str, plan: list, execution_results: dict, reflections: str = None, timestamp: float = None):
         """Records a task execution experience."""
@@ -80,50 +176,67 @@ class MemoryModule:
 
         instruction_embedding = self._get_embedding(instruction)
 
-        # For mock structured_db (list of dicts)
-        experience_entry = {
-            "id": len(self.structured_db["experiences"]) + 1,
-            "timestamp": ts,
-            "instruction": instruction,
-            "plan": json.dumps(plan),  # Serialize plan to JSON string
-            # Serialize results to JSON string
-            "results": json.dumps(execution_results),
-            "reflections": reflections,
-            # Store mock embedding directly for simplicity
-            "instruction_embedding_mock": instruction_embedding
-        }
-        self.structured_db["experiences"].append(experience_entry)
+        # IDs are assigned and appended to the index under one lock, so the index's ID
+        # array stays sorted (its lookups binary-search) under concurrent recording
+        if self.db_type == 'sqlite':
+            with self.lock:
+                vector_db = self.vector_db  # load persisted rows before queueing a new one
+                # Queued for the background writer; serialization happens off the caller's thread
+                experience_id = self.structured_db.add_experience(
+                    ts, instruction, plan, execution_results, reflections, instruction_embedding)
+                vector_db.add([experience_id], instruction_embedding, [ts])
+            print(f"Memory: Experience {experience_id} queued for storage.")
+            return
 
-        # For mock vector_db (also list of dicts, with ID linking to structured_db)
-        # In a real vector DB, you'd add the embedding and its ID.
-        self.vector_db["data"].append(
-            {"id": experience_entry["id"], "embedding": instruction_embedding})
+        # For mock structured_db (list of dicts)
+        with self.lock:
+            self._last_experience_id += 1
+            experience_entry = {
+                "id": self._last_experience_id,
+                "timestamp": ts,
+                "instruction": instruction,
+                "plan": json.dumps(plan),  # Serialize plan to JSON string
+                # Serialize results to JSON string
+                "results": json.dumps(execution_results),
+                "reflections": reflections,
+            }
+            # The embedding lives only in the vector index's matrix; the entry keeps its row offset
+            experience_entry["embedding_row"] = int(self.vector_db.add(
+                [experience_entry["id"]], instruction_embedding, [ts])[0])
+            self.structured_db["experiences"].append(experience_entry)
+            self._experiences_by_id[experience_entry["id"]] = experience_entry
         print(f"Memory: Experience {experience_entry['id']} recorded.")
 
+    async def record_experience_async(self, instruction: str, plan: list, execution_results: dict, reflections: str = None, timestamp: float = None):
+        """record_experience() in a worker thread (embedding and index update are CPU-bound)."""
+        return await asyncio.to_thread(self.record_experience, instruction, plan, execution_results, reflections, timestamp)
+
     def retrieve_relevant_experience(self, query_instruction: str, top_k: int = 3) -> list:
         """Retrieves relevant past experiences based on similarity."""
         print(
             f"Memory: Retrieving {top_k} relevant experiences for query: '{query_instruction}'")
-        query_embedding = self._get_embedding(query_instruction)
-
-        # Mock similarity search (e.g., simple dot product or L2 distance if embeddings were real)
-        # For this mock, we'll just return the last few experiences if the query matches anything.
-        if not self.vector_db["data"]:
+        if len(self.vector_db) == 0:
             return []
+        query_embedding = self._get_embedding(query_instruction)
 
-        # Extremely simplified mock search: finds if any word matches, not actual vector similarity
-        relevant_ids = []
-        for entry in reversed(self.structured_db["experiences"]):
-            if query_instruction.lower().split()[0] in entry["instruction"].lower():
-                relevant_ids.append(entry["id"])
-            if len(relevant_ids) >= top_k:
-                break
-
-        retrieved_experiences = [
-            exp for exp in self.structured_db["experiences"] if exp["id"] in relevant_ids]
+        # Top-k cosine similarity search; results come back best first
+        matches = [(experience_id, score) for experience_id, score in self.search_embeddings(
+            query_embedding, top_k) if score >= self.min_similarity]
+        with self.lock:
+            # Hit statistics feed the access-frequency and max-entries pruning policies
+            rows = self.vector_db.storage.rows_for_ids(
+                [experience_id for experience_id, _ in matches])
+            self.vector_db.storage.touch(rows[rows >= 0])
+        entries = self._get_experiences([experience_id for experience_id, _ in matches])
+        retrieved_experiences = [dict(entries[experience_id], similarity=score)
+                                 for experience_id, score in matches if experience_id in entries]
         print(f"Memory: Retrieved {len(retrieved_experiences)} experiences.")
         return retrieved_experiences
 
+    async def retrieve_relevant_experience_async(self, query_instruction: str, top_k: int = 3) -> list:
+        """retrieve_relevant_experience() in a worker thread."""
+        return await asyncio.to_thread(self.retrieve_relevant_experience, query_instruction, top_k)
+
     def summarize_and_generalize_experiences(self, experiences: list):
         """Analyzes experiences to extract generalizable knowledge."""
         print(
@@ -133,17 +246,68 @@ class MemoryModule:
         # Mock summarization
         return {"summary": f"Mock summary of {len(experiences)} experiences.", "patterns": ["common_action: click_button"]}
 
-    def update_memory_strategy(self):
+    def search_embeddings(self, query_embedding, top_k: int = 3) -> list:
+        """Returns up to top_k (experience id, similarity) pairs from the vector index."""
+        with self.lock:
+            return self.vector_db.search(query_embedding, top_k=top_k)
+
+    def forget_experiences(self, ids: list) -> int:
+        """Removes experiences from the vector index and the structured store."""
+        with self.lock:
+            rows = self.vector_db.storage.rows_for_ids(ids)
+            removed = self.vector_db.storage.remove(rows[rows >= 0])
+            if self.db_type == 'sqlite':
+                self.structured_db.delete_experiences(ids)
+            else:
+                for experience_id in ids:
+                    self._experiences_by_id.pop(experience_id, None)
+        return removed
+
+    def compact_memory(self):
+        """
+        Drops removed rows from the embedding matrix and rebuilds the index over the
+        compacted copy. The bulk copy happens outside the lock so retrieval continues.
+        """
+        with self.lock:
+            storage = self.vector_db.storage
+            upto = len(storage)
+        compacted, kept = storage.compacted(upto)
+        with self.lock:
+            # Rows appended, removed or retrieved while copying
+            tail = np.arange(upto, len(storage))
+            compacted.extend_from(storage, tail)
+            kept = np.concatenate([kept, tail])
+            compacted.meta[:len(kept)] = storage.meta[kept]
+            compacted.dead = int(
+                len(kept) - np.count_nonzero(compacted.meta["alive"][:len(kept)]))
+            old_to_new = np.full(len(storage), -1, dtype=np.int64)
+            old_to_new[kept] = np.arange(len(kept))
+            self.vector_db.replace_storage(compacted, old_to_new)
+            if self.db_type != 'sqlite':
+                live = [entry for entry in self.structured_db["experiences"]
+                        if entry["id"] in self._experiences_by_id]
+                for entry in live:
+                    entry["embedding_row"] = int(
+                        old_to_new[entry["embedding_row"]])
+                self.structured_db["experiences"] = live
+        print(
+            f"Memory: Compacted vector index from {len(storage)} to {len(compacted)} rows.")
+
+    def update_memory_strategy(self) -> dict:
         """Periodically optimizes and prunes outdated memories."""
-        print("Memory: Updating memory strategy (mock: no operation performed).")
-        # Placeholder for logic like removing old/unused memories, re-indexing, etc.
-        pass
+        # Policies come from memory_config['pruning'] (ttl_s, min_hits, duplicate_threshold, max_entries)
+        return self.pruner.run_once()
 
     def record_error(self, instruction: str, plan: list = None, error_details: dict = None, timestamp: float = None):
         """Records errors encountered during task execution."""
         ts = timestamp if timestamp else time.time()
         print(
             f"Memory: Recording error at {ts} for instruction: '{instruction}', details: {error_details}")
+        if self.db_type == 'sqlite':
+            error_id = self.structured_db.add_error(
+                ts, instruction, plan, error_details)
+            print(f"Memory: Error {error_id} queued for storage.")
+            return
         error_entry = {
             "id": len(self.structured_db["errors"]) + 1,
             "timestamp": ts,
@@ -154,6 +318,36 @@ class MemoryModule:
         self.structured_db["errors"].append(error_entry)
         print(f"Memory: Error {error_entry['id']} recorded.")
 
+    async def record_error_async(self, instruction: str, plan: list = None, error_details: dict = None, timestamp: float = None):
+        """record_error() in a worker thread."""
+        return await asyncio.to_thread(self.record_error, instruction, plan, error_details, timestamp)
+
+    def flush(self):
+        """Blocks until all queued memory writes are persisted (no-op for the mock store)."""
+        if self.db_type == 'sqlite' and is_initialized(self, 'structured_db'):
+            self.structured_db.flush()
+
+    def save_embeddings(self, path: str = None):
+        """Saves the embedding matrix as .npy files for memory-mapped loading on the next start."""
+        path = path if path else self.embedding_matrix_path
+        if path:
+            self.vector_db.storage.save(path)
+
+    def close(self):
+        """
+        Flushes and closes the persistent store, if any, and saves the embedding
+        matrix and embedding cache.
+        """
+        if is_initialized(self, 'pruner'):
+            self.pruner.stop()
+        if self.db_type == 'sqlite':
+            if is_initialized(self, 'structured_db'):
+                self.structured_db.close()
+            if is_initialized(self, 'vector_db'):
+                self.save_embeddings()
+        if is_initialized(self, 'embedding_cache'):
+            self.embedding_cache.save()
+
 
 if __name__ == '__main__':
     print("Testing MemoryModule...")
@@ -199,3 +393,18 @@ if __name__ == '__main__':
 
     print(f"Total experiences: {len(memory.structured_db['experiences'])}")
     print(f"Total errors: {len(memory.structured_db['errors'])}")
+
+    import tempfile
+    test_dir = tempfile.mkdtemp()
+    sqlite_config = {'db_type': 'sqlite', 'db_path': os.path.join(test_dir, 'test_horus_memory.db'),
+                     'embedding_matrix_path': os.path.join(test_dir, 'test_embeddings.npy'),
+                     'embedding_dtype': 'float16'}
+    sqlite_memory = MemoryModule(config=sqlite_config)
+    sqlite_memory.record_experience(
+        "Open Chrome and search for HorusAgentOS", [{"action": "open_app", "params": {"app_name": "Chrome"}}],
+        {"summary": "Search completed"})
+    sqlite_memory.close()
+    reopened = MemoryModule(config=sqlite_config)
+    print(
+        f"Reopened SQLite memory, retrieved: {[exp['instruction'] for exp in reopened.retrieve_relevant_experience('Open Chrome')]}")
+    reopened.close()
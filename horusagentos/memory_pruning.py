@@ -0,0 +1,194 @@
+# tech.md: 4.4. Memory Layer - Memory Update Strategy
+import threading
+import time
+
+import numpy as np
+
+
+class PruningContext:
+    """Snapshot of the memory's live rows handed to pruning policies."""
+
+    def __init__(self, memory, now: float):
+        self.memory = memory
+        self.now = now
+        storage = memory.vector_db.storage
+        size = len(storage)
+        self.rows = np.flatnonzero(storage.meta["alive"][:size])
+        self.ids = np.array(storage.ids[self.rows])
+        self.meta = np.array(storage.meta[self.rows])
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class TTLPolicy:
+    """Drops experiences older than `max_age_s`."""
+
+    def __init__(self, max_age_s: float):
+        self.max_age_s = max_age_s
+
+    def select(self, context: PruningContext, selected: np.ndarray) -> np.ndarray:
+        return context.meta["timestamp"] < context.now - self.max_age_s
+
+
+class AccessFrequencyPolicy:
+    """Drops experiences retrieved fewer than `min_hits` times once they are `grace_period_s` old."""
+
+    def __init__(self, min_hits: int = 1, grace_period_s: float = 7 * 24 * 3600):
+        self.min_hits = min_hits
+        self.grace_period_s = grace_period_s
+
+    def select(self, context: PruningContext, selected: np.ndarray) -> np.ndarray:
+        old_enough = context.meta["timestamp"] < context.now - \
+            self.grace_period_s
+        return old_enough & (context.meta["hits"] < self.min_hits)
+
+
+class NearDuplicatePolicy:
+    """
+    Collapses near-duplicate experiences (cosine similarity >= `threshold`), keeping
+    the newest copy. Each run checks the next `batch_size` rows, so the whole memory
+    is covered incrementally over successive runs.
+    """
+
+    def __init__(self, threshold: float = 0.98, batch_size: int = 1024, neighbors: int = 4):
+        self.threshold = threshold
+        self.batch_size = batch_size
+        self.neighbors = neighbors
+        self._cursor_id = 0
+
+    def select(self, context: PruningContext, selected: np.ndarray) -> np.ndarray:
+        drop = np.zeros(len(context), dtype=bool)
+        start = int(np.searchsorted(context.ids, self._cursor_id, side="right"))
+        if start >= len(context):
+            start = 0  # wrap around for the next sweep
+        end = min(start + self.batch_size, len(context))
+        for position in range(start, end):
+            if selected[position]:
+                continue
+            experience_id = int(context.ids[position])
+            vector = context.memory.vector_db.storage.get(
+                [context.rows[position]])[0]
+            for neighbor_id, score in context.memory.search_embeddings(vector, self.neighbors + 1):
+                if neighbor_id > experience_id and score >= self.threshold:
+                    drop[position] = True
+                    break
+        self._cursor_id = int(context.ids[end - 1]) if end > start else 0
+        return drop
+
+
+class MaxEntriesPolicy:
+    """Caps memory at `max_entries`, evicting the least used and least recently active first."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+
+    def select(self, context: PruningContext, selected: np.ndarray) -> np.ndarray:
+        drop = np.zeros(len(context), dtype=bool)
+        candidates = np.flatnonzero(~selected)
+        excess = len(candidates) - self.max_entries
+        if excess <= 0:
+            return drop
+        meta = context.meta[candidates]
+        last_active = np.maximum(meta["timestamp"], meta["last_access"])
+        # lexsort sorts by the last key first: fewest hits, then oldest activity
+        order = np.lexsort((last_active, meta["hits"]))
+        drop[candidates[order[:excess]]] = True
+        return drop
+
+
+def create_pruning_policies(config: dict) -> list:
+    """Builds the policies enabled in a memory_config['pruning'] dict."""
+    policies = []
+    if config.get('ttl_s'):
+        policies.append(TTLPolicy(config['ttl_s']))
+    if config.get('min_hits'):
+        policies.append(AccessFrequencyPolicy(
+            config['min_hits'], config.get('min_hits_grace_s', 7 * 24 * 3600)))
+    if config.get('duplicate_threshold'):
+        policies.append(NearDuplicatePolicy(
+            config['duplicate_threshold'], config.get('duplicate_batch_size', 1024)))
+    if config.get('max_entries'):
+        policies.append(MaxEntriesPolicy(config['max_entries']))
+    return policies
+
+
+class MemoryPruner:
+    """
+    Applies pruning policies to a MemoryModule and compacts its vector index once
+    enough rows have been removed. Can run periodically on a background thread.
+    """
+
+    def __init__(self, memory, config: dict = None, policies: list = None):
+        self.memory = memory
+        self.config = config if config else {}
+        self.policies = policies if policies is not None else create_pruning_policies(
+            self.config)
+        self.interval_s = self.config.get('interval_s', 300)
+        # Fraction of tombstoned rows that triggers a compaction
+        self.compact_ratio = self.config.get('compact_ratio', 0.2)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_policy(self, policy):
+        self.policies.append(policy)
+
+    def run_once(self, now: float = None) -> dict:
+        """Runs every policy once, forgets the selected experiences, and compacts if needed."""
+        now = time.time() if now is None else now
+        with self.memory.lock:
+            context = PruningContext(self.memory, now)
+        selected = np.zeros(len(context), dtype=bool)
+        for policy in self.policies:
+            selected |= policy.select(context, selected)
+
+        removed = 0
+        if selected.any():
+            removed = self.memory.forget_experiences(
+                context.ids[selected].tolist())
+        storage = self.memory.vector_db.storage
+        compacted = False
+        if len(storage) and storage.dead / len(storage) >= self.compact_ratio:
+            self.memory.compact_memory()
+            compacted = True
+        stats = {"checked": len(context), "removed": removed, "compacted": compacted,
+                 "live": self.memory.vector_db.storage.live_count}
+        print(f"Memory: Pruning pass finished: {stats}")
+        return stats
+
+    def _run_loop(self):
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Memory: Background pruning pass failed: {e}")
+
+    def start(self):
+        """Starts periodic pruning on a daemon thread."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run_loop, name="horus-memory-pruner", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+
+if __name__ == '__main__':
+    from .memory_module import MemoryModule
+
+    print("Testing MemoryPruner...")
+    memory = MemoryModule(config={'pruning': {
+        'ttl_s': 3600, 'duplicate_threshold': 0.99, 'max_entries': 3, 'compact_ratio': 0.1}})
+    now = time.time()
+    memory.record_experience("Open Chrome", [], {}, timestamp=now - 7200)
+    for instruction in ["Open Notepad", "Open Notepad", "Write a note", "Search the web", "Close all windows"]:
+        memory.record_experience(instruction, [], {})
+    memory.retrieve_relevant_experience("Write a note")
+    print(memory.update_memory_strategy())
+    print(f"Remaining: {[exp['instruction'] for exp in memory.structured_db['experiences']]}")
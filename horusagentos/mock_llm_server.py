@@ -0,0 +1,163 @@
+# tech.md: 4.2. Decision Layer - LLM Integration
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def mock_reply_text(payload: dict) -> str:
+    """Reply text for a payload: a JSON plan for planning prompts, otherwise an echo."""
+    messages = payload.get("messages", [])
+    prompt = messages[-1]["content"] if messages else ""
+    digest = hashlib.sha256(prompt.encode()).hexdigest()[:8]
+    if any("JSON array of steps" in m.get("content", "") for m in messages):
+        quoted = re.findall(r"\"([^\"]*)\"", prompt)
+        text = quoted[0] if quoted else "Hello HorusAgentOS!"
+        return json.dumps([
+            {"action": "find_element", "params": {"type": "textfield", "name": "document"},
+             "description": "Find text input area"},
+            {"action": "click", "params": {"element_id": "mock_found_element"},
+             "description": "Focus the text area"},
+            {"action": "type_text", "params": {"text": text}, "description": "Type the text"},
+            {"action": "press_key", "params": {"key_name": "enter"}, "description": "Confirm"},
+        ], indent=1)
+    return f"mock completion {digest} for: {prompt[:60]}"
+
+
+def mock_completion(payload: dict) -> dict:
+    """Deterministic OpenAI-style chat completion for a request payload."""
+    messages = payload.get("messages", [])
+    prompt = messages[-1]["content"] if messages else ""
+    digest = hashlib.sha256(prompt.encode()).hexdigest()[:8]
+    return {
+        "id": f"mock-{digest}",
+        "object": "chat.completion",
+        "model": payload.get("model", "mock"),
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": mock_reply_text(payload)}}],
+        "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": 6},
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse is observable
+
+    def setup(self):
+        super().setup()
+        self.server.stats["connections"] += 1
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionError:
+            pass  # client went away mid-stream or closed an idle keep-alive connection
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream_completion(self, payload: dict):
+        """Server-sent events in the OpenAI streaming format, one small delta per event."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        text = mock_reply_text(payload)
+        chunk_size = self.server.stream_chunk_chars
+        events = [{"choices": [{"index": 0, "delta": {"content": text[i:i + chunk_size]}}]}
+                  for i in range(0, len(text), chunk_size)]
+        for event in events:
+            self._write_chunk(f"data: {json.dumps(event)}\n\n".encode())
+            if self.server.stream_delay_s:
+                time.sleep(self.server.stream_delay_s)
+        self._write_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        stats = self.server.stats
+        stats["requests"] += 1
+        if self.server.latency_s:
+            time.sleep(self.server.latency_s)
+        if self.path.endswith("/chat/completions") and payload.get("stream"):
+            stats["completions"] += 1
+            self._stream_completion(payload)
+        elif self.path.endswith("/chat/completions"):
+            stats["completions"] += 1
+            self._send_json(200, mock_completion(payload))
+        elif self.path.endswith("/batch"):
+            stats["batches"] += 1
+            stats["completions"] += len(payload.get("requests", []))
+            self._send_json(200, {"responses": [mock_completion(r) for r in payload.get("requests", [])]})
+        else:
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # many concurrent clients connect at once in tests
+
+
+class MockLLMServer:
+    """
+    Local OpenAI-compatible server for tests: POST /v1/chat/completions (streamed as
+    server-sent events when "stream" is true) and a batched POST /v1/batch
+    ({"requests": [...]} -> {"responses": [...]}). `stats` counts connections,
+    requests, batches and completions.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0,
+                 stream_delay_ms: float = 0, stream_chunk_chars: int = 16):
+        self.httpd = _Server((host, port), _Handler)
+        self.httpd.stats = {"connections": 0, "requests": 0, "batches": 0, "completions": 0}
+        self.httpd.latency_s = latency_ms / 1000.0
+        self.httpd.stream_delay_s = stream_delay_ms / 1000.0
+        self.httpd.stream_chunk_chars = stream_chunk_chars
+        self._thread = None
+
+    @property
+    def stats(self) -> dict:
+        return self.httpd.stats
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == '__main__':
+    from .http_pool import HTTPConnectionPool
+
+    print("Testing MockLLMServer...")
+    server = MockLLMServer().start()
+    pool = HTTPConnectionPool()
+    for _ in range(3):
+        response = pool.request("POST", server.base_url + "/chat/completions",
+                                {"model": "mock", "messages": [{"role": "user", "content": "hi"}]})
+    print(f"Last response: {response.status} {response.json()['choices'][0]['message']['content']}")
+    print(f"Server stats after 3 pooled requests: {server.stats}")
+    pool.close()
+    server.stop()
@@ -0,0 +1,102 @@
+# tech.md: 4.5. Communication Layer - Network Protocols (test double)
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse is observable
+
+    def setup(self):
+        super().setup()
+        self.server.stats["connections"] += 1
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionError:
+            pass  # client closed an idle keep-alive connection
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _respond(self, params: dict):
+        stats = self.server.stats
+        stats["requests"] += 1
+        if self.server.latency_s:
+            time.sleep(self.server.latency_s)
+        path = urlsplit(self.path).path
+        if path.endswith("/fail"):
+            self._send_json(503, {"error": "service unavailable"})
+        elif path.endswith("/missing"):
+            self._send_json(404, {"error": f"unknown path {path}"})
+        else:
+            self._send_json(200, {"method": self.command, "path": path, "params": params,
+                                  "request": stats["requests"]})
+
+    def do_GET(self):
+        self._respond(dict(parse_qsl(urlsplit(self.path).query)))
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self._respond(json.loads(self.rfile.read(length) or b"{}"))
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # many concurrent clients connect at once in tests
+
+
+class MockServiceServer:
+    """
+    Local stand-in for an external HTTP API: GET and POST on any path echo the method,
+    path and parameters as JSON; paths ending in /fail answer 503 and /missing 404.
+    `stats` counts connections and requests.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0):
+        self.httpd = _Server((host, port), _Handler)
+        self.httpd.stats = {"connections": 0, "requests": 0}
+        self.httpd.latency_s = latency_ms / 1000.0
+        self._thread = None
+
+    @property
+    def stats(self) -> dict:
+        return self.httpd.stats
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == '__main__':
+    from .http_pool import HTTPConnectionPool
+
+    print("Testing MockServiceServer...")
+    server = MockServiceServer().start()
+    pool = HTTPConnectionPool()
+    print(f"GET: {pool.request('GET', server.base_url + '/weather?city=London').json()}")
+    print(f"POST /fail: {pool.request('POST', server.base_url + '/fail', {'x': 1}).status}")
+    print(f"Server stats: {server.stats}")
+    pool.close()
+    server.stop()
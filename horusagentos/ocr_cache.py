@@ -0,0 +1,205 @@
+# tech.md: 4.1. Perception Layer - OCR Technology
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+# Potential future imports: pytesseract
+
+
+class MockOCREngine:
+    """
+    Deterministic OCR stand-in: a tile with any non-background pixels yields one
+    word derived from its content, boxed around the non-background area.
+    """
+
+    def recognize(self, pixels: np.ndarray) -> list:
+        """Returns [{"text", "bbox": [x, y, w, h]}] for a tile, with boxes relative to the tile."""
+        gray = pixels.max(axis=2) if pixels.ndim == 3 else pixels
+        ys, xs = np.nonzero(gray != gray.flat[0])
+        if not len(ys):
+            return []
+        x0, y0 = int(xs.min()), int(ys.min())
+        word = f"text_{zlib.crc32(np.ascontiguousarray(pixels)) & 0xFFFFFF:06x}"
+        return [{"text": word, "bbox": [x0, y0, int(xs.max()) - x0 + 1, int(ys.max()) - y0 + 1]}]
+
+
+class TesseractOCREngine:
+    """OCR engine backed by `pytesseract` (imported on construction)."""
+
+    def __init__(self, lang: str = "eng", config: str = ""):
+        import pytesseract
+        self._pytesseract = pytesseract
+        self.lang = lang
+        self.config = config
+
+    def __getstate__(self):
+        # Picklable for process-pool workers; the module is re-imported on the other side
+        return {"lang": self.lang, "config": self.config}
+
+    def __setstate__(self, state):
+        self.__init__(state["lang"], state["config"])
+
+    def recognize(self, pixels: np.ndarray) -> list:
+        data = self._pytesseract.image_to_data(
+            pixels, lang=self.lang, config=self.config, output_type=self._pytesseract.Output.DICT)
+        return [{"text": text, "bbox": [left, top, width, height]}
+                for text, left, top, width, height in zip(
+                    data["text"], data["left"], data["top"], data["width"], data["height"])
+                if text.strip()]
+
+
+class TileOCRCache:
+    """LRU cache of per-tile OCR results keyed by a hash of the tile's pixels."""
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(pixels: np.ndarray) -> bytes:
+        digest = hashlib.blake2b(np.ascontiguousarray(pixels), digest_size=16)
+        digest.update(str(pixels.shape).encode())
+        return digest.digest()
+
+    def get(self, key: bytes):
+        with self._lock:
+            words = self._entries.get(key)
+            if words is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return words
+
+    def put(self, key: bytes, words: list):
+        with self._lock:
+            self._entries[key] = words
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def split_tiles(pixels: np.ndarray, tile_size: int, origin: tuple = (0, 0)) -> list:
+    """
+    Splits an image into tiles aligned to the absolute screen grid (so the same screen
+    content maps to the same tiles regardless of the requested region).
+    Returns [(x, y, tile_pixels)] with absolute tile origins.
+    """
+    ox, oy = origin
+    height, width = pixels.shape[:2]
+    tiles = []
+    y = oy
+    while y < oy + height:
+        y_end = min((y // tile_size + 1) * tile_size, oy + height)
+        x = ox
+        while x < ox + width:
+            x_end = min((x // tile_size + 1) * tile_size, ox + width)
+            tiles.append((x, y, pixels[y - oy:y_end - oy, x - ox:x_end - ox]))
+            x = x_end
+        y = y_end
+    return tiles
+
+
+def merge_words(words: list) -> str:
+    """Joins words in reading order, starting a new line when the vertical position jumps."""
+    if not words:
+        return ""
+    words = sorted(words, key=lambda w: (w["bbox"][1], w["bbox"][0]))
+    lines = [[words[0]]]
+    for word in words[1:]:
+        previous = lines[-1][-1]["bbox"]
+        if word["bbox"][1] >= previous[1] + max(previous[3], 1) / 2:
+            lines.append([word])
+        else:
+            lines[-1].append(word)
+    return "\n".join(" ".join(w["text"] for w in sorted(line, key=lambda w: w["bbox"][0])) for line in lines)
+
+
+class TiledOCR:
+    """
+    Runs OCR tile by tile and serves unchanged tiles from a TileOCRCache, so only the
+    tiles whose pixels changed since they were last seen are recognized again.
+    """
+
+    def __init__(self, engine, cache: TileOCRCache = None, tile_size: int = 128):
+        self.engine = engine
+        self.cache = cache if cache is not None else TileOCRCache()
+        self.tile_size = tile_size
+
+    def lookup(self, pixels: np.ndarray, origin: tuple = (0, 0)):
+        """
+        Splits the image into tiles and resolves them against the cache.
+        Returns (tiles, resolved, missing): tiles is [(x, y, key)], resolved maps cached
+        keys to words, and missing is [(key, [x, y, w, h], tile_pixels)] with one entry
+        per distinct uncached tile (boxes in absolute screen coordinates).
+        """
+        tiles = []
+        resolved = {}
+        missing = {}
+        for x, y, tile in split_tiles(pixels, self.tile_size, origin):
+            key = self.cache.key(tile)
+            tiles.append((x, y, key))
+            if key in resolved or key in missing:
+                continue
+            words = self.cache.get(key)
+            if words is None:
+                missing[key] = ([x, y, tile.shape[1], tile.shape[0]], tile)
+            else:
+                resolved[key] = words
+        return tiles, resolved, [(key, box, tile) for key, (box, tile) in missing.items()]
+
+    def complete(self, tiles: list, resolved: dict, missing: list, recognized: list) -> dict:
+        """Stores freshly recognized tiles in the cache and merges all tiles into one result."""
+        resolved = dict(resolved)
+        for (key, _, _), words in zip(missing, recognized):
+            self.cache.put(key, words)
+            resolved[key] = words
+        words = []
+        for x, y, key in tiles:
+            for word in resolved[key]:
+                bx, by, bw, bh = word["bbox"]
+                words.append({"text": word["text"], "bbox": [x + bx, y + by, bw, bh]})
+        return {"text": merge_words(words), "words": words,
+                "tiles_recognized": len(missing), "tiles_cached": len(tiles) - len(missing)}
+
+    def recognize(self, pixels: np.ndarray, origin: tuple = (0, 0)) -> dict:
+        """Returns {"text", "words", "tiles_recognized", "tiles_cached"} with absolute word boxes."""
+        tiles, resolved, missing = self.lookup(pixels, origin)
+        recognized = recognize_tiles(self.engine, [tile for _, _, tile in missing])
+        return self.complete(tiles, resolved, missing, recognized)
+
+
+def recognize_tiles(engine, tiles: list) -> list:
+    """Runs the engine over a list of tile images (module-level so process pools can call it)."""
+    return [engine.recognize(tile) for tile in tiles]
+
+
+def recognize_frame_tiles(engine, frame, boxes: list) -> list:
+    """
+    Like recognize_tiles, but slices the [x, y, w, h] tiles out of a Frame in the
+    worker, so a shared-memory frame crosses the process boundary without copying.
+    """
+    ox, oy = frame.origin
+    return [engine.recognize(frame.pixels[y - oy:y - oy + h, x - ox:x - ox + w])
+            for x, y, w, h in boxes]
+
+
+if __name__ == '__main__':
+    print("Testing TiledOCR...")
+    screen = np.zeros((1080, 1920, 3), dtype=np.uint8)
+    screen[100:120, 300:420] = 255
+    ocr = TiledOCR(MockOCREngine())
+    first = ocr.recognize(screen)
+    print(f"First pass: recognized {first['tiles_recognized']}, cached {first['tiles_cached']}")
+    screen[500:520, 900:960] = 200  # "typing" into one text box
+    second = ocr.recognize(screen)
+    print(f"Second pass: recognized {second['tiles_recognized']}, cached {second['tiles_cached']}")
+    print(f"Text: {second['text']!r}")
@@ -1,6 +1,17 @@
 # tech.md: 4.1. Perception Layer
+import asyncio
 import platform
-# Potential future imports: mss, pytesseract, pywinauto, opencv-python, Pillow
+import threading
+import time
+
+from .frame import Frame, SharedFrameRing
+from .frame_diff import FrameFingerprint, regions_intersect
+from .lazy import is_initialized, lazy_property, warm_up
+from .ocr_cache import MockOCREngine, TesseractOCREngine, TileOCRCache, TiledOCR
+from .perception_pipeline import PerceptionPipeline, analyze_pixels
+from .screen_capture import MSSScreenCapturer, MockScreenCapturer
+from .ui_tree_cache import UIElementCache
+# Potential future imports: pywinauto, opencv-python, Pillow
 
 
 class PerceptionModule:
@@ -9,24 +20,72 @@ class PerceptionModule:
         self.os_type = self.config.get(
             'os_override', platform.system().lower())
 
-        # Initialize perception tools based on OS and config
-        self.screen_capturer = self._initialize_screen_capturer()
-        self.ocr_engine = self._initialize_ocr()
-        self.accessibility_tool = self._initialize_accessibility_tool()
-        self.image_processor = self._initialize_image_processor()
+        # Perception tools (screen capturer, OCR, accessibility, image processor, shared
+        # frame ring, worker pools) are built on first use, see the lazy properties below
+        # Per-window accessibility trees, walked once and invalidated incrementally
+        self.ui_cache = UIElementCache(self._walk_accessibility_tree, self.config)
+        # Monotonic time of the last accessibility event (used by UI settle detection)
+        self.last_accessibility_event = 0.0
+
+        # Change detection: tile size of the frame fingerprint, and the last fused state
+        self.fingerprint_tile_size = self.config.get('fingerprint_tile_size', 64)
+        self._last_fingerprint = None
+        self._last_state = None
+        self._last_focus_area = None
+        self._frame_counter = 0
+        # Plan steps may run concurrently; fusing state is serialized
+        self._state_lock = threading.RLock()
         print(f"PerceptionModule initialized for {self.os_type}")
 
+    @lazy_property
+    def screen_capturer(self):
+        return self._initialize_screen_capturer()
+
+    @lazy_property
+    def ocr_engine(self):
+        return self._initialize_ocr()
+
+    @lazy_property
+    def accessibility_tool(self):
+        return self._initialize_accessibility_tool()
+
+    @lazy_property
+    def image_processor(self):
+        return self._initialize_image_processor()
+
+    @lazy_property
+    def frame_ring(self):
+        # Captures land in shared-memory slots so worker processes can read them in place
+        return SharedFrameRing(self.config.get('shared_frame_slots', 4)) \
+            if self.config.get('shared_frames', True) else None
+
+    @lazy_property
+    def pipeline(self):
+        # Concurrent capture/accessibility (threads) and OCR/image analysis (processes)
+        return PerceptionPipeline(
+            self, self.config) if self.config.get('parallel_perception', True) else None
+
+    def warm_up(self) -> dict:
+        """Builds all perception tools now instead of on first use; returns build times (ms)."""
+        return warm_up(self)
+
     def _initialize_screen_capturer(self):
+        if self.config.get('screen_capture_backend') == 'mss':
+            print("Screen capturer initialized (mss).")
+            return MSSScreenCapturer(self.config.get('monitor_index', 1))
         print("Mock: Screen capturer initialized.")
-        # Placeholder for mss or other screen capture library
-        # Example: if self.os_type == 'windows': from mss import mss; return mss()
-        return "MockScreenCapturer"
+        return MockScreenCapturer(tuple(self.config.get('screen_resolution', (1920, 1080))))
 
     def _initialize_ocr(self):
-        print("Mock: OCR engine initialized.")
-        # Placeholder for Tesseract OCR (pytesseract)
-        # Example: import pytesseract; return pytesseract
-        return "MockOCREngine"
+        # Tile-level OCR: unchanged tiles are served from an LRU cache keyed by pixel hash
+        engine_name = self.config.get('ocr_engine', 'mock')
+        if engine_name.startswith('tesseract'):
+            engine = TesseractOCREngine(self.config.get('ocr_lang', 'eng'))
+        else:
+            engine = MockOCREngine()
+        print(f"OCR engine initialized ({type(engine).__name__}, tiled).")
+        return TiledOCR(engine, TileOCRCache(self.config.get('ocr_cache_size', 4096)),
+                        self.config.get('ocr_tile_size', 128))
 
     def _initialize_accessibility_tool(self):
         print(f"Mock: Accessibility tool initialized for {self.os_type}.")
@@ -46,15 +105,31 @@ class PerceptionModule:
         # Example: import cv2; return cv2
         return "MockImageProcessor"
 
-    def capture_screen(self, region=None):
-        """Captures the screen or a specific region."""
+    def _grab_pixels(self, region=None):
+        return self.screen_capturer.grab(region)
+
+    def _grab_frame(self, region=None) -> Frame:
+        origin = tuple(region[:2]) if region else (0, 0)
+        if self.frame_ring is None or region:
+            # Region grabs are small and irregular; only full frames use the shared ring
+            return Frame(self._grab_pixels(region), origin)
+        width, height = self.screen_capturer.resolution
+        frame = self.frame_ring.allocate((height, width, 3))
+        self.screen_capturer.grab(region, out=frame.pixels)
+        frame.origin, frame.timestamp = origin, time.time()
+        return frame
+
+    def capture_screen(self, region=None) -> Frame:
+        """
+        Captures the screen or a specific region as a raw Frame (no encoding).
+        Use frame.as_payload() / frame.to_base64() when an encoded image is needed.
+        """
         print(
-            f"Perception: Capturing screen (region: {region}) using {self.screen_capturer}")
-        # Placeholder: 실제로는 이미지 데이터 반환
-        return {"image_data_format": "png_base64", "data": "mock_image_data_base64_string"}
+            f"Perception: Capturing screen (region: {region}) using {type(self.screen_capturer).__name__}")
+        return self._grab_frame(region)
 
-    def get_ui_elements(self, window_title=None, app_name=None):
-        """Uses accessibility tools to get UI element details for a window or app."""
+    def _walk_accessibility_tree(self, window_title=None, app_name=None):
+        """Walks the accessibility tree of a window or app (uncached)."""
         print(
             f"Perception: Getting UI elements (window: {window_title}, app: {app_name}) using {self.accessibility_tool}")
         # Placeholder: 실제로는 UI 요소 목록 반환
@@ -65,57 +140,147 @@ class PerceptionModule:
                 "name": "Username", "bounds": [100, 150, 200, 30]}
         ]
 
+    def get_ui_elements(self, window_title=None, app_name=None):
+        """Uses accessibility tools to get UI element details for a window or app."""
+        return self.ui_cache.get_tree(window_title, app_name).elements()
+
+    def handle_accessibility_event(self, event: dict):
+        """Feeds an accessibility event (element changed/removed, window closed, ...) to the UI tree cache."""
+        self.last_accessibility_event = time.monotonic()
+        self.ui_cache.handle_event(event)
+
     def ocr_screen_region(self, region: tuple = None, image_data=None):
-        """Performs OCR on a specific screen region or provided image data."""
-        if image_data:
-            print(
-                f"Perception: Performing OCR on provided image data using {self.ocr_engine}")
+        """
+        Performs OCR on a specific screen region or provided image data.
+
+        Returns {"text", "words": [{"text", "bbox"}], "tiles_recognized", "tiles_cached"};
+        word boxes are in screen coordinates when a region is captured.
+        """
+        if isinstance(image_data, Frame):
+            pixels, origin = image_data.pixels, image_data.origin
+        elif image_data is not None:
+            pixels, origin = image_data, (0, 0)
         else:
-            print(
-                f"Perception: Performing OCR on region {region} using {self.ocr_engine}")
-        # Placeholder: 실제로는 추출된 텍스트 반환
-        return "Mock OCR text from screen region"
+            pixels = self._grab_pixels(region)
+            origin = tuple(region[:2]) if region else (0, 0)
+        result = self.ocr_engine.recognize(pixels, origin)
+        print(
+            f"Perception: OCR on region {region}: {result['tiles_recognized']} tiles recognized, {result['tiles_cached']} from cache")
+        return result
 
     def analyze_visual_content(self, image_data):
         """Analyzes visual content using image processing libraries."""
         print(
             f"Perception: Analyzing visual content using {self.image_processor}")
-        # Placeholder: 실제로는 분석 결과 반환
-        return {"objects_detected": ["icon_A", "text_block_1"], "dominant_colors": ["blue", "white"]}
+        # Placeholder for object detection with OpenCV; colour/brightness summary for now
+        return analyze_pixels(image_data)
 
     def find_element_by_properties(self, properties: dict, parent_window_title=None):
         """Finds a UI element based on its properties (name, type, etc.)."""
         print(
             f"Perception: Finding element by properties {properties} in window '{parent_window_title}'")
-        # This would use self.accessibility_tool and filter elements
+        element = self.ui_cache.find(properties, parent_window_title)
+        if element is not None:
+            return element
         # For mock, return a dummy element if properties seem plausible
-        if properties.get("name") or properties.get("type"):
+        if self.accessibility_tool.startswith("Mock") and (properties.get("name") or properties.get("type")):
             return {"id": "mock_found_element", "name": properties.get("name", "Unknown"), "type": properties.get("type", "Unknown"), "bounds": [0, 0, 10, 10]}
         return None
 
+    async def find_element_by_properties_async(self, properties: dict, parent_window_title=None):
+        """find_element_by_properties() in a worker thread, leaving the event loop free."""
+        return await asyncio.to_thread(self.find_element_by_properties, properties, parent_window_title)
+
+    def frame_fingerprint(self) -> FrameFingerprint:
+        """Captures the screen and returns its tile fingerprint (no OCR or accessibility walk)."""
+        return FrameFingerprint.from_pixels(self._grab_pixels(), self.fingerprint_tile_size)
+
     def get_current_state(self, focus_area: dict = None):
         """
         Combines various perception methods to get a comprehensive understanding
         of the current UI state, potentially focusing on a specific area.
+
+        The screen is fingerprinted first; if no tile changed since the previous call
+        the previous fused state is returned without re-running the other modalities.
+        The state reports the changed screen areas under "dirty_regions".
         """
+        with self._state_lock:
+            return self._current_state(focus_area)
+
+    async def get_current_state_async(self, focus_area: dict = None):
+        """get_current_state() in a worker thread; concurrent callers are still serialized."""
+        return await asyncio.to_thread(self.get_current_state, focus_area)
+
+    def _current_state(self, focus_area: dict = None):
+        timed_out = []
+        if self.pipeline:
+            frame, timed_out = self.pipeline.capture()
+            if frame is None:
+                # Capture missed its deadline: fall back to the last known state if there is one
+                if self._last_state is not None:
+                    return dict(self._last_state, changed=False, dirty_regions=[], timed_out_modalities=timed_out)
+                frame = self._grab_frame()
+        else:
+            frame = self._grab_frame()
+        fingerprint = FrameFingerprint.from_pixels(
+            frame.pixels, self.fingerprint_tile_size)
+        dirty_regions = fingerprint.dirty_regions(self._last_fingerprint)
+        self._last_fingerprint = fingerprint
+
+        focus_region = focus_area.get('region') if focus_area else None
+        if focus_region and self._last_state is not None:
+            dirty_regions = [
+                region for region in dirty_regions if regions_intersect(region, focus_region)]
+        # Only elements under the changed areas need to be re-walked
+        self.ui_cache.invalidate_regions(dirty_regions)
+        if not dirty_regions and self._last_state is not None and focus_area == self._last_focus_area:
+            print("Perception: Screen unchanged, reusing previous UI state.")
+            return dict(self._last_state, timestamp=time.time(), changed=False, dirty_regions=[])
+
         print(
-            f"Perception: Getting current comprehensive UI state (focus: {focus_area})")
-        # In a real implementation, this would be more sophisticated:
-        # screenshot = self.capture_screen()
-        # ui_elements = self.get_ui_elements() # perhaps for the focused app
-        # ocr_results = self.ocr_screen_region(focus_area if focus_area else None) # or OCR of specific elements
-        # fused_state = self._fuse_modalities(screenshot, ui_elements, ocr_results)
+            f"Perception: Getting current comprehensive UI state (focus: {focus_area}, dirty regions: {len(dirty_regions)})")
+        visual = None
+        if self.pipeline:
+            results = self.pipeline.run_modalities(frame, focus_region)
+            ui_elements, ocr_results, visual = results["ui_elements"], results["ocr"], results["visual"]
+            timed_out.extend(results["timed_out"])
+        else:
+            ui_elements = self.get_ui_elements()
+            ocr_results = self.ocr_screen_region(
+                image_data=frame.region(focus_region) if focus_region else frame)
+        state = self._fuse_modalities(
+            frame, ui_elements, ocr_results, visual)
+        self._frame_counter += 1
+        state.update({"frame_id": self._frame_counter, "changed": True,
+                      "dirty_regions": dirty_regions, "timed_out_modalities": timed_out})
+        self._last_state = state
+        self._last_focus_area = focus_area
+        return state
+
+    def _fuse_modalities(self, screenshot, ui_elements, ocr_results, visual=None):
+        """
+        Internal method to combine information from different perceptual inputs.
+        Modalities that timed out arrive as None and are fused as empty.
+        """
+        # Complex logic to create a coherent representation of the UI
+        height, width = screenshot.shape[:2]
         return {
             "description": "Mock current UI state",
-            "timestamp": platform.time(),
+            "timestamp": time.time(),
             "focused_window_title": "Mock Application",
-            "screen_resolution": [1920, 1080]  # Example
+            "screen_resolution": [width, height],
+            "ui_elements": ui_elements if ui_elements is not None else [],
+            "ocr_text": ocr_results["text"] if ocr_results else "",
+            "ocr_words": ocr_results["words"] if ocr_results else [],
+            "visual_summary": visual,
         }
 
-    def _fuse_modalities(self, screenshot, ui_elements, ocr_results):
-        """Internal method to combine information from different perceptual inputs."""
-        # Complex logic to create a coherent representation of the UI
-        return {"fused_data": "..."}
+    def close(self):
+        """Shuts down the perception worker pools and releases shared frame buffers."""
+        if is_initialized(self, 'pipeline') and self.pipeline:
+            self.pipeline.shutdown()
+        if is_initialized(self, 'frame_ring') and self.frame_ring is not None:
+            self.frame_ring.close()
 
 
 if __name__ == '__main__':
@@ -124,14 +289,24 @@ if __name__ == '__main__':
     perception = PerceptionModule(config=config)
     print(f"Initialized for OS: {perception.os_type}")
 
-    screen_data = perception.capture_screen()
-    print(f"Screen capture data: {screen_data}")
+    frame = perception.capture_screen()
+    print(f"Screen capture: {frame}, PNG payload {len(frame.encode('png'))} bytes on demand")
 
     ui_elements = perception.get_ui_elements(window_title="Test Window")
     print(f"UI elements: {ui_elements}")
 
-    ocr_text = perception.ocr_screen_region(region=(0, 0, 100, 100))
-    print(f"OCR text: {ocr_text}")
+    ocr_result = perception.ocr_screen_region(region=(0, 0, 400, 200))
+    print(f"OCR text: {ocr_result['text']!r}")
 
     current_state = perception.get_current_state()
     print(f"Current state: {current_state}")
+
+    unchanged_state = perception.get_current_state()
+    print(f"Second state changed: {unchanged_state['changed']}")
+    perception.screen_capturer.draw((300, 200, 120, 40))
+    changed_state = perception.get_current_state()
+    print(f"After drawing, dirty regions: {changed_state['dirty_regions']}")
+    print(f"Found OK button: {perception.find_element_by_properties({'name': 'OK', 'type': 'button'})}")
+    print(f"Accessibility walks so far: {perception.ui_cache.walks}")
+    print(f"Visual summary: {changed_state['visual_summary']}, timed out: {changed_state['timed_out_modalities']}")
+    perception.close()
@@ -0,0 +1,161 @@
+# tech.md: 4.1. Perception Layer - Multi-Modal Fusion
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import numpy as np
+
+from .lazy import is_initialized, lazy_property
+from .ocr_cache import recognize_frame_tiles, recognize_tiles
+
+DEFAULT_MODALITY_TIMEOUTS_MS = {
+    "capture": 1000,
+    "ui_elements": 500,
+    "ocr": 2000,
+    "visual": 1000,
+}
+
+
+def analyze_pixels(pixels) -> dict:
+    """Cheap visual summary of a frame or array (module-level so process pools can call it)."""
+    sample = np.asarray(pixels)[::8, ::8]
+    sample = sample.reshape(-1, sample.shape[-1] if sample.ndim == 3 else 1)
+    # Quantize to 4 levels per channel and report the most common colors
+    quantized = (sample // 64).astype(np.int32)
+    codes = np.zeros(len(quantized), dtype=np.int32)
+    for channel in range(quantized.shape[1]):
+        codes = codes * 4 + quantized[:, channel]
+    values, counts = np.unique(codes, return_counts=True)
+    dominant = []
+    for code in values[np.argsort(-counts)[:3]]:
+        channels = []
+        for _ in range(quantized.shape[1]):
+            channels.append(int(code % 4) * 64 + 32)
+            code //= 4
+        dominant.append(channels[::-1])
+    return {"dominant_colors": dominant, "mean_brightness": float(sample.mean())}
+
+
+class PerceptionPipeline:
+    """
+    Runs the perception modalities concurrently. The screen capture and the
+    accessibility walk run on a thread pool; OCR of uncached tiles and image analysis
+    run on a process pool. Each modality has its own timeout, and a modality that
+    misses it is reported as timed out (its result is None) instead of stalling fusion.
+
+    A timed-out job that already started cannot be cancelled, so each modality has at
+    most one job in flight: while its previous job is still running, later frames
+    skip that modality (reported as timed out) instead of piling work onto the pools.
+    A late OCR job still stores its tiles in the cache when it finishes, so OCR slower
+    than its timeout only misses frames until the cache has caught up.
+    """
+
+    def __init__(self, perception, config: dict = None):
+        self.perception = perception
+        self.config = config if config else {}
+        self.timeouts_ms = dict(DEFAULT_MODALITY_TIMEOUTS_MS)
+        self.timeouts_ms.update(self.config.get('modality_timeouts_ms', {}))
+        self.thread_pool = ThreadPoolExecutor(
+            max_workers=self.config.get('perception_threads', 4), thread_name_prefix="horus-perception")
+        # 0 process workers runs the CPU-bound modalities on the thread pool instead
+        self.process_workers = self.config.get('perception_process_workers', 2)
+        self._in_flight = {}  # modality -> its last submitted future
+        self._in_flight_lock = threading.Lock()
+
+    @lazy_property
+    def process_pool(self):
+        if self.process_workers <= 0:
+            return self.thread_pool
+        context = multiprocessing.get_context(
+            self.config.get('perception_mp_start_method', 'spawn'))
+        return ProcessPoolExecutor(
+            max_workers=self.process_workers, mp_context=context)
+
+    def warm_up(self):
+        """Starts the worker processes now (spawning them costs hundreds of ms on first use)."""
+        for future in [self.process_pool.submit(time.sleep, 0.05) for _ in range(self.process_workers)]:
+            future.result()
+
+    def _submit(self, name: str, pool, fn, *args):
+        """Submits a modality's job, or returns None while its previous job is still running."""
+        with self._in_flight_lock:
+            previous = self._in_flight.get(name)
+            if previous is not None and not previous.done():
+                return None
+            future = self._in_flight[name] = pool.submit(fn, *args)
+            return future
+
+    def _wait(self, name: str, future, started: float, timed_out: list):
+        if future is None:
+            timed_out.append(name)
+            print(f"Perception: Modality '{name}' skipped, its previous job is still running.")
+            return None
+        remaining = self.timeouts_ms[name] / 1000.0 - (time.monotonic() - started)
+        try:
+            return future.result(timeout=max(remaining, 0))
+        except FutureTimeoutError:
+            future.cancel()
+            timed_out.append(name)
+            print(f"Perception: Modality '{name}' timed out after {self.timeouts_ms[name]} ms.")
+            return None
+
+    def capture(self, region=None):
+        """Grabs a Frame on the thread pool, honouring the capture timeout."""
+        timed_out = []
+        future = self._submit("capture", self.thread_pool, self.perception._grab_frame, region)
+        frame = self._wait("capture", future, time.monotonic(), timed_out)
+        return frame, timed_out
+
+    def run_modalities(self, frame, ocr_region=None) -> dict:
+        """
+        Runs the accessibility walk, OCR and visual analysis for an already captured
+        frame in parallel and returns their results plus the list of timed-out modalities.
+        Shared-memory frames are passed to the process pool by reference, not by value.
+        """
+        started = time.monotonic()
+        timed_out = []
+        ui_future = self._submit("ui_elements", self.thread_pool, self.perception.get_ui_elements)
+
+        ocr_frame = frame.region(ocr_region) if ocr_region else frame
+        tiled_ocr = self.perception.ocr_engine
+        tiles, resolved, missing = tiled_ocr.lookup(ocr_frame.pixels, ocr_frame.origin)
+        ocr_future = None
+        if missing and frame.shared:
+            ocr_future = self._submit("ocr", self.process_pool, recognize_frame_tiles,
+                                      tiled_ocr.engine, frame, [box for _, box, _ in missing])
+        elif missing:
+            ocr_future = self._submit("ocr", self.process_pool, recognize_tiles,
+                                      tiled_ocr.engine, [tile for _, _, tile in missing])
+        visual_future = self._submit("visual", self.process_pool, analyze_pixels,
+                                     frame if frame.shared else frame.pixels)
+
+        ui_elements = self._wait("ui_elements", ui_future, started, timed_out)
+        ocr_results = None
+        if not missing:
+            ocr_results = tiled_ocr.complete(tiles, resolved, [], [])
+        else:
+            recognized = self._wait("ocr", ocr_future, started, timed_out)
+            if recognized is not None:
+                ocr_results = tiled_ocr.complete(tiles, resolved, missing, recognized)
+            elif ocr_future is not None:
+                ocr_future.add_done_callback(
+                    lambda future: self._complete_late_ocr(tiled_ocr, tiles, resolved, missing, future))
+        visual = self._wait("visual", visual_future, started, timed_out)
+        return {"ui_elements": ui_elements, "ocr": ocr_results, "visual": visual,
+                "timed_out": timed_out, "elapsed_ms": (time.monotonic() - started) * 1000}
+
+    @staticmethod
+    def _complete_late_ocr(tiled_ocr, tiles, resolved, missing, future):
+        # Runs on the pool's thread once a timed-out OCR job finishes
+        if future.cancelled() or future.exception() is not None:
+            return
+        tiled_ocr.complete(tiles, resolved, missing, future.result())
+        print(f"Perception: Cached {len(missing)} OCR tile(s) from a late job.")
+
+    def shutdown(self):
+        self.thread_pool.shutdown(wait=False, cancel_futures=True)
+        if is_initialized(self, 'process_pool') and self.process_pool is not self.thread_pool:
+            self.process_pool.shutdown(wait=False, cancel_futures=True)
+            del self.process_pool
@@ -0,0 +1,246 @@
+# tech.md: 4.2. Decision Layer - Task Planning
+import copy
+import json
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+# Quoted strings and numbers in an instruction are treated as plan parameters
+_SLOT_PATTERN = re.compile(r"\"([^\"]*)\"|'([^']*)'|\b(\d+(?:\.\d+)?)\b")
+_NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+# A number parameter taken from slot i, e.g. {"x": "{#0}"}
+_NUMBER_SLOT_PATTERN = re.compile(r"\{#(\d+)\}")
+
+
+def normalize_instruction(instruction: str) -> str:
+    """Lower-cases and collapses whitespace; quoted text keeps its case."""
+    parts = []
+    last = 0
+    for match in re.finditer(r"\"[^\"]*\"|'[^']*'", instruction):
+        parts.append(instruction[last:match.start()].lower())
+        parts.append(match.group(0))
+        last = match.end()
+    parts.append(instruction[last:].lower())
+    return re.sub(r"\s+", " ", "".join(parts)).strip().rstrip(".!?")
+
+
+def extract_template(instruction: str) -> tuple:
+    """
+    Splits a normalized instruction into (template, slots): quoted strings and numbers
+    become numbered placeholders, e.g. `type "hi" 3 times` -> (`type {0} {1} times`, ["hi", "3"]).
+    """
+    slots = []
+
+    def replace(match):
+        slots.append(next(group for group in match.groups() if group is not None))
+        return f"{{{len(slots) - 1}}}"
+
+    return _SLOT_PATTERN.sub(replace, instruction), slots
+
+
+def _parameterize(value, slots: list, used: set):
+    """
+    Replaces slot values inside plan parameters with their placeholders: `{i}` inside
+    strings, and a whole-value `{#i}` for numbers. Indices of the slots found go to `used`.
+    """
+    if isinstance(value, str):
+        for index, slot in sorted(enumerate(slots), key=lambda item: -len(item[1])):
+            if slot:
+                value, count = re.subn(rf"(?<!\w){re.escape(slot)}(?!\w)", f"{{{index}}}", value)
+                if count:
+                    used.add(index)
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        for index, slot in enumerate(slots):
+            if _NUMBER_PATTERN.fullmatch(slot) and float(slot) == value:
+                used.add(index)
+                return f"{{#{index}}}"
+        return value
+    if isinstance(value, dict):
+        return {k: _parameterize(v, slots, used) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_parameterize(v, slots, used) for v in value]
+    return value
+
+
+def _instantiate(value, slots: list):
+    if isinstance(value, str):
+        number = _NUMBER_SLOT_PATTERN.fullmatch(value)
+        if number and int(number.group(1)) < len(slots):
+            slot = slots[int(number.group(1))]
+            return float(slot) if "." in slot else int(slot)
+        return re.sub(r"\{(\d+)\}", lambda m: slots[int(m.group(1))]
+                      if int(m.group(1)) < len(slots) else m.group(0), value)
+    if isinstance(value, dict):
+        return {k: _instantiate(v, slots) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_instantiate(v, slots) for v in value]
+    return value
+
+
+class PlanCache:
+    """
+    Cache of successful plans. Instructions are normalized and their quoted strings
+    and numbers abstracted into slots, so one entry serves every instruction with the
+    same template. A plan is only cached when every slot value appears in it (as
+    text or as a number parameter); otherwise a cached plan would replay the old
+    values for a new instruction. Entries expire after `plan_cache_ttl_s` and are
+    dropped when a plan they produced fails.
+
+    Lookups match the template exactly. Setting `plan_cache_similarity` also serves
+    templates whose embedding is at least that similar when an `encoder` is available;
+    this is off by default because bag-of-words embeddings cannot tell e.g. "turn on"
+    from "turn off".
+    """
+
+    def __init__(self, config: dict = None, encoder=None):
+        self.config = config if config else {}
+        self.encoder = encoder  # callable(list of texts) -> (n, dim) L2-normalized array
+        self.similarity_threshold = self.config.get('plan_cache_similarity')  # None: exact templates only
+        self.ttl_s = self.config.get('plan_cache_ttl_s', 7 * 24 * 3600)
+        self.max_entries = self.config.get('plan_cache_max_entries', 10000)
+        self.path = self.config.get('plan_cache_path')
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}  # template -> entry dict
+        self._matrix = None  # embeddings of self._order, rebuilt lazily
+        self._order = []
+        self._lock = threading.RLock()
+        if self.path and os.path.exists(self.path):
+            self.load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _embed(self, template: str):
+        return None if self.encoder is None else np.asarray(self.encoder([template])[0], dtype=np.float32)
+
+    def _expired(self, entry: dict, now: float) -> bool:
+        return self.ttl_s is not None and now - entry["created"] > self.ttl_s
+
+    def _find(self, template: str, slots: list, now: float):
+        """Returns (entry, match_kind, similarity) or (None, None, 0.0)."""
+        entry = self._entries.get(template)
+        if entry is not None:
+            if not self._expired(entry, now):
+                return entry, "exact", 1.0
+            self._remove(template)
+        if self.encoder is None or self.similarity_threshold is None or not self._entries:
+            return None, None, 0.0
+        if self._matrix is None:
+            self._order = list(self._entries)
+            self._matrix = np.stack([self._entries[t]["embedding"] for t in self._order])
+        scores = self._matrix @ self._embed(template)
+        for index in np.argsort(-scores):
+            if scores[index] < self.similarity_threshold:
+                break
+            candidate = self._entries[self._order[index]]
+            # A similar template is only usable if it takes the same number of parameters
+            if candidate["slot_count"] == len(slots) and not self._expired(candidate, now):
+                return candidate, "similar", float(scores[index])
+        return None, None, 0.0
+
+    def lookup(self, instruction: str):
+        """
+        Returns {"plan", "template", "match", "similarity"} with the plan instantiated
+        for this instruction's parameters, or None on a miss.
+        """
+        template, slots = extract_template(normalize_instruction(instruction))
+        now = time.time()
+        with self._lock:
+            entry, match, similarity = self._find(template, slots, now)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry["hits"] += 1
+            entry["last_used"] = now
+            plan = _instantiate(copy.deepcopy(entry["plan_template"]), slots)
+        return {"plan": plan, "template": entry["template"], "match": match, "similarity": similarity}
+
+    def store(self, instruction: str, plan: list) -> bool:
+        """
+        Stores a plan that succeeded for `instruction` as a parameterized template.
+        Returns False (nothing cached) when a slot value does not appear in the plan.
+        """
+        template, slots = extract_template(normalize_instruction(instruction))
+        used = set()
+        plan_template = _parameterize(copy.deepcopy(plan), slots, used)
+        if len(used) < len(slots):
+            missing = [slots[index] for index in range(len(slots)) if index not in used]
+            print(f"Decision: Not caching plan for '{template}', parameters {missing} not found in it.")
+            return False
+        embedding = self._embed(template)
+        with self._lock:
+            now = time.time()
+            self._entries[template] = {
+                "template": template, "plan_template": plan_template, "slot_count": len(slots),
+                "embedding": embedding, "created": now, "last_used": now, "hits": 0}
+            self._matrix = None
+            if len(self._entries) > self.max_entries:
+                self._remove(min(self._entries, key=lambda t: self._entries[t]["last_used"]))
+        if self.path:
+            self.save()
+        return True
+
+    def invalidate(self, instruction: str, failed_plan: list = None) -> bool:
+        """
+        Drops the entry serving `instruction` (if `failed_plan` is given, only when that
+        entry would produce this plan). Returns True if an entry was removed.
+        """
+        template, slots = extract_template(normalize_instruction(instruction))
+        with self._lock:
+            entry, _, _ = self._find(template, slots, time.time())
+            if entry is None:
+                return False
+            if failed_plan is not None and _instantiate(entry["plan_template"], slots) != failed_plan:
+                return False
+            self._remove(entry["template"])
+        if self.path:
+            self.save()
+        return True
+
+    def _remove(self, template: str):
+        self._entries.pop(template, None)
+        self._matrix = None
+
+    def save(self):
+        with self._lock:
+            entries = [{k: v for k, v in entry.items() if k != "embedding"}
+                       for entry in self._entries.values()]
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, self.path)
+
+    def load(self):
+        with open(self.path) as f:
+            entries = json.load(f)
+        with self._lock:
+            for entry in entries:
+                # Embeddings are not persisted; they are recomputed with the current encoder
+                entry["embedding"] = self._embed(entry["template"])
+                self._entries[entry["template"]] = entry
+            self._matrix = None
+        print(f"Decision: Loaded {len(entries)} cached plans from {self.path}")
+
+
+if __name__ == '__main__':
+    from .embeddings import HashingEmbeddingModel
+
+    print("Testing PlanCache...")
+    model = HashingEmbeddingModel()
+    cache = PlanCache({'plan_cache_similarity': 0.8}, encoder=model.encode)
+    cache.store('Type "hello" into Notepad', [
+        {"action": "open_app", "params": {"app_name": "notepad"}},
+        {"action": "type_text", "params": {"text": "hello"}}])
+    print(f"Exact template hit: {cache.lookup('type  \"good bye\" into notepad.')}")
+    cache.store('click at 100 200', [{"action": "click", "params": {"x": 100, "y": 200}}])
+    print(f"Number parameters: {cache.lookup('click at 640 480')['plan']}")
+    print(f"Stored without its parameter: {cache.store('wait 5 seconds', [{'action': 'wait', 'params': {}}])}")
+    print(f"Similar hit: {cache.lookup('please type \"hi\" into notepad')}")
+    print(f"Miss: {cache.lookup('shut down the computer')}")
+    print(f"Invalidated: {cache.invalidate('type \"x\" into notepad')}, entries left: {len(cache)}")
@@ -0,0 +1,199 @@
+# tech.md: 4.2. Decision Layer - Task Planning
+import asyncio
+import inspect
+import os
+import threading
+import time
+
+from .async_runtime import acquire_lock, run_sync
+from .input_backends import LOW_LEVEL_ACTIONS
+
+# Steps that send input to a display and must not interleave with other input there
+INPUT_ACTIONS = frozenset(LOW_LEVEL_ACTIONS) | {"open_app"}
+
+
+class InputLocks:
+    """One lock per display, so GUI input steps on the same display never interleave."""
+
+    def __init__(self, default_display: str = None):
+        self.default_display = default_display or os.environ.get("DISPLAY", "default")
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def for_step(self, step: dict):
+        display = step.get("params", {}).get("display") or step.get("display") or self.default_display
+        with self._guard:
+            return self._locks.setdefault(display, threading.Lock())
+
+
+def step_dependencies(step: dict, index: int, previous_id):
+    """
+    Returns the ids a step waits for, as strings like step ids (LLM plans often use
+    integer ids). Steps without "depends_on" keep the sequential default and wait for
+    the previous step; "depends_on": [] marks an independent step.
+    """
+    if "depends_on" not in step:
+        return [] if previous_id is None else [str(previous_id)]
+    depends_on = step["depends_on"]
+    if isinstance(depends_on, (str, int)):
+        depends_on = [depends_on]
+    return [str(dependency) for dependency in depends_on]
+
+
+class PlanScheduler:
+    """
+    Executes a plan as a dependency graph. Steps may carry an "id" (default: their
+    position) and "depends_on" (ids of earlier or later steps); every step whose
+    dependencies succeeded runs as soon as a slot is free, up to
+    `max_parallel_steps` at a time. Input steps (INPUT_ACTIONS) hold the per-display
+    input lock while they run. The plan may be a list or a (sync or async) stream of
+    steps; steps are scheduled as they arrive. After the first failure no new steps
+    are started.
+
+    `run_step(index, step)` may be a coroutine function (awaited on the loop) or a
+    plain function (run in a worker thread).
+    """
+
+    def __init__(self, run_step, config: dict = None, input_locks: InputLocks = None):
+        self.run_step = run_step  # callable(index, step) -> {"success": bool, ...}
+        self.config = config if config else {}
+        self.max_parallel_steps = self.config.get('max_parallel_steps', 4)
+        self.input_locks = input_locks if input_locks is not None else InputLocks(self.config.get('display'))
+
+    async def _run_locked(self, index: int, step: dict) -> dict:
+        lock = self.input_locks.for_step(step) if step.get("action") in INPUT_ACTIONS else None
+        if lock is not None:
+            await acquire_lock(lock)
+        try:
+            if inspect.iscoroutinefunction(self.run_step):
+                return await self.run_step(index, step)
+            return await asyncio.to_thread(self.run_step, index, step)
+        except Exception as e:
+            return {"success": False, "details": {"error": str(e)}}
+        finally:
+            if lock is not None:
+                lock.release()
+
+    def run(self, plan) -> dict:
+        """Synchronous wrapper around run_async()."""
+        return run_sync(self.run_async(plan))
+
+    async def run_async(self, plan) -> dict:
+        """
+        Returns {"steps", "step_results" (in plan order, executed steps only),
+        "executed_steps", "overall_success", "time_to_first_step_ms", "elapsed_ms"}.
+        """
+        started = time.monotonic()
+        events = asyncio.Queue()
+        slots = asyncio.Semaphore(self.max_parallel_steps)
+        feeder = asyncio.create_task(self._feed(plan, events))
+
+        async def run_one(index, step):
+            async with slots:
+                result = await self._run_locked(index, step)
+            await events.put(("done", (index, result)))
+
+        steps, waiting_on, tasks = [], {}, {}
+        results, done = {}, set()
+        failed = False
+        stream_open = True
+        first_step_ms = None
+        previous_id = None
+        try:
+            while (stream_open and not failed) or tasks:
+                kind, payload = await events.get()
+                if kind == "step":
+                    index = len(steps)
+                    step_id = str(payload.get("id", index))
+                    steps.append(payload)
+                    waiting_on[index] = set(step_dependencies(payload, index, previous_id))
+                    previous_id = step_id
+                elif kind == "done":
+                    index, result = payload
+                    tasks.pop(index)
+                    results[index] = result
+                    if result.get("success"):
+                        done.add(str(steps[index].get("id", index)))
+                    else:
+                        failed = True
+                elif kind == "feed_error":
+                    print(f"Decision: Plan stream failed: {payload}")
+                    failed = True
+                else:
+                    stream_open = False
+                if failed:
+                    continue
+                # Start every step whose dependencies have all succeeded
+                for index in list(waiting_on):
+                    if waiting_on[index] <= done:
+                        del waiting_on[index]
+                        if first_step_ms is None:
+                            first_step_ms = (time.monotonic() - started) * 1000
+                        tasks[index] = asyncio.create_task(run_one(index, steps[index]))
+        finally:
+            feeder.cancel()
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(feeder, *tasks.values(), return_exceptions=True)
+        if not failed and waiting_on:
+            # Dependencies that never arrived or form a cycle
+            for index in sorted(waiting_on):
+                missing = sorted(waiting_on[index] - done)
+                results[index] = {"success": False, "details": {"error": f"Unsatisfied dependencies: {missing}"}}
+            failed = True
+        return {"steps": steps,
+                "step_results": [results[i] for i in sorted(results)],
+                "executed_steps": [steps[i] for i in sorted(results)],
+                "overall_success": not failed,
+                "time_to_first_step_ms": first_step_ms,
+                "elapsed_ms": (time.monotonic() - started) * 1000}
+
+    @staticmethod
+    async def _feed(plan, events: asyncio.Queue):
+        """Moves steps from a list, iterator or async iterator onto the event queue."""
+        iterator = None
+        try:
+            if hasattr(plan, "__aiter__"):
+                iterator = aiter(plan)
+                async for step in iterator:
+                    await events.put(("step", step))
+            else:
+                iterator = iter(plan)
+                streamed = not isinstance(plan, (list, tuple))
+                end = object()
+                while True:
+                    # A streamed plan blocks while the model generates, so it is pulled in a thread
+                    step = await asyncio.to_thread(next, iterator, end) if streamed else next(iterator, end)
+                    if step is end:
+                        break
+                    await events.put(("step", step))
+        except Exception as e:
+            await events.put(("feed_error", e))
+        finally:
+            # Stop a streamed plan that is no longer needed
+            try:
+                if hasattr(iterator, "aclose"):
+                    await iterator.aclose()
+                elif hasattr(iterator, "close"):
+                    iterator.close()
+            except (RuntimeError, ValueError):
+                pass  # still running in a worker thread; it stops when the thread finishes
+        await events.put(("end", None))
+
+
+if __name__ == '__main__':
+    print("Testing PlanScheduler...")
+
+    def run_step(index, step):
+        time.sleep(step["params"].get("duration_s", 0.05))
+        return {"success": True, "details": {"step": index}}
+
+    plan = [{"id": "fetch_a", "action": "wait", "params": {"duration_s": 0.2}, "depends_on": []},
+            {"id": "fetch_b", "action": "wait", "params": {"duration_s": 0.2}, "depends_on": []},
+            {"id": "click", "action": "click", "params": {"x": 1, "y": 1}, "depends_on": []},
+            {"id": "type", "action": "type_text", "params": {"text": "x"}},
+            {"id": "submit", "action": "press_key", "params": {"key_name": "enter"},
+             "depends_on": ["fetch_a", "fetch_b", "type"]}]
+    result = PlanScheduler(run_step).run(plan)
+    print(f"Success: {result['overall_success']}, {len(result['step_results'])} steps in "
+          f"{result['elapsed_ms']:.0f} ms (sequential would be ~550 ms)")
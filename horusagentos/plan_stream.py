@@ -0,0 +1,92 @@
+# tech.md: 4.2. Decision Layer - Task Planning
+import json
+
+# Step actions the planner may emit, and the parameter each one requires
+PLAN_ACTIONS = {
+    "find_element": None,
+    "click": None,
+    "type_text": "text",
+    "press_key": "key_name",
+    "scroll": None,
+    "open_app": "app_name",
+    "wait": None,
+}
+
+
+def validate_step(step) -> str:
+    """Returns an error message for a malformed plan step, or "" if it is usable."""
+    if not isinstance(step, dict) or not isinstance(step.get("action"), str):
+        return "step is not an object with an 'action'"
+    params = step.get("params", {})
+    if not isinstance(params, dict):
+        return "'params' is not an object"
+    # Same forms as plan_scheduler.step_dependencies: a list, or a single str or int id
+    depends_on = step.get("depends_on", [])
+    if not isinstance(depends_on, (list, str, int)) or isinstance(depends_on, bool):
+        return "'depends_on' is not a list of step ids"
+    if step["action"] in PLAN_ACTIONS:
+        required = PLAN_ACTIONS[step["action"]]
+        if required and required not in params:
+            return f"'{step['action']}' requires params.{required}"
+    return ""
+
+
+class PlanStreamParser:
+    """
+    Incremental parser for a JSON array of plan steps arriving in arbitrary text
+    chunks. `feed` returns every step object completed by the chunk, so execution can
+    start on step 1 while the rest of the array is still being generated.
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._started = False
+        self.finished = False
+        self.steps_parsed = 0
+
+    def feed(self, text: str) -> list:
+        steps = []
+        for char in text:
+            if self.finished:
+                break
+            if not self._started:
+                # Skip any prose before the array
+                self._started = char == "["
+                continue
+            if self._depth > 0:
+                self._buffer.append(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 0:
+                    self._buffer = [char]
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 0 and char == "]":
+                    self.finished = True
+                    continue
+                self._depth -= 1
+                if self._depth == 0:
+                    steps.append(json.loads("".join(self._buffer)))
+                    self._buffer = []
+        self.steps_parsed += len(steps)
+        return steps
+
+
+if __name__ == '__main__':
+    print("Testing PlanStreamParser...")
+    text = 'Here is the plan: [{"action": "click", "params": {"x": 1, "y": 2}}, {"action": "type_text", "params": {"text": "a } tricky ]\\" string"}}]'
+    parser = PlanStreamParser()
+    for start in range(0, len(text), 7):
+        for step in parser.feed(text[start:start + 7]):
+            print(f"After {start + 7:3d} chars: {step} (valid: {not validate_step(step)})")
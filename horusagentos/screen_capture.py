@@ -0,0 +1,72 @@
+# tech.md: 4.1. Perception Layer - Screen Analysis
+import threading
+
+import numpy as np
+# Potential future imports: mss
+
+
+class MockScreenCapturer:
+    """
+    In-memory stand-in for a screen grabber. The "screen" is a static synthetic
+    frame that only changes when `draw` is called, which makes change detection
+    observable without a display.
+    """
+
+    def __init__(self, resolution: tuple = (1920, 1080)):
+        width, height = resolution
+        self.resolution = (width, height)
+        self._pixels = np.zeros((height, width, 3), dtype=np.uint8)
+        # A few static "windows" so the frame is not uniform
+        self._pixels[40:height - 40, 40:width // 2] = (230, 230, 230)
+        self._pixels[80:140, 80:width // 2 - 40] = (60, 120, 200)
+
+    def draw(self, region: tuple, color: tuple = (255, 255, 255)):
+        """Paints a [x, y, width, height] rectangle, simulating a UI change."""
+        x, y, w, h = region
+        self._pixels[y:y + h, x:x + w] = color
+
+    def grab(self, region: tuple = None, out: np.ndarray = None) -> np.ndarray:
+        """
+        Returns an (h, w, 3) uint8 RGB copy of the screen or of a [x, y, width, height]
+        region, written into `out` when given (e.g. a shared-memory frame buffer).
+        """
+        source = self._pixels
+        if region:
+            x, y, w, h = region
+            source = source[y:y + h, x:x + w]
+        if out is None:
+            return source.copy()
+        np.copyto(out, source)
+        return out
+
+
+class MSSScreenCapturer:
+    """
+    Screen grabber backed by the `mss` library (imported on construction). mss handles
+    are bound to the thread that created them, so each grabbing thread gets its own.
+    """
+
+    def __init__(self, monitor_index: int = 1):
+        import mss
+        self._mss_factory = mss.mss
+        self._local = threading.local()
+        self.monitor = self._handle().monitors[monitor_index]
+        self.resolution = (self.monitor["width"], self.monitor["height"])
+
+    def _handle(self):
+        handle = getattr(self._local, "mss", None)
+        if handle is None:
+            handle = self._local.mss = self._mss_factory()
+        return handle
+
+    def grab(self, region: tuple = None, out: np.ndarray = None) -> np.ndarray:
+        monitor = self.monitor
+        if region:
+            x, y, w, h = region
+            monitor = {"left": self.monitor["left"] + x, "top": self.monitor["top"] + y,
+                       "width": w, "height": h}
+        shot = np.asarray(self._handle().grab(monitor))  # BGRA
+        if out is None:
+            return np.ascontiguousarray(shot[:, :, 2::-1])
+        np.copyto(out, shot[:, :, 2::-1])
+        return out
@@ -0,0 +1,288 @@
+# tech.md: 4.5. Communication Layer - External Services
+import asyncio
+import http.client
+import json
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode, urlsplit
+
+from .http_pool import AsyncHTTPConnectionPool, HTTPConnectionPool, HTTPResponse
+
+# HTTP methods whose responses may be cached without opting in per service method
+IDEMPOTENT_HTTP_METHODS = ("GET", "HEAD")
+
+
+class RateLimiter:
+    """
+    Token bucket: `rate_per_s` calls per second with bursts of up to `burst`. Callers
+    reserve a token and wait until it is theirs, so concurrent callers queue fairly.
+    """
+
+    def __init__(self, rate_per_s: float, burst: int = None):
+        self.rate_per_s = rate_per_s
+        self.burst = burst if burst is not None else max(1, int(rate_per_s))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Takes a token and returns how long to wait (seconds) before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate_per_s)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate_per_s
+
+    def acquire(self):
+        wait_s = self.reserve()
+        if wait_s:
+            time.sleep(wait_s)
+
+    async def acquire_async(self):
+        wait_s = self.reserve()
+        if wait_s:
+            await asyncio.sleep(wait_s)
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing service: after `failure_threshold` consecutive failures
+    the circuit opens and calls fail fast; after `reset_timeout_s` one trial call is
+    let through (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout_s: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout_s:
+                self.state = "half_open"  # this caller makes the trial call
+                return True
+            return False
+
+    def record(self, success: bool):
+        with self._lock:
+            if success:
+                self.state, self.failures = "closed", 0
+                return
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+class _TTLCache:
+    """Bounded LRU of responses that expire `ttl_s` seconds after they were stored."""
+
+    def __init__(self, ttl_s: float, max_entries: int = 1024):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_s, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class _Service:
+    """A registered service with its limits, breaker and cache."""
+
+    def __init__(self, name: str, details: dict):
+        self.name = name
+        self.details = details
+        self.base_url = details.get("base_url", "").rstrip("/")
+        self.headers = details.get("headers", {})
+        self.timeout_s = details.get("timeout_s")
+        rate = details.get("rate_limit_per_s")
+        self.limiter = RateLimiter(rate, details.get("burst")) if rate else None
+        self.breaker = CircuitBreaker(details.get("failure_threshold", 5), details.get("reset_timeout_s", 30.0))
+        ttl = details.get("cache_ttl_s")
+        self.cache = _TTLCache(ttl, details.get("cache_max_entries", 1024)) if ttl else None
+        self.cache_methods = set(details.get("cache_methods", []))
+
+    def http_method(self, method: str, params) -> str:
+        per_method = self.details.get("methods", {}).get(method, {})
+        return per_method.get("http_method") or self.details.get("http_method") or ("POST" if params else "GET")
+
+
+class ServiceClient:
+    """
+    Client for the external HTTP services registered with register(). All services
+    share keep-alive pools keyed by host, so a plan calling several APIs on one host
+    pays one handshake for that host, not one per call or per service. Per service:
+
+    - `rate_limit_per_s` / `burst`: calls wait for a token-bucket slot.
+    - `failure_threshold` / `reset_timeout_s`: a circuit breaker fails calls fast
+      while the service is down (connection errors, timeouts, 5xx and 429 count).
+    - `cache_ttl_s`: opt-in response cache for GET/HEAD calls and the service
+      methods listed in `cache_methods`.
+
+    call() blocks; call_async() and call_many_async() (fan-out) run on asyncio, with at
+    most `max_connections_per_host` requests in flight per host so that a large
+    fan-out reuses a bounded set of connections instead of opening one per call.
+    """
+
+    def __init__(self, config: dict = None, pool: HTTPConnectionPool = None,
+                 async_pool: AsyncHTTPConnectionPool = None):
+        self.config = config if config else {}
+        max_connections = self.config.get('max_connections_per_host', 8)
+        timeout_s = self.config.get('timeout_s', 10.0)
+        self.pool = pool if pool is not None else HTTPConnectionPool(max_connections, timeout_s)
+        self.async_pool = async_pool if async_pool is not None else AsyncHTTPConnectionPool(max_connections, timeout_s)
+        self.max_connections_per_host = max_connections
+        self.services = {}
+        self._host_slots = {}  # (event loop, host) -> asyncio.Semaphore
+
+    def register(self, name: str, details: dict):
+        self.services[name] = _Service(name, details)
+
+    def _prepare(self, service_name: str, method: str, params):
+        """Returns (service, cache key, cached result or None, request arguments)."""
+        service = self.services.get(service_name)
+        if service is None:
+            raise KeyError(service_name)
+        http_method = service.http_method(method, params)
+        url = f"{service.base_url}/{method.lstrip('/')}" if method else service.base_url
+        body = params
+        if http_method in ("GET", "HEAD", "DELETE") and params:
+            url += ("&" if "?" in url else "?") + urlencode(params, doseq=True)
+            body = None
+        key = None
+        if service.cache is not None and (http_method in IDEMPOTENT_HTTP_METHODS or method in service.cache_methods):
+            key = (method, http_method, json.dumps(params, sort_keys=True, default=str))
+            cached = service.cache.get(key)
+            if cached is not None:
+                return service, key, dict(cached, cached=True), None
+        return service, key, None, (http_method, url, body, service.headers, service.timeout_s)
+
+    @staticmethod
+    def _blocked(service: _Service) -> dict:
+        return {"success": False, "error": f"Circuit open for '{service.name}' "
+                                           f"(retry after {service.breaker.reset_timeout_s} s)."}
+
+    @staticmethod
+    def _finish(service: _Service, key, response: HTTPResponse = None, error: Exception = None) -> dict:
+        if error is not None:
+            service.breaker.record(False)
+            return {"success": False, "error": f"{type(error).__name__}: {error}"}
+        service.breaker.record(response.status < 500 and response.status != 429)
+        try:
+            data = response.json()
+        except ValueError:
+            data = response.body.decode("utf-8", "replace")
+        result = {"success": response.ok, "status": response.status, "data": data}
+        if key is not None and response.ok:
+            service.cache.put(key, result)
+        return result
+
+    def call(self, service_name: str, method: str, params: dict = None) -> dict:
+        """Calls `<base_url>/<method>` of a registered service; returns {"success", "status", "data"} or {"success", "error"}."""
+        service, key, cached, request = self._prepare(service_name, method, params)
+        if cached is not None:
+            return cached
+        if not service.breaker.allow():
+            return self._blocked(service)
+        try:
+            if service.limiter is not None:
+                service.limiter.acquire()
+            response = self.pool.request(*request[:3], headers=request[3], timeout_s=request[4])
+        except (OSError, ValueError, http.client.HTTPException) as e:  # connection errors, timeouts, malformed responses
+            return self._finish(service, key, error=e)
+        except BaseException:
+            # The breaker let this call through, so it must hear the outcome or stay half-open
+            service.breaker.record(False)
+            raise
+        return self._finish(service, key, response)
+
+    async def call_async(self, service_name: str, method: str, params: dict = None) -> dict:
+        """call() on asyncio; many calls share the async pool's keep-alive connections."""
+        service, key, cached, request = self._prepare(service_name, method, params)
+        if cached is not None:
+            return cached
+        if not service.breaker.allow():
+            return self._blocked(service)
+        slots_key = (asyncio.get_running_loop(), urlsplit(request[1]).netloc)
+        slots = self._host_slots.get(slots_key)
+        if slots is None:
+            slots = self._host_slots[slots_key] = asyncio.Semaphore(self.max_connections_per_host)
+        try:
+            if service.limiter is not None:
+                await service.limiter.acquire_async()
+            async with slots:
+                response = await self.async_pool.request(*request[:3], headers=request[3], timeout_s=request[4])
+        except (OSError, ValueError, asyncio.IncompleteReadError, http.client.HTTPException) as e:
+            return self._finish(service, key, error=e)
+        except BaseException:  # e.g. a cancelled trial call
+            service.breaker.record(False)
+            raise
+        return self._finish(service, key, response)
+
+    async def call_many_async(self, calls) -> list:
+        """Fans out (service_name, method, params) calls concurrently; results in call order."""
+        return list(await asyncio.gather(*(self.call_async(*call) for call in calls)))
+
+    def call_many(self, calls) -> list:
+        """Synchronous wrapper around call_many_async()."""
+        from .async_runtime import run_sync
+        return run_sync(self.call_many_async(list(calls)))
+
+    def close(self):
+        self.pool.close()
+        self.async_pool.close()
+
+
+if __name__ == '__main__':
+    from .mock_service_server import MockServiceServer
+
+    print("Testing ServiceClient...")
+    server = MockServiceServer(latency_ms=50).start()
+    client = ServiceClient()
+    client.register("Weather", {"base_url": server.base_url + "/weather", "http_method": "GET", "cache_ttl_s": 60})
+    client.register("Calendar", {"base_url": server.base_url + "/calendar", "rate_limit_per_s": 20, "burst": 5})
+    client.register("Flaky", {"base_url": server.base_url, "failure_threshold": 3, "reset_timeout_s": 0.2})
+
+    print(f"GET: {client.call('Weather', 'current', {'city': 'London'})}")
+    print(f"Cached: {client.call('Weather', 'current', {'city': 'London'}).get('cached', False)}")
+
+    calls = [("Weather", "forecast", {"city": f"City{i}"}) for i in range(10)] + \
+            [("Calendar", "events", {"day": i}) for i in range(10)]
+    for _ in range(2):
+        started = time.monotonic()
+        results = client.call_many(calls)
+        print(f"Fan-out of {len(calls)} calls (50 ms each, Calendar limited to 20/s after a burst of 5): "
+              f"{sum(r['success'] for r in results)} ok in {(time.monotonic() - started) * 1000:.0f} ms, "
+              f"{server.stats['connections']} connections so far")
+
+    outcomes = [client.call("Flaky", "fail") for _ in range(5)]
+    print(f"Flaky service: {[o.get('status', o.get('error')) for o in outcomes]}")
+    time.sleep(0.25)
+    print(f"After reset timeout, trial call: {client.call('Flaky', 'ok')['success']}, "
+          f"breaker {client.services['Flaky'].breaker.state}")
+    print(f"Server stats: {server.stats}")
+    client.close()
+    server.stop()
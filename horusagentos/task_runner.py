@@ -0,0 +1,310 @@
+# tech.md: 5. Core Agent Class (Conceptual) - Task Scheduling
+import atexit
+import itertools
+import multiprocessing
+# Imported up front so its exit hook, which joins child processes, is registered
+# before (and so runs after) TaskRunner's own exit hook that stops the workers
+import multiprocessing.util
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+
+class TaskRejected(RuntimeError):
+    """Raised by TaskRunner.submit when the queue stays full (backpressure) or the runner is closed."""
+
+
+class TaskTimeout(TimeoutError):
+    """Set on a task's future when it exceeded its timeout; the worker running it is restarted."""
+
+
+class XvfbDisplay:
+    """
+    A virtual X display for one worker. Starts `Xvfb :N` when the binary is available
+    and `start` is set; otherwise the display name is only exported as DISPLAY.
+    """
+
+    def __init__(self, number: int, resolution: str = "1920x1080x24", start: bool = True):
+        self.name = f":{number}"
+        self.process = None
+        if start and shutil.which("Xvfb"):
+            self.process = subprocess.Popen(["Xvfb", self.name, "-screen", "0", resolution, "-nolisten", "tcp"],
+                                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait(5)
+
+
+def _worker_main(connection, llm_provider_config: dict, agent_config: dict, display: str, quiet: bool):
+    """Worker process: one HorusAgentOS (its own Perception/Action pair) per display."""
+    if display:
+        os.environ["DISPLAY"] = display
+    if quiet:
+        sys.stdout = open(os.devnull, "w")
+    from .agent import HorusAgentOS
+    from .lazy import is_initialized
+    agent = HorusAgentOS(llm_provider_config, agent_config)
+    connection.send(("ready", None, None))
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        task_id, instruction = message
+        try:
+            summary = agent.execute_task(instruction)
+            # The parent kills workers whose task times out: persist this task's memory first
+            if is_initialized(agent, 'memory_module'):
+                agent.memory_module.flush()
+            connection.send(("result", task_id, summary))
+        except Exception as e:
+            connection.send(("error", task_id, f"{type(e).__name__}: {e}"))
+    # Worker processes exit without running atexit hooks: flush memory and stop the pools here
+    for name in ('memory_module', 'perception_module'):
+        if is_initialized(agent, name):
+            getattr(agent, name).close()
+
+
+class _Task:
+    __slots__ = ("task_id", "instruction", "timeout_s", "future", "submitted")
+
+    def __init__(self, task_id: int, instruction: str, timeout_s: float):
+        self.task_id = task_id
+        self.instruction = instruction
+        self.timeout_s = timeout_s
+        self.future = Future()
+        self.submitted = time.monotonic()
+
+
+class _Worker:
+    """Parent-side handle of one worker process and the thread that feeds it tasks."""
+
+    def __init__(self, runner, index: int, display):
+        self.runner = runner
+        self.index = index
+        self.display = display
+        self.process = None
+        self.connection = None
+        self.current = None
+        self.thread = threading.Thread(target=self._run, name=f"horus-task-worker-{index}", daemon=True)
+
+    def _start_process(self):
+        runner = self.runner
+        parent_end, child_end = runner._context.Pipe()
+        # Not a daemon: the agent's perception pipeline starts its own process pool
+        self.process = runner._context.Process(
+            target=_worker_main, name=f"horus-agent-{self.index}",
+            args=(child_end, runner.llm_provider_config, runner.worker_agent_config(self.index),
+                  self.display.name if self.display else None, runner.quiet_workers))
+        self.process.start()
+        child_end.close()
+        self.connection = parent_end
+        if not parent_end.poll(runner.startup_timeout_s):
+            raise RuntimeError(f"Worker {self.index} did not start within {runner.startup_timeout_s} s")
+        parent_end.recv()
+
+    def _stop_process(self, kill: bool = False):
+        if self.process is None:
+            return
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.connection.send(None)
+            except OSError:
+                pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.connection.close()
+        self.process = None
+
+    def _run(self):
+        runner = self.runner
+        while True:
+            _, _, task = runner._queue.get()
+            if task is None:
+                break
+            if not task.future.set_running_or_notify_cancel():
+                continue
+            try:
+                if self.process is None:
+                    self._start_process()
+                self.current = task
+                self.connection.send((task.task_id, task.instruction))
+                if not self.connection.poll(task.timeout_s):
+                    # A stuck GUI task cannot be interrupted in place: replace the worker
+                    self._stop_process(kill=True)
+                    runner._count("timed_out", "restarts")
+                    task.future.set_exception(TaskTimeout(
+                        f"Task {task.task_id} exceeded {task.timeout_s} s: {task.instruction!r}"))
+                    continue
+                kind, _, payload = self.connection.recv()
+                if kind == "result":
+                    runner._count("completed")
+                    task.future.set_result(payload)
+                else:
+                    runner._count("failed")
+                    task.future.set_exception(RuntimeError(payload))
+            except (EOFError, OSError, RuntimeError) as e:
+                # The worker died (or never started); the next task gets a fresh one
+                self._stop_process(kill=True)
+                runner._count("failed", "restarts")
+                if not task.future.done():
+                    task.future.set_exception(RuntimeError(f"Worker {self.index} failed: {e}"))
+            finally:
+                self.current = None
+        self._stop_process()
+
+
+class TaskRunner:
+    """
+    Runs a stream of instructions across a pool of agent worker processes, each with
+    its own display (a separate Xvfb session when `xvfb` is set, or one of `displays`)
+    and therefore its own Perception/Action pair.
+
+    - submit() returns a Future resolving to the execute_task summary.
+    - Lower `priority` runs first (0 is the default; negative is urgent); equal
+      priorities run in submission order.
+    - At most `max_queued` tasks wait; submit blocks (or raises TaskRejected with
+      block=False / after `queue_timeout_s`) when the queue is full.
+    - `task_timeout_s` (or the per-task timeout) bounds each run; a task that exceeds
+      it fails with TaskTimeout and its worker process is replaced.
+
+    Workers share `agent_config`, including the memory database; each worker's SQLite
+    store assigns IDs from its own stride so concurrent writers never collide. Worker
+    processes are stopped by close(), which also runs at interpreter exit.
+    """
+
+    def __init__(self, llm_provider_config: dict, agent_config: dict = None, config: dict = None):
+        self.llm_provider_config = llm_provider_config
+        self.agent_config = agent_config if agent_config else {}
+        self.config = config if config else {}
+        self.task_timeout_s = self.config.get('task_timeout_s', 300)
+        self.startup_timeout_s = self.config.get('worker_startup_timeout_s', 60)
+        self.quiet_workers = self.config.get('quiet_workers', False)
+        self._context = multiprocessing.get_context(self.config.get('start_method', 'spawn'))
+        self._queue = queue.PriorityQueue(self.config.get('max_queued', 1000))
+        self._ids = itertools.count(1)
+        self._stats_lock = threading.Lock()
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "timed_out": 0, "restarts": 0}
+        self._closed = False
+
+        displays = self.config.get('displays')
+        worker_count = self.config.get('workers', len(displays) if displays else 2)
+        if self.config.get('xvfb'):
+            base = self.config.get('xvfb_base_display', 99)
+            self.displays = [XvfbDisplay(base + i, self.config.get('xvfb_resolution', "1920x1080x24"))
+                             for i in range(worker_count)]
+        elif displays:
+            self.displays = [XvfbDisplay(int(str(name).lstrip(":")), start=False) for name in displays]
+        else:
+            self.displays = [None] * worker_count
+        self.worker_count = worker_count
+        self.workers = [_Worker(self, i, self.displays[i]) for i in range(worker_count)]
+        for worker in self.workers:
+            worker.thread.start()
+        atexit.register(self.close, cancel_pending=True)
+        print(f"TaskRunner: {worker_count} worker(s) on displays "
+              f"{[d.name if d else None for d in self.displays]}")
+
+    def worker_agent_config(self, index: int) -> dict:
+        """agent_config for one worker; its SQLite memory IDs are offset by its index, strided by the worker count."""
+        agent_config = dict(self.agent_config)
+        memory_config = dict(agent_config.get('memory_config') or {})
+        sqlite_config = dict(memory_config.get('sqlite_config') or {})
+        sqlite_config.update(id_stride=self.worker_count, id_offset=index)
+        memory_config['sqlite_config'] = sqlite_config
+        agent_config['memory_config'] = memory_config
+        return agent_config
+
+    def _count(self, *keys):
+        with self._stats_lock:
+            for key in keys:
+                self.stats[key] += 1
+
+    def submit(self, instruction: str, priority: int = 0, timeout_s: float = None,
+               block: bool = True, queue_timeout_s: float = None) -> Future:
+        """Queues an instruction and returns a Future for its task summary."""
+        if self._closed:
+            raise TaskRejected("TaskRunner is closed")
+        task = _Task(next(self._ids), instruction, timeout_s if timeout_s is not None else self.task_timeout_s)
+        try:
+            self._queue.put((priority, task.task_id, task), block, queue_timeout_s)
+        except queue.Full:
+            raise TaskRejected(f"Task queue is full ({self._queue.maxsize} waiting)")
+        self._count("submitted")
+        return task.future
+
+    def submit_stream(self, instructions, priority: int = 0, timeout_s: float = None):
+        """Submits instructions as they are produced, blocking while the queue is full; yields the futures."""
+        for instruction in instructions:
+            yield self.submit(instruction, priority, timeout_s)
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def close(self, cancel_pending: bool = False):
+        """Stops the workers once queued tasks are done (or cancels them) and stops any Xvfb sessions."""
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        if cancel_pending:
+            while True:
+                try:
+                    _, _, task = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if task is not None:
+                    task.future.cancel()
+        for _ in self.workers:
+            self._queue.put((float("inf"), 0, None))
+        for worker in self.workers:
+            worker.thread.join()
+        for display in self.displays:
+            if display is not None:
+                display.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+if __name__ == '__main__':
+    from concurrent.futures import as_completed
+
+    print("Testing TaskRunner...")
+    import tempfile
+
+    # Workers run the default perception pipeline and share one SQLite memory
+    agent_config = {'memory_config': {'db_type': 'sqlite', 'db_path': os.path.join(tempfile.mkdtemp(), 'memory.db')}}
+    started = time.monotonic()
+    with TaskRunner({"provider": "mock"}, agent_config, {"workers": 2, "quiet_workers": True,
+                                                         "max_queued": 4, "task_timeout_s": 30}) as runner:
+        futures = list(runner.submit_stream(f'Type "hello {i}"' for i in range(6)))
+        urgent = runner.submit('Type "hello urgent"', priority=-1)
+        stuck = runner.submit('Type "hello stuck"', timeout_s=0.001)
+        for future in as_completed(futures + [urgent]):
+            print(f"Task finished: {future.result()['status']}")
+        try:
+            stuck.result()
+        except TaskTimeout as e:
+            print(f"Timed out as expected: {e}")
+    print(f"Stats: {runner.stats} in {time.monotonic() - started:.1f} s")
+    from .experience_store import SQLiteExperienceStore
+    store = SQLiteExperienceStore(agent_config['memory_config']['db_path'])
+    print(f"Experiences stored by the workers: {store.count()}")
+    store.close()
@@ -0,0 +1,134 @@
+# tech.md: 4.3. Action Layer - GUI Interaction Engine
+import asyncio
+import time
+
+
+def _find_fresh(perception, properties: dict, window_title):
+    # Every poll must see the live tree: drop the cached one so the lookup re-walks it
+    perception.ui_cache.invalidate(window_title)
+    return perception.find_element_by_properties(properties, window_title)
+
+
+def element_appears(properties: dict, window_title=None):
+    """Settle condition: an element matching `properties` is present."""
+    def condition(perception):
+        return _find_fresh(perception, properties, window_title) is not None
+    return condition
+
+
+def element_disappears(properties: dict, window_title=None):
+    """Settle condition: no element matches `properties` any more."""
+    def condition(perception):
+        return _find_fresh(perception, properties, window_title) is None
+    return condition
+
+
+class SettleDetector:
+    """
+    Waits until the UI has settled after an action instead of sleeping a fixed time.
+
+    The screen is fingerprinted every `settle_poll_ms`; the UI counts as settled once
+    `settle_stable_polls` consecutive fingerprints are unchanged and no accessibility
+    event arrived in that window (after at least `settle_min_wait_ms`, which can be
+    raised per action type via `settle_min_wait_ms_by_action`). An explicit condition,
+    e.g. `element_appears(...)`, replaces the stability check. `settle_timeout_ms`
+    bounds every wait.
+    """
+
+    def __init__(self, perception, config: dict = None):
+        self.perception = perception
+        self.config = config if config else {}
+        self.poll_s = self.config.get('settle_poll_ms', 15) / 1000.0
+        self.stable_polls = self.config.get('settle_stable_polls', 2)
+        self.timeout_ms = self.config.get('settle_timeout_ms', 3000)
+        self.min_wait_ms = self.config.get('settle_min_wait_ms', 20)
+        self.min_wait_ms_by_action = {'open_app': 500}
+        self.min_wait_ms_by_action.update(self.config.get('settle_min_wait_ms_by_action', {}))
+
+    def wait(self, action_type: str = None, condition=None, timeout_ms: float = None) -> dict:
+        """
+        Blocks until the UI is settled, the condition holds, or the timeout expires.
+        Returns {"settled", "reason": "stable"|"condition"|"timeout", "waited_ms", "polls"}.
+        """
+        state = self._begin(action_type, timeout_ms)
+        while True:
+            state["poll_started"] = time.monotonic()
+            result = self._evaluate(state, self._observe(condition), condition is not None)
+            if result is not None:
+                return result
+            time.sleep(self._pause(state))
+
+    async def wait_async(self, action_type: str = None, condition=None, timeout_ms: float = None) -> dict:
+        """Like wait(), polling in a worker thread and sleeping without blocking the event loop."""
+        state = self._begin(action_type, timeout_ms)
+        while True:
+            state["poll_started"] = time.monotonic()
+            observation = await asyncio.to_thread(self._observe, condition)
+            result = self._evaluate(state, observation, condition is not None)
+            if result is not None:
+                return result
+            await asyncio.sleep(self._pause(state))
+
+    def _begin(self, action_type: str, timeout_ms: float) -> dict:
+        started = time.monotonic()
+        return {"started": started, "poll_started": started, "previous": None, "stable": 0, "polls": 0,
+                "deadline": started + (timeout_ms if timeout_ms is not None else self.timeout_ms) / 1000.0,
+                "min_wait_s": self.min_wait_ms_by_action.get(action_type, self.min_wait_ms) / 1000.0}
+
+    def _observe(self, condition):
+        if condition is not None:
+            return condition(self.perception)
+        return self.perception.frame_fingerprint()
+
+    def _evaluate(self, state: dict, observation, is_condition: bool):
+        """Folds one poll into the wait state; returns the final result once the wait is over."""
+        poll_started = state["poll_started"]
+        state["polls"] += 1
+        if is_condition:
+            if observation:
+                return self._result(True, "condition", state["started"], state["polls"])
+        else:
+            previous = state["previous"]
+            changed = previous is None or observation.changed_tiles(previous).any()
+            event_age = poll_started - getattr(self.perception, 'last_accessibility_event', 0.0)
+            if changed or event_age < self.poll_s * self.stable_polls:
+                state["stable"] = 0
+            else:
+                state["stable"] += 1
+            state["previous"] = observation
+            if state["stable"] >= self.stable_polls and poll_started - state["started"] >= state["min_wait_s"]:
+                return self._result(True, "stable", state["started"], state["polls"])
+        if poll_started >= state["deadline"]:
+            return self._result(False, "timeout", state["started"], state["polls"])
+        return None
+
+    def _pause(self, state: dict) -> float:
+        return max(0.0, min(self.poll_s - (time.monotonic() - state["poll_started"]),
+                            state["deadline"] - time.monotonic()))
+
+    @staticmethod
+    def _result(settled: bool, reason: str, started: float, polls: int) -> dict:
+        return {"settled": settled, "reason": reason,
+                "waited_ms": (time.monotonic() - started) * 1000, "polls": polls}
+
+
+if __name__ == '__main__':
+    import threading
+
+    from .perception_module import PerceptionModule
+
+    print("Testing SettleDetector...")
+    perception = PerceptionModule({'parallel_perception': False, 'shared_frames': False})
+    detector = SettleDetector(perception)
+    print(f"Static screen: {detector.wait('click')}")
+
+    def animate():
+        # A "slow app" repainting for ~200 ms
+        for step in range(10):
+            perception.screen_capturer.draw((400 + step * 10, 400, 10, 10), (255, 0, 0))
+            time.sleep(0.02)
+
+    threading.Thread(target=animate).start()
+    print(f"Animating screen: {detector.wait('click')}")
+    print(f"Condition: {detector.wait(condition=element_appears({'name': 'OK'}))}")
+    perception.close()
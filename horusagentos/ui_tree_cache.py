@@ -0,0 +1,190 @@
+# tech.md: 4.1. Perception Layer - Accessibility Tree Parsing
+import threading
+import time
+
+from .frame_diff import regions_intersect
+
+# Element properties that lookups can match on
+_MATCH_KEYS = ("id", "type", "name")
+
+
+def _norm(value):
+    return value.lower() if isinstance(value, str) else value
+
+
+class UIElementTree:
+    """
+    Snapshot of one window's UI elements, indexed by id, by type (role), by name and
+    by (type, name) so lookups do not scan the element list.
+    """
+
+    def __init__(self, elements: list):
+        self.walked_at = time.monotonic()
+        self.by_id = {}
+        self.by_type = {}
+        self.by_name = {}
+        self.by_type_name = {}
+        # Elements whose screen area changed since the walk
+        self.stale_ids = set()
+        for element in elements:
+            self.add(element)
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def elements(self) -> list:
+        return list(self.by_id.values())
+
+    def add(self, element: dict):
+        if element["id"] in self.by_id:
+            self.remove(element["id"])
+        self.by_id[element["id"]] = element
+        element_type, name = _norm(element.get("type")), _norm(element.get("name"))
+        self.by_type.setdefault(element_type, []).append(element)
+        self.by_name.setdefault(name, []).append(element)
+        self.by_type_name.setdefault((element_type, name), []).append(element)
+        self.stale_ids.discard(element["id"])
+
+    def remove(self, element_id):
+        element = self.by_id.pop(element_id, None)
+        if element is None:
+            return
+        element_type, name = _norm(element.get("type")), _norm(element.get("name"))
+        for index, key in ((self.by_type, element_type), (self.by_name, name),
+                           (self.by_type_name, (element_type, name))):
+            bucket = index.get(key, [])
+            if element in bucket:
+                bucket.remove(element)
+            if not bucket:
+                index.pop(key, None)
+        self.stale_ids.discard(element_id)
+
+    def find(self, properties: dict):
+        """Returns the first element matching the id/type/name in `properties`, or None."""
+        if properties.get("id") is not None:
+            candidates = [self.by_id[properties["id"]]] if properties["id"] in self.by_id else []
+        elif properties.get("type") is not None and properties.get("name") is not None:
+            candidates = self.by_type_name.get(
+                (_norm(properties["type"]), _norm(properties["name"])), [])
+        elif properties.get("name") is not None:
+            candidates = self.by_name.get(_norm(properties["name"]), [])
+        elif properties.get("type") is not None:
+            candidates = self.by_type.get(_norm(properties["type"]), [])
+        else:
+            return None
+        for element in candidates:
+            if all(_norm(element.get(key)) == _norm(properties[key])
+                   for key in _MATCH_KEYS if properties.get(key) is not None):
+                return element
+        return None
+
+    def mark_stale(self, regions: list) -> int:
+        """Marks elements whose bounds intersect any of the regions as stale."""
+        marked = 0
+        for element_id, element in self.by_id.items():
+            bounds = element.get("bounds")
+            if bounds and any(regions_intersect(bounds, region) for region in regions):
+                if element_id not in self.stale_ids:
+                    self.stale_ids.add(element_id)
+                    marked += 1
+        return marked
+
+
+class UIElementCache:
+    """
+    Per-window cache of accessibility trees. A window is walked once and then served
+    from its index; screen-diff dirty regions and accessibility events invalidate only
+    the affected elements, and a window is re-walked only when a lookup touches a
+    stale element (or misses while the window has stale elements or is too old).
+    """
+
+    def __init__(self, walker, config: dict = None):
+        self.walker = walker
+        self.config = config if config else {}
+        # Upper bound on how long a tree is trusted without any invalidation signal
+        self.max_age_s = self.config.get('ui_tree_max_age_s', 30.0)
+        self.walks = 0
+        self._trees = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def window_key(window_title=None, app_name=None):
+        return (window_title, app_name)
+
+    def _walk(self, key) -> UIElementTree:
+        tree = UIElementTree(self.walker(*key))
+        self.walks += 1
+        self._trees[key] = tree
+        return tree
+
+    def get_tree(self, window_title=None, app_name=None) -> UIElementTree:
+        key = self.window_key(window_title, app_name)
+        with self._lock:
+            tree = self._trees.get(key)
+            if tree is None or tree.stale_ids or time.monotonic() - tree.walked_at > self.max_age_s:
+                tree = self._walk(key)
+            return tree
+
+    def find(self, properties: dict, window_title=None, app_name=None):
+        key = self.window_key(window_title, app_name)
+        with self._lock:
+            tree = self._trees.get(key)
+            if tree is None or time.monotonic() - tree.walked_at > self.max_age_s:
+                return self._walk(key).find(properties)
+            element = tree.find(properties)
+            if element is not None and element["id"] not in tree.stale_ids:
+                return element
+            if element is None and not tree.stale_ids:
+                return None
+            return self._walk(key).find(properties)
+
+    def invalidate_regions(self, regions: list) -> int:
+        """Marks elements under screen-diff dirty regions as stale in every cached window."""
+        if not regions:
+            return 0
+        with self._lock:
+            return sum(tree.mark_stale(regions) for tree in self._trees.values())
+
+    def handle_event(self, event: dict):
+        """
+        Applies an accessibility event: {"type": "element_changed"|"element_added"|
+        "element_removed"|"window_closed"|"structure_changed", "window_title", "app_name",
+        "element"/"element_id"}.
+        """
+        key = self.window_key(event.get("window_title"), event.get("app_name"))
+        event_type = event.get("type")
+        with self._lock:
+            tree = self._trees.get(key)
+            if event_type == "window_closed" or (event_type == "structure_changed" and tree):
+                self._trees.pop(key, None)
+            elif tree is None:
+                return
+            elif event_type in ("element_changed", "element_added") and event.get("element"):
+                tree.add(dict(event["element"]))
+            elif event_type == "element_removed":
+                tree.remove(event.get("element_id"))
+
+    def invalidate(self, window_title=None, app_name=None, everything: bool = False):
+        with self._lock:
+            if everything:
+                self._trees.clear()
+            else:
+                self._trees.pop(self.window_key(window_title, app_name), None)
+
+
+if __name__ == '__main__':
+    print("Testing UIElementCache...")
+
+    def walker(window_title, app_name):
+        return [{"id": "ok", "type": "button", "name": "OK", "bounds": [100, 100, 50, 30]},
+                {"id": "user", "type": "textfield", "name": "Username", "bounds": [100, 150, 200, 30]}]
+
+    cache = UIElementCache(walker)
+    for props in ({"name": "OK"}, {"type": "textfield"}, {"id": "ok"}, {"name": "Missing"}):
+        print(f"find({props}) -> {cache.find(props)}")
+    print(f"Walks after 4 lookups: {cache.walks}")
+    cache.invalidate_regions([[90, 140, 40, 20]])
+    cache.find({"name": "OK"})
+    print(f"Walks after lookup of an unaffected element: {cache.walks}")
+    cache.find({"name": "Username"})
+    print(f"Walks after lookup of a stale element: {cache.walks}")
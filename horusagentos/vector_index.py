@@ -0,0 +1,236 @@
+# tech.md: 4.4. Memory Layer - Knowledge Retrieval System
+import numpy as np
+
+from .embedding_store import EmbeddingMatrix
+# Potential future imports: faiss, hnswlib
+
+
+def _as_matrix(vectors, dim: int) -> np.ndarray:
+    matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    if matrix.shape[1] != dim:
+        raise ValueError(
+            f"Expected vectors of dimension {dim}, got {matrix.shape[1]}")
+    return matrix
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+def _top_k(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Returns the positions of the top_k highest scores, best first."""
+    if top_k >= scores.shape[0]:
+        return np.argsort(-scores)
+    candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+class _RowList:
+    """Growable int64 array of row offsets (one inverted list)."""
+
+    def __init__(self, initial_capacity: int = 64):
+        self.rows = np.empty(initial_capacity, dtype=np.int64)
+        self.size = 0
+
+    def extend(self, rows: np.ndarray):
+        needed = self.size + len(rows)
+        if needed > self.rows.shape[0]:
+            grown = np.empty(max(needed, self.rows.shape[0] * 2), dtype=np.int64)
+            grown[:self.size] = self.rows[:self.size]
+            self.rows = grown
+        self.rows[self.size:needed] = rows
+        self.size = needed
+
+    def view(self) -> np.ndarray:
+        return self.rows[:self.size]
+
+
+def _ranked(storage: EmbeddingMatrix, rows: np.ndarray, scores: np.ndarray, top_k: int) -> list:
+    best = _top_k(scores, top_k)
+    best = best[np.isfinite(scores[best])]  # drop removed rows
+    return list(zip(storage.ids[rows[best]].tolist(), scores[best].tolist()))
+
+
+def _create_storage(dim: int, config: dict) -> EmbeddingMatrix:
+    return EmbeddingMatrix(dim, dtype=config.get('dtype', 'float32'),
+                           initial_capacity=config.get('initial_capacity', 1024))
+
+
+class BruteForceIndex:
+    """
+    Exact top-k search over a contiguous embedding matrix (inner product on
+    normalised vectors, i.e. cosine similarity).
+    """
+
+    index_type = "flat"
+
+    def __init__(self, dim: int, config: dict = None, storage: EmbeddingMatrix = None):
+        self.config = config if config else {}
+        self.dim = dim
+        self.storage = storage if storage is not None else _create_storage(
+            dim, self.config)
+
+    def __len__(self):
+        return len(self.storage)
+
+    def add(self, ids, vectors, timestamps=None) -> np.ndarray:
+        """Adds vectors under the given integer ids and returns their storage row offsets."""
+        return self.storage.append(ids, _normalize(_as_matrix(vectors, self.dim)), timestamps)
+
+    def search(self, query, top_k: int = 3) -> list:
+        """Returns up to top_k (id, score) pairs, best first."""
+        if len(self.storage) == 0:
+            return []
+        query = _normalize(_as_matrix(query, self.dim))[0]
+        scores = self.storage.scores(query)
+        return _ranked(self.storage, np.arange(len(scores)), scores, top_k)
+
+    def replace_storage(self, storage: EmbeddingMatrix, old_to_new: np.ndarray):
+        """Switches to a compacted copy of the storage."""
+        self.storage = storage
+
+
+class IVFIndex:
+    """
+    Approximate inverted-file index: rows are bucketed under k-means centroids and
+    a query only scans the `nprobe` closest buckets. Until `train_size` vectors have
+    been added the index behaves like a brute-force scan. Inverted lists hold row
+    offsets into the shared embedding matrix rather than copies of the vectors.
+    """
+
+    index_type = "ivf"
+
+    def __init__(self, dim: int, config: dict = None, storage: EmbeddingMatrix = None):
+        self.config = config if config else {}
+        self.dim = dim
+        self.nlist = self.config.get('nlist', 64)
+        self.nprobe = self.config.get('nprobe', 8)
+        self.train_size = self.config.get('train_size', self.nlist * 40)
+        self.kmeans_iterations = self.config.get('kmeans_iterations', 10)
+        self.centroids = None
+        self._lists = []
+        self.storage = storage if storage is not None else _create_storage(
+            dim, self.config)
+        if len(self.storage) >= self.train_size:
+            self._train_and_assign()
+
+    def __len__(self):
+        return len(self.storage)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def train(self, sample: np.ndarray):
+        """Fits the coarse quantizer with a few rounds of spherical k-means."""
+        sample = _normalize(_as_matrix(sample, self.dim))
+        nlist = min(self.nlist, sample.shape[0])
+        rng = np.random.default_rng(self.config.get('seed', 0))
+        centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)]
+        for _ in range(self.kmeans_iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[assignment == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = _normalize(centroids)
+        self.centroids = np.ascontiguousarray(centroids)
+        self._lists = [_RowList() for _ in range(nlist)]
+        print(
+            f"VectorIndex: IVF quantizer trained with {nlist} lists on {sample.shape[0]} vectors.")
+
+    def _assign(self, rows: np.ndarray, vectors: np.ndarray):
+        assignment = np.argmax(vectors @ self.centroids.T, axis=1)
+        for c in np.unique(assignment):
+            self._lists[c].extend(rows[assignment == c])
+
+    def _train_and_assign(self):
+        size = len(self.storage)
+        rng = np.random.default_rng(self.config.get('seed', 0))
+        sample_rows = np.sort(rng.choice(size, min(size, self.config.get(
+            'train_sample_size', self.nlist * 256)), replace=False))
+        self.train(self.storage.get(sample_rows))
+        chunk = self.storage.chunk_rows
+        for start in range(0, size, chunk):
+            rows = np.arange(start, min(start + chunk, size))
+            self._assign(rows, self.storage.get(rows))
+
+    def add(self, ids, vectors, timestamps=None) -> np.ndarray:
+        """
+        Adds vectors under the given integer ids, training the quantizer when enough
+        data exists. Returns their storage row offsets.
+        """
+        vectors = _normalize(_as_matrix(vectors, self.dim))
+        rows = self.storage.append(ids, vectors, timestamps)
+        if self.centroids is not None:
+            self._assign(rows, vectors)
+        elif len(self.storage) >= self.train_size:
+            self._train_and_assign()
+        return rows
+
+    def search(self, query, top_k: int = 3) -> list:
+        """Returns up to top_k (id, score) pairs, best first, scanning only nprobe lists."""
+        if len(self.storage) == 0:
+            return []
+        query = _normalize(_as_matrix(query, self.dim))[0]
+        if self.centroids is None:
+            scores = self.storage.scores(query)
+            return _ranked(self.storage, np.arange(len(scores)), scores, top_k)
+
+        probes = _top_k(self.centroids @ query, self.nprobe)
+        rows = np.concatenate([self._lists[c].view() for c in probes])
+        if len(rows) == 0:
+            return []
+        return _ranked(self.storage, rows, self.storage.scores(query, rows), top_k)
+
+    def replace_storage(self, storage: EmbeddingMatrix, old_to_new: np.ndarray):
+        """
+        Switches to a compacted copy of the storage, remapping the inverted lists
+        (the trained centroids are kept).
+        """
+        self.storage = storage
+        if self.centroids is None:
+            if len(storage) >= self.train_size:
+                self._train_and_assign()
+            return
+        for row_list in self._lists:
+            rows = old_to_new[row_list.view()]
+            rows = rows[rows >= 0]
+            row_list.size = 0
+            row_list.extend(rows)
+
+
+VECTOR_INDEX_TYPES = {
+    BruteForceIndex.index_type: BruteForceIndex,
+    IVFIndex.index_type: IVFIndex,
+}
+
+
+def create_vector_index(dim: int, config: dict = None, storage: EmbeddingMatrix = None):
+    """
+    Builds the vector index selected by `index_type` in the given config ('flat' or 'ivf'),
+    optionally over an existing embedding matrix.
+    """
+    config = config if config else {}
+    index_type = config.get('index_type', BruteForceIndex.index_type)
+    if index_type not in VECTOR_INDEX_TYPES:
+        raise ValueError(
+            f"Unknown vector index type '{index_type}'. Available: {sorted(VECTOR_INDEX_TYPES)}")
+    return VECTOR_INDEX_TYPES[index_type](dim, config, storage)
+
+
+if __name__ == '__main__':
+    print("Testing vector indexes...")
+    rng = np.random.default_rng(42)
+    data = rng.standard_normal((20000, 64)).astype(np.float32)
+    flat = create_vector_index(64, {'index_type': 'flat'})
+    ivf = create_vector_index(64, {'index_type': 'ivf', 'nlist': 64, 'nprobe': 8})
+    flat.add(np.arange(len(data)), data)
+    ivf.add(np.arange(len(data)), data)
+
+    query = data[123] + 0.05 * rng.standard_normal(64).astype(np.float32)
+    print(f"Flat top-3: {flat.search(query, top_k=3)}")
+    print(f"IVF top-3:  {ivf.search(query, top_k=3)}")